@@ -4,6 +4,8 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.streaming import streaming_json_response, wants_stream
+
 from .models import ContactSubmission
 from .serializers import ContactSubmissionSerializer
 
@@ -35,6 +37,12 @@ class ContactSubmissionView(APIView):
                 return Response(serializer.data)
             except ContactSubmission.DoesNotExist:
                 return Response(status=status.HTTP_404_NOT_FOUND)
+        elif wants_stream(request):
+            # Export every submission without building the list in memory
+            return streaming_json_response(
+                ContactSubmission.objects.order_by("id"),
+                lambda chunk: ContactSubmissionSerializer(chunk, many=True).data,
+            )
         else:
             submissions = ContactSubmission.objects.all()
             paginator = (
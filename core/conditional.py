@@ -0,0 +1,32 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def set_validators(response, etag, last_modified=None):
+    """Attach ETag/Last-Modified; last_modified is a Unix timestamp."""
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+def not_modified_response(request, etag, last_modified=None):
+    """
+    Evaluate the request's conditional headers against the validators.
+    Returns a 304 (or 412) response when they match, otherwise None so the
+    view goes on to build the full payload.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified and int(last_modified)
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,125 @@
+import json
+import logging
+
+import redis
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .redis_connection import get_redis_connection
+
+logger = logging.getLogger("django")
+
+ENTITLEMENT_KEY_PREFIX = "entitlements"
+ENTITLEMENT_TTL = 60 * 5
+
+
+def entitlement_key(user_id):
+    return f"{ENTITLEMENT_KEY_PREFIX}:{user_id}"
+
+
+def build_entitlement(user):
+    if user.stripe_subscription_id:
+        provider = "stripe"
+    elif user.paypal_subscription_id:
+        provider = "paypal"
+    else:
+        provider = None
+    expires_at = user.paypal_next_billing_time
+    return {
+        "id": user.pk,
+        "is_active": user.is_active,
+        "active": user.active,
+        "is_staff": user.is_staff,
+        "provider": provider,
+        "expires_at": expires_at.isoformat() if expires_at else None,
+    }
+
+
+def load_entitlement(user_id):
+    user = (
+        get_user_model()
+        .objects.filter(pk=user_id)
+        .only(
+            "is_active",
+            "active",
+            "is_staff",
+            "stripe_subscription_id",
+            "paypal_subscription_id",
+            "paypal_next_billing_time",
+        )
+        .first()
+    )
+    return build_entitlement(user) if user else None
+
+
+def get_entitlement(user_id):
+    """
+    Return the cached entitlement record of a user, loading it from the
+    database on a miss. Returns None for users that do not exist.
+    """
+    key = entitlement_key(user_id)
+    try:
+        cached = get_redis_connection().get(key)
+        if cached is not None:
+            return json.loads(cached)
+    except redis.RedisError as e:
+        logger.warning(f"Error reading entitlement for user {user_id}: {e}")
+        return load_entitlement(user_id)
+
+    entitlement = load_entitlement(user_id)
+    if entitlement is not None:
+        try:
+            get_redis_connection().set(
+                key, json.dumps(entitlement), ex=ENTITLEMENT_TTL
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Error caching entitlement for user {user_id}: {e}")
+    return entitlement
+
+
+def invalidate_entitlement(user_id):
+    try:
+        get_redis_connection().delete(entitlement_key(user_id))
+    except redis.RedisError as e:
+        logger.error(f"Error invalidating entitlement for user {user_id}: {e}")
+
+
+def invalidate_entitlement_on_commit(user_id):
+    # Drop the record only once the write is visible, so a concurrent reader
+    # cannot cache the old values again.
+    transaction.on_commit(lambda: invalidate_entitlement(user_id))
+
+
+def get_request_entitlement(request):
+    """
+    Entitlement record of the caller, or None when anonymous. For JWT
+    requests the user row is not loaded; invalid tokens raise InvalidToken,
+    which DRF turns into a 401.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        # Session or forced authentication already hands us the user
+        user = request.user
+        if user.is_authenticated:
+            return build_entitlement(user)
+        return None
+
+    token = authentication.get_validated_token(raw_token)
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    entitlement = get_entitlement(user_id)
+    if entitlement is None or not entitlement["is_active"]:
+        return None
+    return entitlement
+
+
+def is_entitled(entitlement):
+    """Whether the caller may watch videos that are not free."""
+    return entitlement is not None and (
+        entitlement["active"] or entitlement["is_staff"]
+    )
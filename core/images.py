@@ -0,0 +1,155 @@
+import base64
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.signals import post_save
+from PIL import Image
+
+logger = logging.getLogger("django")
+
+IMAGE_WIDTHS = (320, 640, 1280)
+PLACEHOLDER_WIDTH = 16
+# format key -> (Pillow format, extension, save options)
+IMAGE_FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def derivative_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f"{root}_{width}w.{extension}"
+
+
+def render_derivative(image, width, image_format):
+    """Encode `image` scaled down to `width` pixels wide in `image_format`."""
+    pil_format, _, options = IMAGE_FORMATS[image_format]
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.LANCZOS)
+    if pil_format == "JPEG" and resized.mode != "RGB":
+        resized = resized.convert("RGB")
+    buffer = io.BytesIO()
+    resized.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render_placeholder(image):
+    """Tiny WebP data URI clients can stretch and blur while loading."""
+    width = min(PLACEHOLDER_WIDTH, image.width)
+    height = max(1, round(image.height * width / image.width))
+    buffer = io.BytesIO()
+    image.resize((width, height), Image.BILINEAR).save(buffer, "WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def generate_image_derivatives(name, storage):
+    """
+    Store downscaled WebP and JPEG copies of the image `name` beside it and
+    return the image_variants record describing them, including an inline
+    placeholder. Widths at or above the original are skipped.
+
+    Pillow releases the GIL while resizing and encoding, so the widths are
+    rendered in parallel threads; Celery's prefork workers cannot start a
+    process pool of their own.
+    """
+    with storage.open(name, "rb") as original:
+        image = Image.open(original)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        # Palette and greyscale images only resize with nearest neighbour
+        has_alpha = "A" in image.mode or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    widths = [width for width in IMAGE_WIDTHS if width < image.width]
+
+    def store(width, image_format):
+        extension = IMAGE_FORMATS[image_format][1]
+        content = ContentFile(render_derivative(image, width, image_format))
+        return width, storage.save(derivative_name(name, width, extension), content)
+
+    jobs = [(width, image_format) for image_format in IMAGE_FORMATS for width in widths]
+    variants = {"source": name, "placeholder": render_placeholder(image)}
+    with ThreadPoolExecutor(max_workers=max(1, len(widths))) as executor:
+        results = list(executor.map(lambda job: store(*job), jobs))
+    for (_, image_format), (width, stored_name) in zip(jobs, results):
+        variants.setdefault(image_format, []).append([width, stored_name])
+    return variants
+
+
+def variant_names(variants):
+    """Storage names of every derivative listed in an image_variants record."""
+    return [
+        stored_name
+        for image_format in IMAGE_FORMATS
+        for _, stored_name in (variants or {}).get(image_format, [])
+    ]
+
+
+def image_srcset(variants, storage, request=None):
+    """
+    srcset strings per format for an image_variants record, e.g.
+    {"webp": "https://.../a_320w.webp 320w, https://.../a_640w.webp 640w"}.
+    Empty until the derivatives have been generated.
+    """
+    srcset = {}
+    for image_format in IMAGE_FORMATS:
+        candidates = []
+        for width, stored_name in (variants or {}).get(image_format, []):
+            url = storage.url(stored_name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            candidates.append(f"{url} {width}w")
+        if candidates:
+            srcset[image_format] = ", ".join(candidates)
+    return srcset
+
+
+def image_placeholder(variants):
+    return (variants or {}).get("placeholder")
+
+
+def queue_image_derivatives(instance):
+    """
+    Generate derivatives for `instance` in Celery once the current
+    transaction commits, unless they were already built from its image.
+    Bulk writes skip post_save and call this directly.
+    """
+    from .tasks import generate_image_derivatives_task
+
+    name = instance.image.name if instance.image else ""
+    if not name or (instance.image_variants or {}).get("source") == name:
+        return
+    label = instance._meta.label
+    pk = instance.pk
+    transaction.on_commit(
+        lambda: generate_image_derivatives_task.delay(label, pk, name),
+        robust=True,
+    )
+
+
+# Models registered with track_image_derivatives, for backfills
+tracked_image_models = []
+
+
+def track_image_derivatives(model):
+    """
+    Generate derivatives in Celery whenever a committed save of `model`
+    leaves `image` pointing at a file the variants were not built from.
+    `model` needs `image` and `image_variants` fields.
+    """
+
+    def queue(sender, instance, **kwargs):
+        queue_image_derivatives(instance)
+
+    post_save.connect(
+        queue,
+        sender=model,
+        weak=False,
+        dispatch_uid=f"track_image_derivatives:{model._meta.label}",
+    )
+    if model not in tracked_image_models:
+        tracked_image_models.append(model)
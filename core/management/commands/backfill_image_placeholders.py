@@ -0,0 +1,76 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.images import image_placeholder, tracked_image_models
+from core.tasks import generate_image_derivatives_task
+
+logger = logging.getLogger("django")
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate placeholders and derivatives for existing images that have "
+        "none, or were built from a previous image"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Images processed in parallel by this command",
+        )
+        parser.add_argument(
+            "--queue",
+            action="store_true",
+            help="Queue Celery tasks instead of processing the images here",
+        )
+
+    def handle(self, *args, **options):
+        jobs = list(self.pending_jobs())
+        self.stdout.write(f"{len(jobs)} images need placeholders")
+
+        if options["queue"]:
+            for job in jobs:
+                generate_image_derivatives_task.delay(*job)
+            self.stdout.write(self.style.SUCCESS(f"Queued {len(jobs)} images"))
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"])) as executor:
+            failed = [
+                job for job, ok in zip(jobs, executor.map(self.process, jobs)) if not ok
+            ]
+        for label, pk, name in failed:
+            self.stderr.write(f"Failed {label} {pk}: {name}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {len(jobs) - len(failed)} of {len(jobs)} images")
+        )
+
+    def pending_jobs(self):
+        for model in tracked_image_models:
+            rows = (
+                model.objects.exclude(image="")
+                .exclude(image__isnull=True)
+                .values_list("pk", "image", "image_variants")
+            )
+            for pk, name, variants in rows.iterator():
+                variants = variants or {}
+                if variants.get("source") != name or image_placeholder(variants) is None:
+                    yield model._meta.label, pk, name
+
+    def process(self, job):
+        label, pk, name = job
+        try:
+            return generate_image_derivatives_task(*job)
+        except Exception as e:
+            logger.error(
+                f"Error generating derivatives of {label} {pk} ({name}): {e}",
+                exc_info=True,
+            )
+            return False
+        finally:
+            # Each worker thread opened its own database connection
+            connections.close_all()
@@ -0,0 +1,93 @@
+import functools
+import logging
+import os
+
+import boto3
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from .redis_connection import get_redis_connection
+
+logger = logging.getLogger("django")
+
+S3_DELETE_BATCH_SIZE = 1000
+FAILED_MEDIA_DELETIONS_KEY = "media:failed_deletions"
+
+
+@functools.lru_cache(maxsize=1)
+def get_s3_client():
+    # boto3 clients are thread-safe, so every task in a worker shares one
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+    )
+
+
+def delete_media_files(keys):
+    """
+    Delete stored media files once the current transaction commits, so a
+    rolled back delete keeps its files. S3 deletions run in a Celery task.
+    """
+    keys = [key for key in keys if key]
+    if not keys:
+        return
+    transaction.on_commit(lambda: _dispatch_media_deletion(keys), robust=True)
+
+
+def _dispatch_media_deletion(keys):
+    from .tasks import delete_media_files_task
+
+    if settings.DEBUG:
+        # Local development keeps media on disk
+        for key in keys:
+            path = os.path.join(settings.MEDIA_ROOT, key)
+            if os.path.isfile(path):
+                os.remove(path)
+        return
+    for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+        delete_media_files_task.delay(keys[start : start + S3_DELETE_BATCH_SIZE])
+
+
+def delete_s3_objects(keys):
+    """
+    Delete `keys` from the media bucket with one request per 1000 keys.
+    Returns the keys that could not be deleted.
+    """
+    failed = []
+    for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+        batch = keys[start : start + S3_DELETE_BATCH_SIZE]
+        try:
+            response = get_s3_client().delete_objects(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        except Exception as e:
+            logger.error(f"Error deleting {len(batch)} media files from S3: {e}")
+            failed.extend(batch)
+            continue
+        for error in response.get("Errors", []):
+            logger.error(
+                f"Error deleting {error.get('Key')} from S3: {error.get('Code')}"
+            )
+            failed.append(error["Key"])
+    return failed
+
+
+def record_failed_deletions(keys):
+    if not keys:
+        return
+    try:
+        get_redis_connection().rpush(FAILED_MEDIA_DELETIONS_KEY, *keys)
+    except redis.RedisError as e:
+        logger.error(f"Error recording failed media deletions {keys}: {e}")
+
+
+def pop_failed_deletions(count=S3_DELETE_BATCH_SIZE):
+    try:
+        keys = get_redis_connection().lpop(FAILED_MEDIA_DELETIONS_KEY, count)
+    except redis.RedisError as e:
+        logger.error(f"Error reading failed media deletions: {e}")
+        return []
+    return [key.decode() for key in keys or []]
@@ -0,0 +1,6 @@
+import redis
+from django.conf import settings
+
+
+def get_redis_connection():
+    return redis.Redis(connection_pool=settings.REDIS_POOL)
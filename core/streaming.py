@@ -0,0 +1,38 @@
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_stream(request):
+    return request.query_params.get("stream") == "true"
+
+
+def iter_json_array(queryset, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield a JSON array of every row of `queryset` as encoded byte chunks.
+    Rows are read through .iterator() and handed to `serialize` chunk_size
+    at a time, so only one chunk is ever held in memory.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    rows = queryset.iterator(chunk_size=chunk_size)
+    separator = "["
+    while chunk := list(islice(rows, chunk_size)):
+        items = ",".join(encoder.encode(item) for item in serialize(chunk))
+        yield (separator + items).encode()
+        separator = ","
+    yield b"[]" if separator == "[" else b"]"
+
+
+def streaming_json_response(queryset, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream every row of `queryset` as a JSON array. Meant for staff exports
+    that would not fit a paginated Response; the body cannot be cached or
+    given an ETag.
+    """
+    return StreamingHttpResponse(
+        iter_json_array(queryset, serialize, chunk_size),
+        content_type="application/json",
+    )
@@ -0,0 +1,71 @@
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from PIL import UnidentifiedImageError
+
+from celery import shared_task
+from core.images import generate_image_derivatives, variant_names
+from core.media import (delete_media_files, delete_s3_objects,
+                        pop_failed_deletions, record_failed_deletions)
+
+logger = logging.getLogger("django")
+
+
+@shared_task(ignore_result=True)
+def delete_media_files_task(keys):
+    """Delete media files from S3 in batches; failures go to the retry list."""
+    failed = delete_s3_objects(keys)
+    record_failed_deletions(failed)
+    logger.info(f"Deleted {len(keys) - len(failed)} of {len(keys)} media files")
+
+
+@shared_task(ignore_result=True)
+def retry_failed_media_deletions_task():
+    keys = pop_failed_deletions()
+    if keys:
+        delete_media_files_task(keys)
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=60)
+def generate_image_derivatives_task(self, model_label, pk, name):
+    """
+    Build thumbnails for `name` and record them on the model instance.
+    Returns False if the image cannot be read, and True otherwise, including
+    when the instance no longer has that image.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or instance.image.name != name:
+        return True
+
+    try:
+        variants = generate_image_derivatives(name, instance.image.storage)
+    except UnidentifiedImageError as e:
+        logger.error(f"Cannot generate derivatives of {name}: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Error generating derivatives of {name}: {e}")
+        raise self.retry(exc=e)
+
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(pk=pk).first()
+        if instance is None or instance.image.name != name:
+            # The image changed or went away while we were rendering
+            delete_media_files(variant_names(variants))
+            return True
+        stale = set(variant_names(instance.image_variants)) - set(
+            variant_names(variants)
+        )
+        instance.image_variants = variants
+        # Saving (rather than update()) lets the cache invalidation signals
+        # run; auto_now fields are listed so delta sync sees the change.
+        update_fields = ["image_variants"] + [
+            field.name
+            for field in model._meta.concrete_fields
+            if getattr(field, "auto_now", False)
+        ]
+        instance.save(update_fields=update_fields)
+        delete_media_files(list(stale))
+    logger.info(f"Generated {len(variant_names(variants))} derivatives of {name}")
+    return True
@@ -2,7 +2,8 @@ from django.urls import path
 
 from .views import (CustomTokenRefreshView, LogInView,
                     PasswordResetConfirmView, PasswordResetRequestView,
-                    SignUpView, TrialDaysDetail, UserDetailView)
+                    SignUpView, TrialDaysDetail, UserDetailView,
+                    UserListView)
 
 urlpatterns = [
     path("api/sign_up/", SignUpView.as_view(), name="sign_up"),
@@ -13,6 +14,7 @@ urlpatterns = [
         name="password-reset-request",
     ),
     path("api/trial-days/", TrialDaysDetail.as_view(), name="trial_days"),
+    path("api/users/", UserListView.as_view(), name="user-list"),
     path("api/users/<int:pk>/", UserDetailView.as_view(), name="user-detail"),
     path("api/token/refresh/", CustomTokenRefreshView.as_view(), name="token_refresh"),
     path(
@@ -0,0 +1,62 @@
+import logging
+import time
+import uuid
+
+import redis
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .redis_connection import get_redis_connection
+
+logger = logging.getLogger("django")
+
+VERSION_KEY_PREFIX = "versions"
+
+
+def get_version_stamp(namespace):
+    """
+    Return (stamp, modified_at) for `namespace`, or None if Redis is
+    unavailable. The stamp changes on every tracked write and also when the
+    Redis data is lost; modified_at is the Unix time of the last write.
+    """
+    key = f"{VERSION_KEY_PREFIX}:{namespace}"
+    try:
+        connection = get_redis_connection()
+        epoch, version, modified_at = connection.hmget(
+            key, "epoch", "version", "modified_at"
+        )
+        if epoch is None:
+            connection.hsetnx(key, "epoch", uuid.uuid4().hex)
+            epoch, version, modified_at = connection.hmget(
+                key, "epoch", "version", "modified_at"
+            )
+    except redis.RedisError as e:
+        logger.warning(f"Error reading version stamp {namespace}: {e}")
+        return None
+    stamp = f"{epoch.decode()}:{int(version or 0)}"
+    return stamp, float(modified_at) if modified_at else None
+
+
+def bump_version_stamp(namespace):
+    key = f"{VERSION_KEY_PREFIX}:{namespace}"
+    try:
+        pipeline = get_redis_connection().pipeline(transaction=True)
+        pipeline.hincrby(key, "version", 1)
+        pipeline.hset(key, "modified_at", time.time())
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.error(f"Error bumping version stamp {namespace}: {e}")
+
+
+def track_model_versions(namespace, *models):
+    """Bump the `namespace` stamp after any committed save or delete of `models`."""
+
+    def bump(sender, **kwargs):
+        transaction.on_commit(lambda: bump_version_stamp(namespace))
+
+    for model in models:
+        uid = f"track_model_versions:{namespace}:{model._meta.label}"
+        post_save.connect(bump, sender=model, weak=False, dispatch_uid=f"{uid}:save")
+        post_delete.connect(
+            bump, sender=model, weak=False, dispatch_uid=f"{uid}:delete"
+        )
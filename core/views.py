@@ -26,6 +26,7 @@ from satnam.settings import EMAIL_HOST_USER
 
 from .models import TrialDays
 from .serializers import LogInSerializer, TrialDaysSerializer, UserSerializer
+from .streaming import streaming_json_response
 
 load_dotenv(".env.dev")
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
@@ -249,6 +250,17 @@ class PasswordResetConfirmView(APIView):
             )
 
 
+class UserListView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        # Staff export of every user, streamed so memory stays flat
+        return streaming_json_response(
+            get_user_model().objects.order_by("id"),
+            lambda chunk: UserSerializer(chunk, many=True).data,
+        )
+
+
 class UserDetailView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -6,7 +6,13 @@ class PaymentsConfig(AppConfig):
     name = "payments"
 
     def ready(self):
-        pass
+        from core.images import track_image_derivatives
+        from core.versioning import track_model_versions
+
+        from .models import SubscriptionPlan
+
+        track_model_versions("payments:subscription_plans", SubscriptionPlan)
+        track_image_derivatives(SubscriptionPlan)
         # from payments.workers import RedisWorker, on_django_shutdown
         # import atexit
 
@@ -0,0 +1,299 @@
+import json
+import logging
+import os
+import zlib
+
+import redis
+import stripe
+from django.utils import timezone
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
+
+from core.redis_connection import get_redis_connection
+
+from .db import payments_cursor
+from .ledger import mark_event_failed
+from .models import StripeEvent
+from .processing import (EventBatch, current_batch, is_handled, parse_event,
+                         process_event)
+
+logger = logging.getLogger("django")
+
+# Events are spread over ordered lanes by customer, see lane_for_event
+WEBHOOK_LANES = 8
+WEBHOOK_BUFFER_PREFIX = "payments:webhook_events"
+DRAIN_LOCK_TTL = 60 * 5
+BATCH_SIZE = 200
+# A failing event is retried on every drain, every few seconds, for about
+# as long as the per-event task's retries last
+MAX_EVENT_ATTEMPTS = 60
+ATTEMPTS_TTL = 60 * 60 * 24
+
+
+def buffer_key(lane):
+    return f"{WEBHOOK_BUFFER_PREFIX}:{lane}"
+
+
+def draining_key(lane):
+    # Events taken from the lane and not yet committed
+    return f"{WEBHOOK_BUFFER_PREFIX}:{lane}:draining"
+
+
+def drain_lock_key(lane):
+    return f"{WEBHOOK_BUFFER_PREFIX}:{lane}:lock"
+
+
+def attempts_key(lane):
+    # Hash of event id -> failed attempts, for events deferred on the lane
+    return f"{WEBHOOK_BUFFER_PREFIX}:{lane}:attempts"
+
+
+def partition_key(event_data):
+    """
+    The customer an event is about: the Stripe customer id, or the PayPal
+    subscription id. Events without one fall back to their own id.
+    """
+    if "type" in event_data:
+        data_object = event_data.get("data", {}).get("object", {})
+        key = data_object.get("customer")
+    else:
+        resource = event_data.get("resource", {})
+        # Sale events name the subscription in billing_agreement_id
+        key = resource.get("billing_agreement_id") or resource.get("id")
+    return key or event_data.get("id") or ""
+
+
+def lane_for_event(event_data):
+    """
+    Every event of a customer maps to the same lane, and a lane is drained
+    by one worker at a time in arrival order, so a customer's events never
+    race each other while different customers run in parallel.
+    """
+    return zlib.crc32(partition_key(event_data).encode()) % WEBHOOK_LANES
+
+
+class WebhookBufferUnavailable(Exception):
+    """Redis could not take a webhook event; the provider has to resend it."""
+
+
+def buffer_payment_event(event_data):
+    """
+    Queue a webhook event on its customer's lane. Returns False when Redis
+    is unavailable.
+    """
+    try:
+        get_redis_connection().rpush(
+            buffer_key(lane_for_event(event_data)), json.dumps(event_data)
+        )
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Error buffering webhook event: {e}")
+        return False
+
+
+def pending_lanes():
+    """Lanes with buffered events or an unfinished drain."""
+    pipeline = get_redis_connection().pipeline(transaction=False)
+    for lane in range(WEBHOOK_LANES):
+        pipeline.exists(buffer_key(lane), draining_key(lane))
+    return [lane for lane, pending in enumerate(pipeline.execute()) if pending]
+
+
+def drain_payment_events(lane, batch_size=BATCH_SIZE):
+    """
+    Process every event buffered on `lane`, batch_size at a time and in
+    arrival order, and return how many were done with. Only one drain per
+    lane runs at once. The lane is claimed by renaming it, and each batch
+    is trimmed from the claimed list only after it committed, so a failed
+    batch is retried on the next drain.
+
+    Events a batch defers go back to the head of the lane and the drain
+    stops there, so the next one retries them before any later event of
+    the same customer.
+    """
+    connection = get_redis_connection()
+    lock = connection.lock(drain_lock_key(lane), timeout=DRAIN_LOCK_TTL, blocking=False)
+    if not lock.acquire():
+        return 0
+    try:
+        if not connection.exists(draining_key(lane)):
+            try:
+                connection.rename(buffer_key(lane), draining_key(lane))
+            except redis.ResponseError:
+                # Nothing buffered
+                return 0
+
+        drained = 0
+        while items := connection.lrange(draining_key(lane), 0, batch_size - 1):
+            deferred, failed = process_event_batch([json.loads(item) for item in items])
+            retried = retry_deferred_events(connection, lane, deferred, failed)
+            pipeline = connection.pipeline(transaction=True)
+            pipeline.ltrim(draining_key(lane), len(items), -1)
+            if retried:
+                pipeline.lpush(
+                    draining_key(lane), *[json.dumps(event) for event in reversed(retried)]
+                )
+            pipeline.execute()
+            lock.reacquire()
+            drained += len(items) - len(retried)
+            if retried:
+                break
+        return drained
+    finally:
+        try:
+            # Compare-and-delete, so a lock that expired and was taken by
+            # another worker is left alone
+            lock.release()
+        except redis.exceptions.LockError:
+            logger.warning(f"Drain lock of webhook lane {lane} expired before release")
+
+
+def retry_deferred_events(connection, lane, deferred, failed):
+    """
+    The deferred events to put back on the lane. An event that failed
+    MAX_EVENT_ATTEMPTS times is given up on instead: it is marked failed in
+    the ledger, so a redelivery by the provider is processed again.
+    """
+    if not failed:
+        return deferred
+    pipeline = connection.pipeline(transaction=False)
+    for event in failed:
+        pipeline.hincrby(attempts_key(lane), attempt_field(event), 1)
+    pipeline.expire(attempts_key(lane), ATTEMPTS_TTL)
+    attempts = pipeline.execute()[:-1]
+
+    given_up = [
+        event for event, count in zip(failed, attempts) if count >= MAX_EVENT_ATTEMPTS
+    ]
+    for event in given_up:
+        logger.error(
+            f"Giving up on webhook event {event.get('id')} after "
+            f"{MAX_EVENT_ATTEMPTS} attempts"
+        )
+        if event.get("id"):
+            mark_event_failed(event["id"])
+    if given_up:
+        connection.hdel(attempts_key(lane), *[attempt_field(event) for event in given_up])
+    return [event for event in deferred if event not in given_up]
+
+
+def attempt_field(event):
+    return event.get("id") or json.dumps(event, sort_keys=True)
+
+
+def lookup_keys(events):
+    """Stripe customer ids and PayPal subscription ids the events refer to."""
+    stripe_customer_ids, paypal_subscription_ids = set(), set()
+    for event in events:
+        if "type" in event:
+            customer_id = event.get("data", {}).get("object", {}).get("customer")
+            if customer_id:
+                stripe_customer_ids.add(customer_id)
+        else:
+            resource = event.get("resource", {})
+            for key in ("id", "billing_agreement_id"):
+                if resource.get(key):
+                    paypal_subscription_ids.add(resource[key])
+    return {
+        "stripe_customer_id": sorted(stripe_customer_ids),
+        "paypal_subscription_id": sorted(paypal_subscription_ids),
+    }
+
+
+def fetch_users(cur, lookups):
+    """
+    Every user the batch refers to, with one query, locked in id order so
+    concurrent batches cannot deadlock.
+    """
+    if not any(lookups.values()):
+        return []
+    cur.execute(
+        """
+        SELECT * FROM core_customuser
+        WHERE stripe_customer_id = ANY(%s) OR paypal_subscription_id = ANY(%s)
+        ORDER BY id
+        FOR UPDATE
+        """,
+        (lookups["stripe_customer_id"], lookups["paypal_subscription_id"]),
+    )
+    return [dict(row) for row in cur.fetchall()]
+
+
+def process_event_batch(events):
+    """
+    Process webhook events in one transaction. The users they refer to
+    are fetched with one query, and the handlers' emails, entitlement
+    invalidations and follow-up tasks run only once it commits. Events
+    already processed, or repeated within the batch, are skipped.
+
+    Returns (deferred, failed): the events left uncommitted, in batch
+    order, and those of them that failed. An event is deferred when it
+    failed or an earlier event of the same customer did, so the caller can
+    retry them in order.
+    """
+    from .tasks import send_payment_emails_task
+
+    event_ids = [event["id"] for event in events if event.get("id")]
+    skipped = set(
+        StripeEvent.objects.filter(
+            stripe_event_id__in=event_ids, status=StripeEvent.PROCESSED
+        ).values_list("stripe_event_id", flat=True)
+    )
+    unique_events = []
+    for event in events:
+        event_id = event.get("id")
+        if event_id in skipped:
+            continue
+        if event_id:
+            skipped.add(event_id)
+        unique_events.append(event)
+    events = unique_events
+    if not events:
+        return [], []
+
+    stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+    lookups = lookup_keys(events)
+    deferred, failed, blocked = [], [], set()
+    with payments_cursor(atomic=True) as cur:
+        batch = EventBatch(fetch_users(cur, lookups), lookups)
+        reset_token = current_batch.set(batch)
+        try:
+            for event in events:
+                if partition_key(event) in blocked:
+                    deferred.append(event)
+                    continue
+                # Handlers log and swallow database errors, which would leave
+                # the whole transaction aborted, and process_event swallows
+                # any other handler error; isolate each event instead
+                cur.execute("SAVEPOINT webhook_event")
+                savepoint = batch.savepoint()
+                handled = process_event(parse_event(event), cur)
+                if (not handled and is_handled(event)) or (
+                    cur.connection.info.transaction_status == TRANSACTION_STATUS_INERROR
+                ):
+                    cur.execute("ROLLBACK TO SAVEPOINT webhook_event")
+                    batch.rollback(savepoint)
+                    blocked.add(partition_key(event))
+                    deferred.append(event)
+                    failed.append(event)
+                else:
+                    cur.execute("RELEASE SAVEPOINT webhook_event")
+        finally:
+            current_batch.reset(reset_token)
+
+    for func, args in batch.after_commit:
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Error running {func.__name__} after batch commit: {e}")
+    if batch.emails:
+        send_payment_emails_task.delay(batch.emails)
+    StripeEvent.objects.filter(
+        stripe_event_id__in=[
+            event["id"] for event in events if event.get("id") and event not in deferred
+        ]
+    ).update(status=StripeEvent.PROCESSED, processed_at=timezone.now())
+    logger.info(
+        f"Processed a batch of {len(events)} webhook events, {len(failed)} failed"
+        f" and {len(deferred)} deferred"
+    )
+    return deferred, failed
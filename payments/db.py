@@ -0,0 +1,128 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from django.conf import settings
+from psycopg2 import pool
+
+logger = logging.getLogger("django")
+
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 4
+# Connections idle for longer are pinged before being handed out
+HEALTH_CHECK_INTERVAL = 30
+CONNECT_TIMEOUT = 10
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_used = time.monotonic()
+
+
+def connection_kwargs():
+    database = settings.DATABASES["default"]
+    return {
+        "dbname": database["NAME"],
+        "user": database["USER"],
+        "password": database["PASSWORD"],
+        "host": database["HOST"],
+        "port": database["PORT"],
+        "connect_timeout": CONNECT_TIMEOUT,
+        # Let the server notice workers that vanished mid-connection
+        "keepalives": 1,
+        "keepalives_idle": 60,
+        "connection_factory": PooledConnection,
+    }
+
+
+def get_pool():
+    """
+    The connection pool of the current process, created on first use.
+    Celery forks its workers, and a connection must never be used by two
+    processes, so a pool inherited across a fork is dropped, not closed.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = pool.ThreadedConnectionPool(
+                POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **connection_kwargs()
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - conn.last_used < HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        return True
+    except psycopg2.Error as e:
+        logger.warning(f"Discarding broken payments database connection: {e}")
+        return False
+
+
+def checkout_connection(db_pool):
+    """
+    Take a healthy autocommit connection from `db_pool`, replacing a broken
+    one with a fresh connection once.
+    """
+    conn = db_pool.getconn()
+    if not is_healthy(conn):
+        db_pool.putconn(conn, close=True)
+        conn = db_pool.getconn()
+    if not conn.autocommit:
+        conn.autocommit = True
+    return conn
+
+
+@contextmanager
+def payments_cursor(atomic=False):
+    """
+    DictCursor on a pooled connection, for the raw SQL handlers in
+    payments.processing. Statements autocommit unless `atomic` is set, in
+    which case everything run on the cursor commits together on exit.
+    The connection goes back to the pool on exit and is discarded instead
+    if it failed.
+    """
+    db_pool = get_pool()
+    conn = checkout_connection(db_pool)
+    broken = False
+    try:
+        if atomic:
+            conn.autocommit = False
+        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            yield cur
+        if atomic:
+            conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        if atomic and not broken and not conn.closed:
+            # No-op after a commit
+            conn.rollback()
+            conn.autocommit = True
+        conn.last_used = time.monotonic()
+        db_pool.putconn(conn, close=broken or bool(conn.closed))
@@ -0,0 +1,68 @@
+import logging
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import StripeEvent
+
+logger = logging.getLogger("django")
+
+# Longer than an event can legitimately wait and retry before it is
+# processed or marked failed
+CLAIM_LEASE = timedelta(hours=1)
+
+
+def claim_event(event_id):
+    """
+    Record the webhook event `event_id` as received and return True, or
+    return False if it was already received. The check and the insert are
+    one INSERT ... ON CONFLICT statement, so concurrent redeliveries cannot
+    both claim the event. Events whose processing failed can be claimed
+    again, and so can events left received for longer than
+    CLAIM_LEASE, whose worker or queued message was lost. A new claim
+    restarts the lease from created_at.
+    """
+    table = connection.ops.quote_name(StripeEvent._meta.db_table)
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (stripe_event_id, created_at, status)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (stripe_event_id) DO UPDATE
+            SET status = excluded.status, created_at = excluded.created_at,
+                processed_at = NULL
+            WHERE {table}.status = %s
+               OR ({table}.status = %s AND {table}.created_at < %s)
+            RETURNING id
+            """,
+            [
+                event_id,
+                now,
+                StripeEvent.RECEIVED,
+                StripeEvent.FAILED,
+                StripeEvent.RECEIVED,
+                now - CLAIM_LEASE,
+            ],
+        )
+        return cursor.fetchone() is not None
+
+
+def is_event_processed(event_id):
+    return StripeEvent.objects.filter(
+        stripe_event_id=event_id, status=StripeEvent.PROCESSED
+    ).exists()
+
+
+def mark_event_processed(event_id):
+    StripeEvent.objects.filter(stripe_event_id=event_id).update(
+        status=StripeEvent.PROCESSED, processed_at=timezone.now()
+    )
+
+
+def mark_event_failed(event_id):
+    # Lets a redelivery of the event claim it again
+    StripeEvent.objects.filter(stripe_event_id=event_id).update(
+        status=StripeEvent.FAILED, processed_at=timezone.now()
+    )
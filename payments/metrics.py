@@ -0,0 +1,39 @@
+import os
+
+from prometheus_client import (CollectorRegistry, Counter, Histogram,
+                               multiprocess, start_http_server)
+
+WEBHOOK_EVENTS = Counter(
+    "payments_webhook_events_total",
+    "Webhook events processed, by event type and outcome",
+    ["event_type", "outcome"],
+)
+WEBHOOK_UNHANDLED_EVENTS = Counter(
+    "payments_webhook_unhandled_events_total",
+    "Webhook events without a handler, by provider",
+    ["provider"],
+)
+WEBHOOK_HANDLER_SECONDS = Histogram(
+    "payments_webhook_handler_seconds",
+    "Time spent in each webhook event handler",
+    ["event_type"],
+)
+
+
+def start_metrics_server(port):
+    """
+    Serve the metrics of every Celery worker process on `port`. Prefork
+    workers are separate processes, so this needs prometheus_client's
+    multiprocess mode, enabled by setting PROMETHEUS_MULTIPROC_DIR.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        start_http_server(port)
+        return
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
+
+
+def mark_process_dead(pid):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
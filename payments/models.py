@@ -1,15 +1,26 @@
 import logging
 
-import boto3
-from django.conf import settings
 from django.db import models
 
+from core.images import variant_names
+from core.media import delete_media_files
+
 # Create your models here.
 
 logger = logging.getLogger("django")
 
 
 class StripeEvent(models.Model):
+    """
+    Ledger of the Stripe and PayPal webhook events received, keyed by the
+    provider's event id, so redeliveries are processed only once. See
+    payments.ledger.
+    """
+
+    RECEIVED = "received"
+    PROCESSED = "processed"
+    FAILED = "failed"
+
     stripe_event_id = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
@@ -20,6 +31,8 @@ class SubscriptionPlan(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     image = models.ImageField(null=True, blank=True)
+    # Thumbnails generated from `image`, see core.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     features = models.JSONField()
     metadata = models.JSONField()
     frequency_type = models.CharField(max_length=10)
@@ -32,19 +45,8 @@ class SubscriptionPlan(models.Model):
         return self.name
 
     def delete(self, *args, **kwargs):
-        # Delete associated image file
-        if self.image:
-            # Delete image from S3
-            s3 = boto3.client(
-                "s3",
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            )
-            try:
-                s3.delete_object(
-                    Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=self.image.name
-                )
-            except Exception as e:
-                logger.error(f"Error deleting image from S3: {e}")
-
-        super(SubscriptionPlan, self).delete(*args, **kwargs)
+        image_name = self.image.name if self.image else None
+        media_names = [image_name] + variant_names(self.image_variants)
+        result = super(SubscriptionPlan, self).delete(*args, **kwargs)
+        delete_media_files(media_names)
+        return result
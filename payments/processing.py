@@ -1,10 +1,17 @@
 import logging
+import time
+from contextvars import ContextVar
 
 import psycopg2
+import stripe
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from psycopg2 import Error as Psycopg2Error
 
+from core.entitlements import invalidate_entitlement
+
+from .metrics import (WEBHOOK_EVENTS, WEBHOOK_HANDLER_SECONDS,
+                      WEBHOOK_UNHANDLED_EVENTS)
 from .send_email_functions import (send_invoice_email,
                                    send_payment_failed_email,
                                    send_paypal_subscription_activated_email,
@@ -21,135 +28,222 @@ logger = logging.getLogger("django")
 User = get_user_model()
 
 
+# Set while a batch of events is processed, see payments.batching
+current_batch = ContextVar("payment_event_batch", default=None)
+
+
+class EventBatch:
+    """
+    State shared by the events processed in one transaction: the users
+    they refer to, fetched and locked up front with one query, and the side
+    effects to run only once the transaction commits.
+    """
+
+    def __init__(self, users, lookups):
+        # lookups: column -> values the users were fetched by
+        self.lookups = {column: set(values) for column, values in lookups.items()}
+        self.index = {
+            column: {user[column]: user for user in users if user[column]}
+            for column in self.lookups
+        }
+        self.after_commit = []
+        self.emails = []
+        # (user row, previous values) for every update_user, for rollback
+        self.journal = []
+
+    def savepoint(self):
+        return len(self.after_commit), len(self.emails), len(self.journal)
+
+    def rollback(self, savepoint):
+        """Forget the side effects and row changes made since `savepoint`."""
+        after_commit, emails, journal = savepoint
+        for user, previous in reversed(self.journal[journal:]):
+            user.update(previous)
+        del self.after_commit[after_commit:]
+        del self.emails[emails:]
+        del self.journal[journal:]
+
+    def has_prefetched(self, column, value):
+        return value in self.lookups.get(column, ())
+
+    def find_user(self, column, value):
+        user = self.index[column].get(value)
+        # An earlier event of the batch may have cleared the column
+        if user is not None and user[column] == value:
+            return user
+        return None
+
+
+def find_user(column, value, cur):
+    """The user whose `column` equals `value`, locked for update, or None."""
+    batch = current_batch.get()
+    if batch is not None and batch.has_prefetched(column, value):
+        return batch.find_user(column, value)
+    cur.execute(
+        f"SELECT * FROM core_customuser WHERE {column} = %s FOR UPDATE", (value,)
+    )
+    return cur.fetchone()
+
+
+def update_user(user, cur, **fields):
+    assignments = ", ".join(f"{name} = %s" for name in fields)
+    cur.execute(
+        f"UPDATE core_customuser SET {assignments} WHERE id = %s",
+        (*fields.values(), user["id"]),
+    )
+    batch = current_batch.get()
+    if batch is not None:
+        # Later events of the batch read the prefetched row
+        batch.journal.append((user, {name: user[name] for name in fields}))
+        user.update(fields)
+
+
+def after_commit(func, *args):
+    """Run func(*args) now, or once the current batch has committed."""
+    batch = current_batch.get()
+    if batch is None:
+        return func(*args)
+    batch.after_commit.append((func, args))
+
+
+def deliver_email(send, customer_email, *args):
+    """
+    Send an email now, or hand it to the email task once the current batch
+    has committed. Returns whether it was sent or queued.
+    """
+    batch = current_batch.get()
+    if batch is None:
+        return send(customer_email, *args)
+    batch.emails.append((send.__name__, (customer_email, *args)))
+    return True
+
+
+def parse_event(event_data):
+    # Stripe events carry "type", PayPal events are used as plain dicts
+    if "type" in event_data:
+        return stripe.Event.construct_from(event_data, stripe.api_key)
+    return event_data
+
+
+# event type -> handler(event, cur), filled in by @handles
+EVENT_HANDLERS = {}
+
+
+def handles(*event_types):
+    """Register the decorated function as the handler of `event_types`."""
+
+    def register(handler):
+        for event_type in event_types:
+            EVENT_HANDLERS[event_type] = handler
+        return handler
+
+    return register
+
+
+class EventHandlerError(Exception):
+    """A registered handler failed, so the event must be retried."""
+
+
+def get_event_type(event):
+    # Stripe events carry "type", PayPal events "event_type"
+    return event.get("type", event.get("event_type", "Unknown event type"))
+
+
+def is_handled(event):
+    return get_event_type(event) in EVENT_HANDLERS
+
+
 def process_event(event, cur):
+    """
+    Run the handler registered for the event's type. Returns True if a
+    handler ran to completion, False for unhandled types and failures;
+    is_handled tells the two apart.
+    """
+    provider = "stripe" if "type" in event else "paypal"
+    event_type = get_event_type(event)
+    handler = EVENT_HANDLERS.get(event_type)
+    if handler is None:
+        WEBHOOK_UNHANDLED_EVENTS.labels(provider).inc()
+        logger.info(f"Unhandled {provider} event type: {event_type}")
+        return False
+
+    logger.info(f"Processing event type: {event_type}")
+    outcome = "error"
+    start = time.perf_counter()
     try:
-        event_type = event.get("type", event.get("event_type", "Unknown event type"))
-        logger.info(f"Processing event type: {event_type}")
-
-        print(event)
-
-        # Handle Stripe events
-        if "type" in event:
-            if event_type == "invoice.payment_succeeded":
-                handle_invoice_payment_succeeded(event, cur)
-                return True
-            elif event_type == "invoice.payment_failed":
-                handle_invoice_payment_failed(event, cur)
-                return True
-            elif event_type == "customer.subscription.created":
-                handle_subscription_created(event, cur)
-                return True
-            elif event_type == "customer.subscription.updated":
-                handle_subscription_updated(event, cur)
-                return True
-            elif event_type == "customer.subscription.deleted":
-                handle_subscription_deleted(event, cur)
-                return True
-            elif event_type == "customer.subscription.trial_will_end":
-                handle_trial_will_end(event, cur)
-                return True
-            else:
-                logger.info(f"Unhandled Stripe event type: {event_type}")
-
-        # Handle PayPal events
-        elif "event_type" in event:
-            if event_type == "BILLING.SUBSCRIPTION.ACTIVATED":
-                handle_paypal_subscription_activated(event, cur)
-                return True
-            elif event_type == "BILLING.SUBSCRIPTION.CANCELLED":
-                handle_paypal_subscription_cancelled(event, cur)
-                return True
-            elif event_type == "BILLING.SUBSCRIPTION.EXPIRED":
-                handle_paypal_subscription_expired(event, cur)
-                return True
-            elif event_type == "BILLING.SUBSCRIPTION.SUSPENDED":
-                handle_paypal_subscription_suspended(event, cur)
-                return True
-            elif event_type == "BILLING.SUBSCRIPTION.RE-ACTIVATED":
-                handle_paypal_subscription_reactivated(event, cur)
-                return True
-            elif event_type == "PAYMENT.SALE.COMPLETED":
-                handle_paypal_payment_sale_success(event, cur)
-                return True
-            elif event_type == "BILLING.SUBSCRIPTION.PAYMENT.FAILED":
-                handle_paypal_payment_sale_failed(event, cur)
-                return True
-            else:
-                logger.info(f"Unhandled PayPal event type: {event_type}")
-
+        handler(event, cur)
+        outcome = "success"
+        return True
     except Exception as e:
         logger.error(
             f"Error processing event {event.get('id', 'unknown id')}: {e}",
             exc_info=True,
         )
-
-    return False
+        return False
+    finally:
+        WEBHOOK_HANDLER_SECONDS.labels(event_type).observe(time.perf_counter() - start)
+        WEBHOOK_EVENTS.labels(event_type, outcome).inc()
 
 
+@handles("invoice.payment_succeeded")
 def handle_invoice_payment_succeeded(event, cur):
     invoice = event.data.object
     customer_id = invoice.customer
     customer_email = get_customer_email(customer_id, cur)
     if customer_email:
-        if send_invoice_email(customer_email, invoice):
+        if deliver_email(send_invoice_email, customer_email, invoice):
             logger.info(
                 f"Invoice payment email sent for invoice {invoice.id} to {customer_email}"
             )
 
 
+@handles("invoice.payment_failed")
 def handle_invoice_payment_failed(event, cur):
     invoice = event.data.object
     customer_id = invoice.customer
     customer_email = get_customer_email(customer_id, cur)
     if customer_email:
-        if send_payment_failed_email(customer_email, invoice):
+        if deliver_email(send_payment_failed_email, customer_email, invoice):
             logger.info(
                 f"Payment failed email sent for invoice {invoice.id} to {customer_email}"
             )
 
 
+@handles("customer.subscription.created")
 def handle_subscription_created(event, cur):
     subscription = event.data.object
     if subscription.trial_end:
         customer_id = subscription.customer
         customer_email = get_customer_email(customer_id, cur)
         if customer_email:
-            if send_trial_start_email(customer_email, subscription):
+            if deliver_email(send_trial_start_email, customer_email, subscription):
                 logger.info(
                     f"Trial start email sent for subscription {subscription.id} to {customer_email}"
                 )
 
 
+@handles("customer.subscription.updated")
 def handle_subscription_updated(event, cur):
     pass
 
 
+@handles("customer.subscription.deleted")
 def handle_subscription_deleted(event, cur):
     subscription = event.data.object
     customer_id = subscription.customer
     customer_email = get_customer_email(customer_id, cur)
     if customer_email:
-        if send_subscription_deleted_email(customer_email):
+        if deliver_email(send_subscription_deleted_email, customer_email):
             logger.info(
                 f"Subscription deleted email sent for subscription {subscription.id} to {customer_email}"
             )
 
     try:
-        cur.execute(
-            "SELECT * FROM core_customuser WHERE stripe_customer_id = %s FOR UPDATE",
-            (customer_id,),
-        )
-        user = cur.fetchone()
+        user = find_user("stripe_customer_id", customer_id, cur)
         if user:
             user_id = user["id"]
-            cur.execute(
-                """
-                UPDATE core_customuser
-                SET active = %s, stripe_subscription_id = %s
-                WHERE id = %s
-                """,
-                (False, None, user_id),
-            )
+            update_user(user, cur, active=False, stripe_subscription_id=None)
+            after_commit(invalidate_entitlement, user_id)
             logger.info(f"User {user_id} deactivated after subscription deletion")
         else:
             logger.error(f"User with Stripe customer ID {customer_id} not found")
@@ -157,18 +251,28 @@ def handle_subscription_deleted(event, cur):
         logger.error(f"Database error: {e}")
 
 
+@handles("customer.subscription.trial_will_end")
 def handle_trial_will_end(event, cur):
     subscription = event.data.object
     customer_id = subscription.customer
     customer_email = get_customer_email(customer_id, cur)
     if customer_email:
-        if send_trial_will_end_email(customer_email, subscription):
+        if deliver_email(send_trial_will_end_email, customer_email, subscription):
             logger.info(
                 f"Trial end email sent for subscription {subscription.id} to {customer_email}"
             )
 
 
 def get_customer_email(customer_id, cur):
+    batch = current_batch.get()
+    if batch is not None and batch.has_prefetched("stripe_customer_id", customer_id):
+        user = batch.find_user("stripe_customer_id", customer_id)
+        if user is None:
+            logger.error(
+                f"Error retrieving email for customer {customer_id}: User does not exist"
+            )
+        return user["email"] if user else None
+
     try:
         cur.execute(
             "SELECT email FROM core_customuser WHERE stripe_customer_id = %s",
@@ -208,41 +312,33 @@ def get_customer_email_with_paypal_sub_id(event):
         return None
 
 
+@handles("BILLING.SUBSCRIPTION.ACTIVATED")
 def handle_paypal_subscription_activated(event, cur):
     subscription = event["resource"]
     customer_email = get_customer_email_with_paypal_sub_id(event)
     if customer_email:
-        send_paypal_subscription_activated_email(customer_email, subscription)
+        deliver_email(send_paypal_subscription_activated_email, customer_email, subscription)
         logger.info(
             f"Subscription activated email sent for subscription {subscription['id']} to {customer_email}"
         )
 
 
+@handles("BILLING.SUBSCRIPTION.CANCELLED")
 def handle_paypal_subscription_cancelled(event, cur):
     subscription = event["resource"]
     customer_email = get_customer_email_with_paypal_sub_id(event)
     if customer_email:
-        send_paypal_subscription_cancelled_email(customer_email, subscription)
+        deliver_email(send_paypal_subscription_cancelled_email, customer_email, subscription)
         logger.info(
             f"Subscription cancelled email sent for subscription {subscription['id']} to {customer_email}"
         )
 
     try:
-        cur.execute(
-            "SELECT * FROM core_customuser WHERE paypal_subscription_id = %s FOR UPDATE",
-            (subscription["id"],),
-        )
-        user = cur.fetchone()
+        user = find_user("paypal_subscription_id", subscription["id"], cur)
         if user:
             user_id = user["id"]
-            cur.execute(
-                """
-                UPDATE core_customuser
-                SET active = %s, paypal_subscription_id = %s
-                WHERE id = %s
-                """,
-                (False, None, user_id),
-            )
+            update_user(user, cur, active=False, paypal_subscription_id=None)
+            after_commit(invalidate_entitlement, user_id)
             logger.info(f"User {user_id} deactivated after subscription cancellation")
         else:
             logger.error(f"User with PayPal customer ID {subscription['id']} not found")
@@ -250,27 +346,25 @@ def handle_paypal_subscription_cancelled(event, cur):
         logger.error(f"Database error: {e}")
 
 
+@handles("BILLING.SUBSCRIPTION.EXPIRED")
 def handle_paypal_subscription_expired(event, cur):
     subscription = event["resource"]
     customer_email = get_customer_email_with_paypal_sub_id(event)
     if customer_email:
-        send_paypal_subscription_expired_email(customer_email, subscription)
+        deliver_email(send_paypal_subscription_expired_email, customer_email, subscription)
         logger.info(
             f"Subscription expired email sent for subscription {subscription['id']} to {customer_email}"
         )
 
 
+@handles("BILLING.SUBSCRIPTION.SUSPENDED")
 def handle_paypal_subscription_suspended(event, cur):
     subscription = event["resource"]
     paypal_subscription_id = subscription['id']
 
     try:
         # Fetch the user with the given PayPal subscription ID
-        cur.execute(
-            "SELECT * FROM core_customuser WHERE paypal_subscription_id = %s FOR UPDATE",
-            (paypal_subscription_id,),
-        )
-        user = cur.fetchone()
+        user = find_user("paypal_subscription_id", paypal_subscription_id, cur)
 
         if not user:
             raise ValueError(f"User with PayPal subscription ID {paypal_subscription_id} not found")
@@ -280,7 +374,7 @@ def handle_paypal_subscription_suspended(event, cur):
         try:
             customer_email = get_customer_email_with_paypal_sub_id(event)
             if customer_email:
-                send_paypal_subscription_suspended_email(customer_email, subscription)
+                deliver_email(send_paypal_subscription_suspended_email, customer_email, subscription)
                 logger.info(
                     f"Subscription suspended email sent for subscription {paypal_subscription_id} to {customer_email}"
                 )
@@ -299,37 +393,28 @@ def handle_paypal_subscription_suspended(event, cur):
         logger.error(f"An unexpected error occurred: {general_error}")
 
 
+@handles("BILLING.SUBSCRIPTION.RE-ACTIVATED")
 def handle_paypal_subscription_reactivated(event, cur):
     subscription = event["resource"]
     customer_email = get_customer_email_with_paypal_sub_id(event)
     if customer_email:
-        send_paypal_subscription_reactivated_email(customer_email, subscription)
+        deliver_email(send_paypal_subscription_reactivated_email, customer_email, subscription)
         logger.info(
             f"Subscription re-activated email sent for subscription {subscription['id']} to {customer_email}"
         )
 
 
+@handles("PAYMENT.SALE.COMPLETED")
 def handle_paypal_payment_sale_success(event, cur):
     paypal_subscription_id = event['resource']['billing_agreement_id']
     try:
         # Fetch the user based on paypal_subscription_id with a lock for updates
-        cur.execute(
-            "SELECT * FROM core_customuser WHERE paypal_subscription_id = %s FOR UPDATE",
-            (paypal_subscription_id,),
-        )
-        user = cur.fetchone()
+        user = find_user("paypal_subscription_id", paypal_subscription_id, cur)
 
         if user:
             user_id = user['id']
             # Update the failed payments count
-            cur.execute(
-                """
-                UPDATE core_customuser
-                SET paypal_failed_payments_count = %s
-                WHERE id = %s
-                """,
-                (0, user_id),
-            )
+            update_user(user, cur, paypal_failed_payments_count=0)
 
             logger.info(f"{user_id} made a succesfull payment  and had failed payments. New count was reset to zero: {0}")
         else:
@@ -338,17 +423,14 @@ def handle_paypal_payment_sale_success(event, cur):
         logger.error(f"Database error while processing payment failure: {e}")
 
 
+@handles("BILLING.SUBSCRIPTION.PAYMENT.FAILED")
 def handle_paypal_payment_sale_failed(event, cur):
     from .tasks import cancel_paypal_subscription_task
 
     paypal_subscription_id = event['resource']['id']
     try:
         # Fetch the user based on paypal_subscription_id with a lock for updates
-        cur.execute(
-            "SELECT * FROM core_customuser WHERE paypal_subscription_id = %s FOR UPDATE",
-            (paypal_subscription_id,),
-        )
-        user = cur.fetchone()
+        user = find_user("paypal_subscription_id", paypal_subscription_id, cur)
 
         if user:
             user_id = user['id']
@@ -358,24 +440,26 @@ def handle_paypal_payment_sale_failed(event, cur):
             failed_payments_count += 1
 
             # Update the failed payments count in the database
-            cur.execute(
-                """
-                UPDATE core_customuser
-                SET paypal_failed_payments_count = %s
-                WHERE id = %s
-                """,
-                (failed_payments_count, user_id),
+            update_user(
+                user, cur, paypal_failed_payments_count=failed_payments_count
             )
 
             logger.info(f"{user_id} had a failed payment. New failed payments count: {failed_payments_count}")
             # Check if threshold is reached
             if failed_payments_count >= settings.PAYPAL_FAILED_SUBSCRIPTION_PAYMENT_THRESHOLD:
                 # Cancel subscription and deactivate user
-                cancel_paypal_subscription_task.delay(paypal_subscription_id)
-                deactivate_user_account(user_id, cur)
+                after_commit(
+                    cancel_paypal_subscription_task.delay, paypal_subscription_id
+                )
+                deactivate_user_account(user, cur)
                 logger.info(f"Subscription {paypal_subscription_id} cancelled due to failed payments.")
         else:
             logger.error(f"User with PayPal subscription ID {paypal_subscription_id} not found")
     except psycopg2.Error as e:
         logger.error(f"Database error while processing payment failure: {e}")
 
+
+def deactivate_user_account(user, cur):
+    update_user(user, cur, active=False)
+    after_commit(invalidate_entitlement, user["id"])
+    logger.info(f"User {user['id']} deactivated")
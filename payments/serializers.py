@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from core.images import image_placeholder, image_srcset
+
 from .models import SubscriptionPlan
 
 
@@ -22,9 +24,22 @@ class StripePriceSerializer(serializers.Serializer):
 
 
 class SubscriptionPlanSerializer(serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
+    image_placeholder = serializers.SerializerMethodField()
+
     class Meta:
         model = SubscriptionPlan
-        fields = "__all__"
+        exclude = ("image_variants",)
+
+    def get_image_srcset(self, obj):
+        if not obj.image:
+            return {}
+        return image_srcset(
+            obj.image_variants, obj.image.storage, self.context.get("request")
+        )
+
+    def get_image_placeholder(self, obj):
+        return image_placeholder(obj.image_variants)
 
     def validate_features(self, value):
         # Just an example: Ensure that each item is a dictionary with a 'name' key
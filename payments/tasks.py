@@ -1,48 +1,62 @@
 import logging
 import os
 
-import psycopg2
-import psycopg2.extras
 import requests
 import stripe
 from celery.exceptions import MaxRetriesExceededError
-from django.conf import settings
+from celery.signals import worker_init, worker_process_shutdown
 
 from celery import shared_task
 from core.models import CustomUser
+from payments import send_email_functions
+from payments.batching import drain_payment_events, pending_lanes
+from payments.db import close_pool, payments_cursor
+from payments.ledger import (is_event_processed, mark_event_failed,
+                             mark_event_processed)
+from payments.metrics import mark_process_dead, start_metrics_server
 from payments.paypal_functions import get_paypal_access_token, get_paypal_base_url
-from payments.processing import process_event
+from payments.processing import (EventHandlerError, is_handled, parse_event,
+                                 process_event)
 
 logger = logging.getLogger("django")
 
 
+@worker_init.connect
+def start_payments_metrics(**kwargs):
+    port = os.environ.get("PAYMENTS_METRICS_PORT")
+    if port:
+        start_metrics_server(int(port))
+
+
+@worker_process_shutdown.connect
+def close_payments_pool(pid=None, **kwargs):
+    close_pool()
+    mark_process_dead(pid or os.getpid())
+
+
 @shared_task(
     bind=True, max_retries=5, default_retry_delay=60
 )  # Retry up to 5 times with a 60-second delay
 def process_payment_event(self, event_data):
     stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
 
-    event = None
-    if "type" in event_data:  # Stripe event structure
-        event = stripe.Event.construct_from(event_data, stripe.api_key)
-    else:  # Assume it's a PayPal event structure
-        event = event_data
+    event = parse_event(event_data)
 
-    conn = None
-    cur = None
-    try:
-        conn = psycopg2.connect(
-            dbname=settings.DATABASES["default"]["NAME"],
-            user=settings.DATABASES["default"]["USER"],
-            password=settings.DATABASES["default"]["PASSWORD"],
-            host=settings.DATABASES["default"]["HOST"],
-            port=settings.DATABASES["default"]["PORT"],
-        )
-        conn.autocommit = True
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    event_id = event_data.get("id")
+    if event_id is not None and is_event_processed(event_id):
+        # Celery redelivered a message that already went through
+        logger.info(f"Event {event_id} already processed, skipping")
+        return
 
-        # Attempt to process the event
-        process_event(event, cur)
+    try:
+        # Pooled per worker process; a broken connection is replaced on the
+        # retry below
+        with payments_cursor() as cur:
+            handled = process_event(event, cur)
+        if not handled and is_handled(event):
+            raise EventHandlerError(f"Handler failed for event {event_id}")
+        if event_id is not None:
+            mark_event_processed(event_id)
 
     except Exception as e:
         logger.error(
@@ -51,18 +65,50 @@ def process_payment_event(self, event_data):
         )
 
         # Retry the task if it fails
-        try:
-            self.retry(exc=e)
-        except self.MaxRetriesExceededError:
+        if self.request.retries >= self.max_retries:
             logger.error(
                 f"Max retries exceeded for event {event.get('id', 'unknown id')}"
             )
-
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+            if event_id is not None:
+                mark_event_failed(event_id)
+            return
+        raise self.retry(exc=e)
+
+
+@shared_task(ignore_result=True)
+def drain_payment_events_task():
+    """Start a drain for every webhook lane with buffered events."""
+    for lane in pending_lanes():
+        drain_payment_lane_task.delay(lane)
+
+
+@shared_task(ignore_result=True)
+def drain_payment_lane_task(lane):
+    """Process the webhook events buffered on `lane` in batches."""
+    drained = drain_payment_events(lane)
+    if drained:
+        logger.info(f"Drained {drained} webhook events from lane {lane}")
+
+
+@shared_task(ignore_result=True)
+def send_payment_emails_task(emails):
+    """
+    Send the emails queued by a processed webhook batch, as
+    (send_email_functions name, args) pairs. One failed email does not
+    stop the rest.
+    """
+    stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+    for name, args in emails:
+        send = getattr(send_email_functions, name, None)
+        if not name.startswith("send_") or send is None:
+            logger.error(f"Unknown payment email function {name}")
+            continue
+        # Stripe objects arrive as plain dicts; restore attribute access
+        args = [stripe.util.convert_to_stripe_object(arg) for arg in args]
+        try:
+            send(*args)
+        except Exception as e:
+            logger.error(f"Error sending {name} to {args[0]}: {e}", exc_info=True)
 
 
 @shared_task(bind=True, max_retries=5, default_retry_delay=60)
@@ -17,7 +17,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from stripe.error import StripeError
 
+from core.conditional import make_etag, not_modified_response, set_validators
 from core.models import CustomUser, TrialDays
+from core.versioning import get_version_stamp
 from payments.paypal_functions import (get_paypal_access_token,
                                        get_paypal_base_url,
                                        get_paypal_subscription,
@@ -25,9 +27,10 @@ from payments.paypal_functions import (get_paypal_access_token,
                                        schedule_subscription_deletion,
                                        verify_paypal_webhook_signature)
 
+from .batching import WebhookBufferUnavailable, buffer_payment_event
+from .ledger import claim_event, mark_event_failed
 from .models import SubscriptionPlan
 from .serializers import PaymentMethodSerializer, SubscriptionPlanSerializer
-from .tasks import process_payment_event
 
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
 # Create your views here.
@@ -63,13 +66,24 @@ class SubscriptionPlanAPIView(APIView):
             return 0
 
     def get(self, request, pk=None):
+        version = get_version_stamp("payments:subscription_plans")
+        if version:
+            stamp, modified_at = version
+            etag = make_etag("subscription_plans", pk, stamp)
+            not_modified = not_modified_response(request, etag, modified_at)
+            if not_modified is not None:
+                return not_modified
+
         if pk:
-            plan = SubscriptionPlan.objects.get(pk=pk)
-            logger.info(f"A specific plan was retrieved {plan}")
+            plans = SubscriptionPlan.objects.get(pk=pk)
+            logger.info(f"A specific plan was retrieved {plans}")
         else:
             plans = SubscriptionPlan.objects.all()
         serializer = SubscriptionPlanSerializer(plans, many=not pk)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+        if version:
+            set_validators(response, etag, modified_at)
+        return response
 
     def post(self, request):
 
@@ -1102,6 +1116,33 @@ class PaymentDetailView(APIView):
             )
 
 
+def enqueue_payment_event(event_data):
+    """
+    Queue a webhook event for processing once per event id. Returns False
+    for redeliveries of an event already received, which are dropped here
+    so they never reach Celery. Raises WebhookBufferUnavailable when Redis
+    is down, leaving the event claimable by the provider's next delivery.
+    """
+    event_id = event_data.get("id")
+    if event_id is None:
+        logger.warning("Webhook event without an id, cannot deduplicate it")
+    elif not claim_event(event_id):
+        logger.info(f"Duplicate webhook event {event_id} ignored")
+        return False
+
+    try:
+        # Batched by drain_payment_events_task on the customer's lane. There
+        # is no unordered fallback: the provider retries on a 5xx instead
+        if not buffer_payment_event(event_data):
+            raise WebhookBufferUnavailable(f"Cannot buffer webhook event {event_id}")
+    except Exception:
+        # Let the provider's next delivery claim the event again
+        if event_id is not None:
+            mark_event_failed(event_id)
+        raise
+    return True
+
+
 class StripeWebhookView(APIView):
     def post(self, request, *args, **kwargs):
         payload = request.body
@@ -1115,9 +1156,13 @@ class StripeWebhookView(APIView):
             logger.error(f"Invalid payload received: {str(e)}")
             return JsonResponse({"error": str(e)}, status=400)
 
-        # Send the event to be processed by Celery
-        process_payment_event.delay(payload_data)
-        logger.info(f"Event {event.id} sent to Celery")
+        # Send the event to be processed by Celery, unless it is a redelivery
+        try:
+            if enqueue_payment_event(payload_data):
+                logger.info(f"Event {event.id} sent to Celery")
+        except WebhookBufferUnavailable as e:
+            logger.error(str(e))
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         return Response(status=200)
 
@@ -1134,7 +1179,11 @@ def paypal_webhook(request):
                 f"Verified PayPal event: {event['event_type']}, ID: {event.get('id', 'No ID')}"
             )
 
-            process_payment_event.delay(event)
+            try:
+                enqueue_payment_event(event)
+            except WebhookBufferUnavailable as e:
+                logger.error(str(e))
+                return HttpResponse(status=503)
 
             return HttpResponse(status=200)
         else:
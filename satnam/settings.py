@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "sslserver",
     "rest_framework",
     "corsheaders",
@@ -324,7 +325,9 @@ if TESTING:
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER", REDIS_URL)
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_BACKEND", REDIS_URL)
 
-CELERY_WORKER_CONCURRENCY = 2
+# Payment webhooks are serialized per customer by their lanes (see
+# payments.batching), so workers can run in parallel safely
+CELERY_WORKER_CONCURRENCY = int(os.environ.get("CELERY_WORKER_CONCURRENCY", 8))
 
 CELERY_BROKER_TRANSPORT_OPTIONS = {
     'ssl': {
@@ -332,6 +335,21 @@ CELERY_BROKER_TRANSPORT_OPTIONS = {
     }
 }
 
+CELERY_BEAT_SCHEDULE = {
+    "retry-failed-media-deletions": {
+        "task": "core.tasks.retry_failed_media_deletions_task",
+        "schedule": 60 * 30,
+    },
+    "drain-payment-events": {
+        "task": "payments.tasks.drain_payment_events_task",
+        "schedule": 5,
+    },
+    "flush-video-view-counts": {
+        "task": "videos.tasks.flush_view_counts_task",
+        "schedule": 60 * 5,
+    },
+}
+
 
 # logging logic
 log_directory = os.path.join(BASE_DIR, "logs")
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class SchedulerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "scheduler"
+
+    def ready(self):
+        from core.versioning import track_model_versions
+
+        from .models import Event
+
+        track_model_versions("scheduler:events", Event)
@@ -1,6 +1,9 @@
 from rest_framework import permissions, status, viewsets
 from rest_framework.response import Response
 
+from core.conditional import make_etag, not_modified_response, set_validators
+from core.versioning import get_version_stamp
+
 from .models import Event
 from .serializers import EventSerializer
 
@@ -20,6 +23,19 @@ class EventViewSet(viewsets.ModelViewSet):
     serializer_class = EventSerializer
     permission_classes = [IsStaffOrReadOnly]
 
+    def list(self, request, *args, **kwargs):
+        version = get_version_stamp("scheduler:events")
+        if version is None:
+            return super().list(request, *args, **kwargs)
+
+        stamp, modified_at = version
+        etag = make_etag("event_list", stamp)
+        not_modified = not_modified_response(request, etag, modified_at)
+        if not_modified is not None:
+            return not_modified
+        response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, modified_at)
+
     def create(self, request, *args, **kwargs):
         # Initial validation of the incoming data
         if isinstance(request.data, list):
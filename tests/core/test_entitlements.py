@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.entitlements import get_entitlement
+from tests.helpers import FakeRedisMixin
+from videos.models import Video
+
+
+class EntitlementCacheTestCase(FakeRedisMixin, APITestCase):
+    redis_modules = ("core.entitlements",)
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            username="member",
+            email="member@example.com",
+            password="pAssw0rd!",
+            active=True,
+            stripe_subscription_id="sub_123",
+        )
+        self.video = Video.objects.create(
+            title="Paid video",
+            image="videos/sample.jpg",
+            description="description",
+            url="http://example.com/video/",
+            free=False,
+        )
+        self.url = reverse("video-detail", args=[self.video.id])
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_entitlement_record(self):
+        entitlement = get_entitlement(self.user.id)
+        self.assertTrue(entitlement["active"])
+        self.assertFalse(entitlement["is_staff"])
+        self.assertEqual(entitlement["provider"], "stripe")
+        self.assertIsNone(get_entitlement(self.user.id + 1))
+
+    def test_cached_entitlement_skips_users_table(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        # Only the video row and its categories
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivation_invalidates_entitlement(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.active = False
+            self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer not-a-token")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,113 @@
+import io
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from PIL import Image
+
+from core.images import (generate_image_derivatives, image_srcset,
+                         variant_names)
+from core.tasks import generate_image_derivatives_task
+from videos.models import Video
+from videos.serializers import VideoSerializer
+
+
+def make_png(width, height, mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ImageDerivativesTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.storage = FileSystemStorage(
+            location=self.media_root, base_url="/media/"
+        )
+
+    def test_generates_smaller_widths_in_both_formats(self):
+        name = self.storage.save("videos/poster.png", io.BytesIO(make_png(800, 400)))
+        variants = generate_image_derivatives(name, self.storage)
+
+        self.assertEqual(variants["source"], name)
+        self.assertEqual([width for width, _ in variants["webp"]], [320, 640])
+        self.assertEqual([width for width, _ in variants["jpeg"]], [320, 640])
+        with self.storage.open(variants["webp"][0][1]) as derivative:
+            image = Image.open(derivative)
+            self.assertEqual((image.format, image.size), ("WEBP", (320, 160)))
+        self.assertEqual(len(variant_names(variants)), 4)
+        self.assertTrue(variants["placeholder"].startswith("data:image/webp;base64,"))
+
+    def test_palette_images_are_converted(self):
+        name = self.storage.save(
+            "videos/logo.png", io.BytesIO(make_png(700, 700, mode="P"))
+        )
+        variants = generate_image_derivatives(name, self.storage)
+        self.assertEqual(len(variants["jpeg"]), 2)
+
+    def test_srcset(self):
+        variants = {
+            "source": "videos/a.png",
+            "webp": [[320, "videos/a_320w.webp"], [640, "videos/a_640w.webp"]],
+        }
+        self.assertEqual(
+            image_srcset(variants, self.storage),
+            {"webp": "/media/videos/a_320w.webp 320w, /media/videos/a_640w.webp 640w"},
+        )
+        self.assertEqual(image_srcset({}, self.storage), {})
+
+    def create_video(self):
+        image_field = Video._meta.get_field("image")
+        original_storage = image_field.storage
+        image_field.storage = self.storage
+        self.addCleanup(setattr, image_field, "storage", original_storage)
+
+        return Video.objects.create(
+            title="Poster",
+            image=SimpleUploadedFile("poster.png", make_png(700, 350)),
+            description="description",
+            url="http://example.com/video/",
+        )
+
+    def test_task_records_variants_on_the_video(self):
+        video = self.create_video()
+        generate_image_derivatives_task(Video._meta.label, video.pk, video.image.name)
+
+        video.refresh_from_db()
+        self.assertEqual(video.image_variants["source"], video.image.name)
+        srcset = VideoSerializer(video).data["image_srcset"]
+        self.assertIn("320w", srcset["webp"])
+        self.assertIn("640w", srcset["jpeg"])
+        self.assertIsNotNone(VideoSerializer(video).data["image_placeholder"])
+
+    def test_backfill_command(self):
+        video = self.create_video()
+        with patch.object(
+            generate_image_derivatives_task,
+            "delay",
+            side_effect=generate_image_derivatives_task,
+        ):
+            call_command(
+                "backfill_image_placeholders", queue=True, stdout=io.StringIO()
+            )
+        video.refresh_from_db()
+        self.assertIsNotNone(video.image_variants.get("placeholder"))
+
+    def test_backfill_command_counts_unreadable_images_as_failed(self):
+        video = self.create_video()
+        self.storage.delete(video.image.name)
+        self.storage.save(video.image.name, io.BytesIO(b"not an image"))
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        with self.assertLogs("django", "ERROR"):
+            call_command(
+                "backfill_image_placeholders", workers=1, stdout=stdout, stderr=stderr
+            )
+
+        self.assertIn("Processed 0 of 1 images", stdout.getvalue())
+        self.assertIn(f"Failed videos.Video {video.pk}", stderr.getvalue())
@@ -0,0 +1,66 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+
+from core.media import FAILED_MEDIA_DELETIONS_KEY, delete_s3_objects
+from core.tasks import (delete_media_files_task,
+                        retry_failed_media_deletions_task)
+from tests.helpers import FakeRedisMixin
+from videos.models import Category, Video
+
+
+class S3DeletionTestCase(FakeRedisMixin, TestCase):
+    redis_modules = ("core.media",)
+
+    def setUp(self):
+        super().setUp()
+        self.s3 = MagicMock()
+        self.s3.delete_objects.return_value = {}
+        patcher = patch("core.media.get_s3_client", return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keys_are_deleted_in_batches_of_1000(self):
+        keys = [f"videos/{i}.jpg" for i in range(1500)]
+        self.assertEqual(delete_s3_objects(keys), [])
+        batches = [
+            call.kwargs["Delete"]["Objects"]
+            for call in self.s3.delete_objects.call_args_list
+        ]
+        self.assertEqual([len(batch) for batch in batches], [1000, 500])
+
+    def test_failed_keys_go_to_retry_list(self):
+        self.s3.delete_objects.return_value = {
+            "Errors": [{"Key": "videos/b.jpg", "Code": "AccessDenied"}]
+        }
+        delete_media_files_task(["videos/a.jpg", "videos/b.jpg"])
+        self.assertEqual(
+            self.fake_redis.lrange(FAILED_MEDIA_DELETIONS_KEY, 0, -1),
+            [b"videos/b.jpg"],
+        )
+
+        self.s3.delete_objects.return_value = {}
+        retry_failed_media_deletions_task()
+        self.assertEqual(self.fake_redis.llen(FAILED_MEDIA_DELETIONS_KEY), 0)
+        self.assertEqual(
+            self.s3.delete_objects.call_args.kwargs["Delete"]["Objects"],
+            [{"Key": "videos/b.jpg"}],
+        )
+
+    @override_settings(DEBUG=False)
+    def test_category_deletion_queues_one_task(self):
+        category = Category.objects.create(title="Hatha", description="")
+        for i in range(3):
+            video = Video.objects.create(
+                title=f"Video {i}",
+                image=f"videos/{i}.jpg",
+                description="description",
+                url="http://example.com/video/",
+            )
+            video.categories.add(category)
+
+        with patch("core.tasks.delete_media_files_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                category.delete_with_videos()
+        delay.assert_called_once_with(["videos/0.jpg", "videos/1.jpg", "videos/2.jpg"])
+        self.assertFalse(Video.objects.exists())
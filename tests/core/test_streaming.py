@@ -0,0 +1,124 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from contact.models import ContactSubmission
+from core.streaming import iter_json_array
+from videos.models import Category, Video
+
+
+def create_user(username, is_staff=False):
+    return get_user_model().objects.create_user(
+        username=username,
+        password="pAssw0rd!",
+        first_name="Test",
+        last_name="User",
+        email=f"{username}@example.com",
+        telephone="3331722789",
+        is_staff=is_staff,
+    )
+
+
+def read_stream(response):
+    return json.loads(b"".join(response.streaming_content))
+
+
+class IterJsonArrayTestCase(TestCase):
+    def test_empty_queryset(self):
+        chunks = list(iter_json_array(ContactSubmission.objects.all(), list))
+        self.assertEqual(json.loads(b"".join(chunks)), [])
+
+    def test_reads_in_chunks(self):
+        ContactSubmission.objects.bulk_create(
+            ContactSubmission(name=f"n{i}", email="a@example.com", message="m")
+            for i in range(5)
+        )
+        queryset = ContactSubmission.objects.order_by("id").values("name")
+        serialized = []
+
+        def serialize(chunk):
+            serialized.append(len(chunk))
+            return chunk
+
+        chunks = list(iter_json_array(queryset, serialize, chunk_size=2))
+
+        self.assertEqual(serialized, [2, 2, 1])
+        self.assertEqual(
+            json.loads(b"".join(chunks)), [{"name": f"n{i}"} for i in range(5)]
+        )
+
+
+class StreamingExportTestCase(APITestCase):
+    def setUp(self):
+        self.staff = create_user("staff", is_staff=True)
+        self.member = create_user("member")
+
+    def test_user_list_streams_every_user_to_staff(self):
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse("user-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        users = read_stream(response)
+        self.assertEqual([user["username"] for user in users], ["staff", "member"])
+        self.assertNotIn("password1", users[0])
+
+    def test_user_list_is_staff_only(self):
+        self.client.force_authenticate(self.member)
+        response = self.client.get(reverse("user-list"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_contact_stream(self):
+        ContactSubmission.objects.create(
+            name="John", email="john@example.com", message="Hi"
+        )
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse("contacts"), {"stream": "true"})
+
+        self.assertEqual(
+            read_stream(response),
+            [
+                {
+                    "id": ContactSubmission.objects.get().id,
+                    "name": "John",
+                    "email": "john@example.com",
+                    "message": "Hi",
+                }
+            ],
+        )
+
+    def test_video_stream_queries_once_per_chunk(self):
+        category = Category.objects.create(title="Yoga", description="")
+        for i in range(3):
+            video = Video.objects.create(
+                title=f"Video {i}",
+                image=f"videos/{i}.jpg",
+                description="description",
+                url="https://example.com/",
+            )
+            video.categories.add(category)
+        self.client.force_authenticate(self.staff)
+
+        response = self.client.get(
+            reverse("video-list"), {"stream": "true", "category": category.id}
+        )
+        with CaptureQueriesContext(connection) as queries:
+            videos = read_stream(response)
+
+        self.assertEqual(
+            [video["title"] for video in videos], ["Video 0", "Video 1", "Video 2"]
+        )
+        self.assertEqual(videos[0]["categories"][0]["title"], "Yoga")
+        # One query for the videos and one for their categories
+        self.assertEqual(len(queries), 2)
+
+    def test_video_stream_is_staff_only(self):
+        self.client.force_authenticate(self.member)
+        response = self.client.get(reverse("video-list"), {"stream": "true"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
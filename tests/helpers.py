@@ -0,0 +1,34 @@
+from unittest.mock import patch
+
+import fakeredis
+
+from videos.models import Video
+
+
+def create_video(title, description="description", **fields):
+    return Video.objects.create(
+        title=title,
+        image="videos/sample.jpg",
+        description=description,
+        url="http://example.com/video/",
+        **fields,
+    )
+
+
+class FakeRedisMixin:
+    """
+    Give each test an empty fakeredis instance as the Redis connection of
+    the modules listed in `redis_modules`.
+    """
+
+    redis_modules = ("videos.cache",)
+
+    def setUp(self):
+        super().setUp()
+        self.fake_redis = fakeredis.FakeRedis()
+        for module in self.redis_modules:
+            patcher = patch(
+                f"{module}.get_redis_connection", return_value=self.fake_redis
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -0,0 +1,398 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from django.urls import reverse
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
+from redis.exceptions import LockError
+
+from payments.batching import (MAX_EVENT_ATTEMPTS, WEBHOOK_LANES,
+                               attempts_key, buffer_key,
+                               buffer_payment_event, drain_lock_key,
+                               drain_payment_events, draining_key,
+                               lane_for_event, pending_lanes,
+                               process_event_batch)
+from payments.ledger import claim_event
+from payments.models import StripeEvent
+from payments.processing import (EVENT_HANDLERS, deliver_email, find_user,
+                                 update_user)
+from payments.send_email_functions import send_invoice_email
+from payments.tasks import drain_payment_events_task, send_payment_emails_task
+from tests.helpers import FakeRedisMixin
+
+
+def invoice_event(event_id, customer_id):
+    return {
+        "id": event_id,
+        "type": "invoice.payment_succeeded",
+        "data": {
+            "object": {
+                "object": "invoice",
+                "id": f"in_{event_id}",
+                "customer": customer_id,
+                "amount_due": 2000,
+                "currency": "usd",
+            }
+        },
+    }
+
+
+def paypal_payment_failed_event(event_id, subscription_id):
+    return {
+        "id": event_id,
+        "event_type": "BILLING.SUBSCRIPTION.PAYMENT.FAILED",
+        "resource": {"id": subscription_id},
+    }
+
+
+def user_row(user_id, **fields):
+    row = {
+        "id": user_id,
+        "email": f"user{user_id}@example.com",
+        "stripe_customer_id": None,
+        "paypal_subscription_id": None,
+        "paypal_failed_payments_count": 0,
+        "active": True,
+    }
+    row.update(fields)
+    return row
+
+
+class DrainPaymentEventsTestCase(FakeRedisMixin, TestCase):
+    redis_modules = ("payments.batching",)
+
+    def test_drains_lane_in_batches(self):
+        events = [invoice_event(f"evt_{i}", "cus_1") for i in range(5)]
+        for event in events:
+            self.assertTrue(buffer_payment_event(event))
+        lane = lane_for_event(events[0])
+
+        with patch(
+            "payments.batching.process_event_batch", return_value=([], [])
+        ) as process_batch:
+            self.assertEqual(drain_payment_events(lane, batch_size=2), 5)
+
+        batches = [call.args[0] for call in process_batch.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(sum(batches, []), events)
+        self.assertFalse(
+            self.fake_redis.exists(draining_key(lane), drain_lock_key(lane))
+        )
+
+    def test_customer_events_share_a_lane(self):
+        self.assertEqual(
+            lane_for_event(invoice_event("evt_1", "cus_1")),
+            lane_for_event(invoice_event("evt_2", "cus_1")),
+        )
+        # A PayPal sale names its subscription in billing_agreement_id
+        sale = {
+            "id": "WH-2",
+            "event_type": "PAYMENT.SALE.COMPLETED",
+            "resource": {"id": "SALE-1", "billing_agreement_id": "I-1"},
+        }
+        self.assertEqual(
+            lane_for_event(paypal_payment_failed_event("WH-1", "I-1")),
+            lane_for_event(sale),
+        )
+        lanes = {
+            lane_for_event(invoice_event(f"evt_{i}", f"cus_{i}")) for i in range(50)
+        }
+        self.assertEqual(lanes, set(range(WEBHOOK_LANES)))
+
+    def test_pending_lanes(self):
+        self.assertEqual(pending_lanes(), [])
+        event = invoice_event("evt_1", "cus_1")
+        buffer_payment_event(event)
+        self.fake_redis.rpush(draining_key(3), json.dumps({"id": "evt_2"}))
+
+        self.assertEqual(pending_lanes(), sorted({lane_for_event(event), 3}))
+
+    @patch("payments.tasks.drain_payment_lane_task.delay")
+    def test_drain_task_fans_out_to_pending_lanes(self, delay):
+        event = invoice_event("evt_1", "cus_1")
+        buffer_payment_event(event)
+
+        drain_payment_events_task()
+
+        delay.assert_called_once_with(lane_for_event(event))
+
+    def test_failed_batch_is_retried_on_next_drain(self):
+        first = invoice_event("evt_1", "cus_1")
+        second = invoice_event("evt_2", "cus_1")
+        lane = lane_for_event(first)
+        buffer_payment_event(first)
+        with patch(
+            "payments.batching.process_event_batch",
+            side_effect=ConnectionError("database down"),
+        ):
+            with self.assertRaises(ConnectionError):
+                drain_payment_events(lane)
+
+        buffer_payment_event(second)
+        with patch(
+            "payments.batching.process_event_batch", return_value=([], [])
+        ) as process_batch:
+            self.assertEqual(drain_payment_events(lane), 1)
+            self.assertEqual(drain_payment_events(lane), 1)
+
+        self.assertEqual(
+            [call.args[0] for call in process_batch.call_args_list],
+            [[first], [second]],
+        )
+
+    @patch("payments.tasks.process_payment_event.delay")
+    @patch("payments.views.verify_paypal_webhook_signature", return_value=True)
+    def test_webhook_buffers_events(self, _, delay):
+        event = paypal_payment_failed_event("WH-1", "I-1")
+        response = self.client.post(
+            reverse("paypal_webhook"),
+            data=json.dumps(event),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        delay.assert_not_called()
+        buffered = self.fake_redis.lrange(buffer_key(lane_for_event(event)), 0, -1)
+        self.assertEqual([json.loads(item) for item in buffered], [event])
+
+    def test_only_one_drain_per_lane_at_a_time(self):
+        busy = invoice_event("evt_1", "cus_1")
+        for i in range(50):
+            free = invoice_event("evt_2", f"cus_{i}")
+            if lane_for_event(free) != lane_for_event(busy):
+                break
+        buffer_payment_event(busy)
+        buffer_payment_event(free)
+        self.fake_redis.set(drain_lock_key(lane_for_event(busy)), "other worker")
+
+        with patch(
+            "payments.batching.process_event_batch", return_value=([], [])
+        ) as process_batch:
+            self.assertEqual(drain_payment_events(lane_for_event(busy)), 0)
+            self.assertEqual(drain_payment_events(lane_for_event(free)), 1)
+        process_batch.assert_called_once_with([free])
+
+    def test_lock_taken_over_after_expiry_is_not_released(self):
+        event = invoice_event("evt_1", "cus_1")
+        lane = lane_for_event(event)
+        buffer_payment_event(event)
+
+        def expire_lock(events):
+            self.fake_redis.set(drain_lock_key(lane), "other worker")
+            return [], []
+
+        with patch("payments.batching.process_event_batch", side_effect=expire_lock):
+            with self.assertRaises(LockError):
+                drain_payment_events(lane)
+
+        self.assertEqual(self.fake_redis.get(drain_lock_key(lane)), b"other worker")
+
+    def test_deferred_events_block_the_lane_head(self):
+        failing = invoice_event("evt_1", "cus_1")
+        follower = invoice_event("evt_2", "cus_1")
+        later = invoice_event("evt_3", "cus_1")
+        lane = lane_for_event(failing)
+        for event in (failing, follower, later):
+            buffer_payment_event(event)
+
+        with patch(
+            "payments.batching.process_event_batch",
+            return_value=([failing, follower], [failing]),
+        ) as process_batch:
+            self.assertEqual(drain_payment_events(lane, batch_size=2), 0)
+
+        process_batch.assert_called_once_with([failing, follower])
+        pending = self.fake_redis.lrange(draining_key(lane), 0, -1)
+        self.assertEqual([json.loads(item) for item in pending], [failing, follower, later])
+
+        with patch(
+            "payments.batching.process_event_batch", return_value=([], [])
+        ) as process_batch:
+            self.assertEqual(drain_payment_events(lane, batch_size=2), 3)
+        self.assertEqual(
+            [call.args[0] for call in process_batch.call_args_list],
+            [[failing, follower], [later]],
+        )
+
+    def test_event_is_given_up_after_max_attempts(self):
+        failing = invoice_event("evt_1", "cus_1")
+        follower = invoice_event("evt_2", "cus_1")
+        lane = lane_for_event(failing)
+        claim_event("evt_1")
+        buffer_payment_event(failing)
+        buffer_payment_event(follower)
+        self.fake_redis.hset(attempts_key(lane), "evt_1", MAX_EVENT_ATTEMPTS - 1)
+
+        with patch(
+            "payments.batching.process_event_batch",
+            return_value=([failing, follower], [failing]),
+        ):
+            self.assertEqual(drain_payment_events(lane), 1)
+
+        pending = self.fake_redis.lrange(draining_key(lane), 0, -1)
+        self.assertEqual([json.loads(item) for item in pending], [follower])
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.FAILED)
+        self.assertFalse(self.fake_redis.hexists(attempts_key(lane), "evt_1"))
+
+
+@patch("payments.processing.invalidate_entitlement")
+@patch("payments.tasks.cancel_paypal_subscription_task.delay")
+@patch("payments.tasks.process_payment_event.delay")
+@patch("payments.tasks.send_payment_emails_task.delay")
+class ProcessEventBatchTestCase(TestCase):
+    def setUp(self):
+        patcher = patch("payments.batching.payments_cursor")
+        payments_cursor = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cur = MagicMock()
+        payments_cursor.return_value.__enter__.return_value = self.cur
+        self.users = [
+            user_row(1, stripe_customer_id="cus_1"),
+            user_row(2, stripe_customer_id="cus_2"),
+            user_row(3, paypal_subscription_id="I-1", paypal_failed_payments_count=1),
+        ]
+        self.cur.fetchall.return_value = self.users
+
+    def statements(self):
+        return [
+            " ".join(call.args[0].split()) for call in self.cur.execute.call_args_list
+        ]
+
+    def test_batch_uses_one_lookup_query(
+        self, send_emails, process_payment_event, cancel, invalidate
+    ):
+        events = [
+            invoice_event("evt_1", "cus_1"),
+            invoice_event("evt_2", "cus_2"),
+            invoice_event("evt_1", "cus_1"),
+            paypal_payment_failed_event("WH-1", "I-1"),
+            paypal_payment_failed_event("WH-2", "I-1"),
+        ]
+        for event_id in ("evt_1", "evt_2", "WH-1", "WH-2"):
+            claim_event(event_id)
+
+        with self.settings(PAYPAL_FAILED_SUBSCRIPTION_PAYMENT_THRESHOLD=3):
+            process_event_batch(events)
+
+        statements = self.statements()
+        selects = [sql for sql in statements if sql.startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        self.assertIn("stripe_customer_id = ANY(%s)", selects[0])
+        self.assertEqual(
+            self.cur.execute.call_args_list[0].args[1],
+            (["cus_1", "cus_2"], ["I-1"]),
+        )
+        # The second failure sees the count written by the first
+        updates = [
+            call.args[1]
+            for call in self.cur.execute.call_args_list
+            if call.args[0].startswith("UPDATE")
+        ]
+        self.assertEqual(updates, [(2, 3), (3, 3), (False, 3)])
+        cancel.assert_called_once_with("I-1")
+        invalidate.assert_called_once_with(3)
+
+        emails = send_emails.call_args.args[0]
+        self.assertEqual(
+            [(name, args[0]) for name, args in emails],
+            [
+                ("send_invoice_email", "user1@example.com"),
+                ("send_invoice_email", "user2@example.com"),
+            ],
+        )
+        process_payment_event.assert_not_called()
+        self.assertEqual(
+            StripeEvent.objects.filter(status=StripeEvent.PROCESSED).count(), 4
+        )
+
+    def test_processed_events_are_skipped(
+        self, send_emails, process_payment_event, cancel, invalidate
+    ):
+        claim_event("evt_1")
+        StripeEvent.objects.update(status=StripeEvent.PROCESSED)
+
+        process_event_batch([invoice_event("evt_1", "cus_1")])
+
+        self.cur.execute.assert_not_called()
+        send_emails.assert_not_called()
+
+    def test_failed_event_is_rolled_back_and_deferred(
+        self, send_emails, process_payment_event, cancel, invalidate
+    ):
+        failing = invoice_event("evt_2", "cus_2")
+        claim_event("evt_1")
+        claim_event("evt_2")
+        statuses = iter([0, TRANSACTION_STATUS_INERROR])
+        type(self.cur.connection.info).transaction_status = property(
+            lambda _: next(statuses)
+        )
+
+        deferred, failed = process_event_batch(
+            [invoice_event("evt_1", "cus_1"), failing]
+        )
+
+        self.assertEqual((deferred, failed), ([failing], [failing]))
+        self.assertIn("ROLLBACK TO SAVEPOINT webhook_event", self.statements())
+        emails = send_emails.call_args.args[0]
+        self.assertEqual([args[0] for _, args in emails], ["user1@example.com"])
+        process_payment_event.assert_not_called()
+        self.assertEqual(
+            StripeEvent.objects.get(stripe_event_id="evt_2").status,
+            StripeEvent.RECEIVED,
+        )
+
+    def test_handler_error_defers_the_customers_later_events(
+        self, send_emails, process_payment_event, cancel, invalidate
+    ):
+        found = []
+
+        def handler(event, cur):
+            user = find_user("stripe_customer_id", event.data.object.customer, cur)
+            found.append(user)
+            if event.id == "evt_1":
+                update_user(user, cur, stripe_customer_id=None)
+                deliver_email(send_invoice_email, user["email"], event.data.object)
+                raise KeyError("lines")
+
+        failing = invoice_event("evt_1", "cus_1")
+        follower = invoice_event("evt_2", "cus_1")
+        for event_id in ("evt_1", "evt_2", "evt_3"):
+            claim_event(event_id)
+        with patch.dict(EVENT_HANDLERS, {"invoice.payment_succeeded": handler}):
+            deferred, failed = process_event_batch(
+                [failing, follower, invoice_event("evt_3", "cus_2")]
+            )
+
+        self.assertEqual((deferred, failed), ([failing, follower], [failing]))
+        self.assertIn("ROLLBACK TO SAVEPOINT webhook_event", self.statements())
+        # The follower never ran; the other customer saw no side effects
+        self.assertEqual([user["id"] for user in found], [1, 2])
+        send_emails.assert_not_called()
+        process_payment_event.assert_not_called()
+        self.assertEqual(
+            dict(StripeEvent.objects.values_list("stripe_event_id", "status")),
+            {
+                "evt_1": StripeEvent.RECEIVED,
+                "evt_2": StripeEvent.RECEIVED,
+                "evt_3": StripeEvent.PROCESSED,
+            },
+        )
+
+
+class SendPaymentEmailsTaskTestCase(TestCase):
+    def test_restores_stripe_objects_and_isolates_failures(self):
+        invoice = invoice_event("evt_1", "cus_1")["data"]["object"]
+        with patch(
+            "payments.send_email_functions.send_invoice_email",
+            side_effect=[RuntimeError("smtp down"), True],
+        ) as send:
+            send_payment_emails_task.run(
+                [
+                    ("send_invoice_email", ["a@example.com", invoice]),
+                    ("send_invoice_email", ["b@example.com", invoice]),
+                    ("delete_everything", ["c@example.com"]),
+                ]
+            )
+
+        self.assertEqual(send.call_count, 2)
+        self.assertEqual(send.call_args.args[1].id, "in_evt_1")
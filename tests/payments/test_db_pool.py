@@ -0,0 +1,83 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+from django.test import SimpleTestCase
+
+from payments import db
+
+
+def make_connection(closed=0, last_used=None):
+    conn = MagicMock()
+    conn.closed = closed
+    conn.autocommit = True
+    conn.last_used = time.monotonic() if last_used is None else last_used
+    return conn
+
+
+class PaymentsPoolTestCase(SimpleTestCase):
+    def setUp(self):
+        patcher = patch("payments.db.pool.ThreadedConnectionPool")
+        self.pool_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = self.pool_class.return_value
+        db._pool = None
+        self.addCleanup(setattr, db, "_pool", None)
+
+    def test_pool_is_created_once_per_process(self):
+        conn = make_connection()
+        self.pool.getconn.return_value = conn
+
+        for _ in range(3):
+            with db.payments_cursor():
+                pass
+
+        self.pool_class.assert_called_once()
+        self.assertEqual(self.pool.getconn.call_count, 3)
+        self.pool.putconn.assert_called_with(conn, close=False)
+
+    def test_pool_is_rebuilt_after_fork(self):
+        db.get_pool()
+        with patch("payments.db.os.getpid", return_value=-1):
+            db.get_pool()
+        self.assertEqual(self.pool_class.call_count, 2)
+
+    def test_idle_broken_connection_is_replaced(self):
+        stale = make_connection(last_used=0)
+        stale.cursor.return_value.__enter__.return_value.execute.side_effect = (
+            psycopg2.OperationalError("server closed the connection")
+        )
+        fresh = make_connection()
+        self.pool.getconn.side_effect = [stale, fresh]
+
+        with db.payments_cursor() as cur:
+            self.assertIs(cur, fresh.cursor.return_value.__enter__.return_value)
+
+        self.pool.putconn.assert_any_call(stale, close=True)
+        self.pool.putconn.assert_called_with(fresh, close=False)
+
+    def test_connection_failing_mid_use_is_discarded(self):
+        conn = make_connection()
+        self.pool.getconn.return_value = conn
+
+        with self.assertRaises(psycopg2.InterfaceError):
+            with db.payments_cursor():
+                raise psycopg2.InterfaceError("connection already closed")
+
+        self.pool.putconn.assert_called_once_with(conn, close=True)
+
+    def test_process_payment_event_uses_pooled_cursor(self):
+        from payments.tasks import process_payment_event
+
+        conn = make_connection()
+        self.pool.getconn.return_value = conn
+        # No id, so the event ledger is not consulted
+        event = {"event_type": "PAYMENT.SALE.COMPLETED"}
+
+        with patch("payments.tasks.process_event") as process_event:
+            process_payment_event.run(event)
+
+        process_event.assert_called_once_with(
+            event, conn.cursor.return_value.__enter__.return_value
+        )
+        self.pool.putconn.assert_called_once_with(conn, close=False)
@@ -0,0 +1,174 @@
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from celery.exceptions import Retry
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from payments.ledger import (CLAIM_LEASE, claim_event, mark_event_failed,
+                             mark_event_processed)
+from payments.models import StripeEvent
+from payments.processing import EventHandlerError
+from payments.tasks import process_payment_event
+
+PAYPAL_EVENT = {
+    "id": "WH-4JX204663A8287931-6LX68303T63222804",
+    "event_type": "BILLING.SUBSCRIPTION.ACTIVATED",
+    "resource": {"id": "I-2C054R2S7S33", "status": "ACTIVE"},
+}
+
+
+class ClaimEventTestCase(TestCase):
+    def test_event_is_claimed_once(self):
+        self.assertTrue(claim_event("evt_1"))
+        self.assertFalse(claim_event("evt_1"))
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.RECEIVED)
+
+    def test_failed_event_can_be_claimed_again(self):
+        claim_event("evt_1")
+        mark_event_failed("evt_1")
+
+        self.assertTrue(claim_event("evt_1"))
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.status, StripeEvent.RECEIVED)
+        self.assertIsNone(event.processed_at)
+
+    def test_stale_received_event_can_be_claimed_again(self):
+        claim_event("evt_1")
+        self.assertFalse(claim_event("evt_1"))
+        StripeEvent.objects.update(
+            created_at=timezone.now() - CLAIM_LEASE - timedelta(minutes=1)
+        )
+
+        self.assertTrue(claim_event("evt_1"))
+        # The new claim holds a fresh lease
+        self.assertFalse(claim_event("evt_1"))
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.RECEIVED)
+
+    def test_stale_processed_event_is_not_claimed_again(self):
+        claim_event("evt_1")
+        mark_event_processed("evt_1")
+        StripeEvent.objects.update(
+            created_at=timezone.now() - CLAIM_LEASE - timedelta(minutes=1)
+        )
+        self.assertFalse(claim_event("evt_1"))
+
+    def test_processed_event_is_not_claimed_again(self):
+        claim_event("evt_1")
+        mark_event_processed("evt_1")
+        self.assertFalse(claim_event("evt_1"))
+
+
+class WebhookDeduplicationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        patcher = patch("payments.views.buffer_payment_event", return_value=True)
+        self.buffer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch("payments.views.verify_paypal_webhook_signature", return_value=True)
+    def test_paypal_redelivery_is_not_enqueued(self, _):
+        for _ in range(3):
+            response = self.client.post(
+                reverse("paypal_webhook"),
+                data=json.dumps(PAYPAL_EVENT),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.buffer.assert_called_once_with(PAYPAL_EVENT)
+
+    def test_stripe_redelivery_is_not_enqueued(self):
+        payload = {"id": "evt_123", "type": "invoice.payment_succeeded"}
+        for _ in range(2):
+            response = self.client.post(
+                reverse("stripe-webhook"),
+                data=json.dumps(payload),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.buffer.assert_called_once_with(payload)
+
+    @patch("payments.tasks.process_payment_event.delay")
+    @patch("payments.views.verify_paypal_webhook_signature", return_value=True)
+    def test_unbuffered_event_is_refused_and_left_claimable(self, _, delay):
+        # No unordered per-event fallback: the provider resends the event
+        self.buffer.return_value = False
+        response = self.client.post(
+            reverse("paypal_webhook"),
+            data=json.dumps(PAYPAL_EVENT),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.FAILED)
+        delay.assert_not_called()
+
+        self.buffer.return_value = True
+        response = self.client.post(
+            reverse("paypal_webhook"),
+            data=json.dumps(PAYPAL_EVENT),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.buffer.call_count, 2)
+
+    def test_stripe_event_is_refused_without_redis(self):
+        self.buffer.return_value = False
+        response = self.client.post(
+            reverse("stripe-webhook"),
+            data=json.dumps({"id": "evt_123", "type": "invoice.payment_succeeded"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.FAILED)
+
+
+@patch("payments.tasks.payments_cursor")
+class ProcessPaymentEventLedgerTestCase(TestCase):
+    def setUp(self):
+        claim_event(PAYPAL_EVENT["id"])
+
+    def test_success_marks_event_processed(self, _):
+        with patch("payments.tasks.process_event") as process_event:
+            process_payment_event.run(PAYPAL_EVENT)
+
+        process_event.assert_called_once()
+        event = StripeEvent.objects.get()
+        self.assertEqual(event.status, StripeEvent.PROCESSED)
+        self.assertIsNotNone(event.processed_at)
+
+    def test_processed_event_is_skipped(self, _):
+        mark_event_processed(PAYPAL_EVENT["id"])
+        with patch("payments.tasks.process_event") as process_event:
+            process_payment_event.run(PAYPAL_EVENT)
+        process_event.assert_not_called()
+
+    def test_exhausted_retries_mark_event_failed(self, payments_cursor):
+        payments_cursor.side_effect = ConnectionError("database down")
+        process_payment_event.push_request(retries=process_payment_event.max_retries)
+        self.addCleanup(process_payment_event.pop_request)
+
+        process_payment_event.run(PAYPAL_EVENT)
+
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.FAILED)
+
+    def test_failed_handler_is_retried_before_marking_processed(self, _):
+        with patch("payments.tasks.process_event", return_value=False):
+            with patch.object(
+                process_payment_event, "retry", side_effect=Retry()
+            ) as retry:
+                with self.assertRaises(Retry):
+                    process_payment_event.run(PAYPAL_EVENT)
+
+        self.assertIsInstance(retry.call_args.kwargs["exc"], EventHandlerError)
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.RECEIVED)
+
+    def test_unhandled_event_type_is_marked_processed(self, _):
+        event = dict(PAYPAL_EVENT, event_type="CUSTOMER.DISPUTE.CREATED")
+        process_payment_event.run(event)
+
+        self.assertEqual(StripeEvent.objects.get().status, StripeEvent.PROCESSED)
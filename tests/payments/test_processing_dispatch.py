@@ -0,0 +1,74 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase
+from prometheus_client import REGISTRY
+
+from payments import processing
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class DispatchTestCase(SimpleTestCase):
+    def test_every_event_type_has_a_handler(self):
+        self.assertEqual(
+            processing.EVENT_HANDLERS["invoice.payment_succeeded"],
+            processing.handle_invoice_payment_succeeded,
+        )
+        self.assertEqual(
+            processing.EVENT_HANDLERS["BILLING.SUBSCRIPTION.PAYMENT.FAILED"],
+            processing.handle_paypal_payment_sale_failed,
+        )
+        self.assertEqual(len(processing.EVENT_HANDLERS), 13)
+
+    def test_handler_runs_and_is_counted(self):
+        labels = {"event_type": "BILLING.SUBSCRIPTION.EXPIRED", "outcome": "success"}
+        before = sample("payments_webhook_events_total", labels)
+        handler = MagicMock()
+        cur = MagicMock()
+        event = {"event_type": "BILLING.SUBSCRIPTION.EXPIRED"}
+
+        with patch.dict(
+            processing.EVENT_HANDLERS, {"BILLING.SUBSCRIPTION.EXPIRED": handler}
+        ):
+            self.assertTrue(processing.process_event(event, cur))
+
+        handler.assert_called_once_with(event, cur)
+        self.assertEqual(sample("payments_webhook_events_total", labels), before + 1)
+        self.assertGreater(
+            sample(
+                "payments_webhook_handler_seconds_count",
+                {"event_type": "BILLING.SUBSCRIPTION.EXPIRED"},
+            ),
+            0,
+        )
+
+    def test_failing_handler_is_counted_as_error(self):
+        labels = {"event_type": "invoice.payment_failed", "outcome": "error"}
+        before = sample("payments_webhook_events_total", labels)
+        handler = MagicMock(side_effect=RuntimeError("boom"))
+
+        with patch.dict(
+            processing.EVENT_HANDLERS, {"invoice.payment_failed": handler}
+        ):
+            result = processing.process_event(
+                {"type": "invoice.payment_failed", "id": "evt_1"}, MagicMock()
+            )
+
+        self.assertFalse(result)
+        self.assertEqual(sample("payments_webhook_events_total", labels), before + 1)
+
+    def test_unhandled_type_is_a_no_op(self):
+        before = sample(
+            "payments_webhook_unhandled_events_total", {"provider": "stripe"}
+        )
+        cur = MagicMock()
+
+        self.assertFalse(processing.process_event({"type": "charge.refunded"}, cur))
+
+        cur.execute.assert_not_called()
+        self.assertEqual(
+            sample("payments_webhook_unhandled_events_total", {"provider": "stripe"}),
+            before + 1,
+        )
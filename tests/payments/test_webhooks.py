@@ -23,12 +23,11 @@ class PayPalWebhookTestCase(TransactionTestCase):
         self.client = APIClient()
         self.url = reverse("paypal_webhook")  # Ensure the URL name matches your urls.py
 
-    @patch("payments.tasks.process_payment_event.delay")
+    @patch("payments.views.buffer_payment_event", return_value=True)
     @patch("payments.views.verify_paypal_webhook_signature")
     def test_paypal_webhook_success(self, mock_verify_signature, mock_process_payment_event):
         # Configure mock objects
         mock_verify_signature.return_value = True
-        mock_process_payment_event.return_value = None
 
         # Use the provided payload
         event = {
@@ -54,7 +53,7 @@ class PayPalWebhookTestCase(TransactionTestCase):
         # Verify that verify_paypal_webhook_signature was called once
         mock_verify_signature.assert_called_once()
 
-        # Verify that process_payment_event.delay was called with the correct event data
+        # Verify that the event was buffered for its customer's lane
         mock_process_payment_event.assert_called_once_with(event)
 
        
@@ -98,7 +97,7 @@ class StripeWebhookViewTestCase(TransactionTestCase):
         self.client = APIClient()
         self.url = reverse("stripe-webhook")  # Adjust the URL name as necessary
 
-    @patch("payments.tasks.process_payment_event.delay")
+    @patch("payments.views.buffer_payment_event", return_value=True)
     @patch("stripe.Event.construct_from")
     def test_stripe_webhook_success(self, mock_stripe_event_construct_from, mock_process_payment_event):
         # Sample payload
@@ -132,7 +131,7 @@ class StripeWebhookViewTestCase(TransactionTestCase):
         # Check if the Stripe event was processed
         mock_stripe_event_construct_from.assert_called_once_with(payload, stripe.api_key)
 
-        # Check if the event was sent to Celery
+        # Check if the event was buffered for processing
         mock_process_payment_event.assert_called_once_with(payload)
 
         # Ensure log message for event received
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from videos.models import Category, Video
+from videos.views import MAX_BATCH_IDS
+
+
+class VideoBatchDetailTestCase(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(title="Hatha", description="Yoga")
+        self.videos = []
+        for i in range(4):
+            video = Video.objects.create(
+                title=f"Sample Video {i}",
+                image="videos/sample.jpg",
+                description="description",
+                url=f"http://example.com/video{i}/",
+                free=i % 2 == 0,
+            )
+            video.categories.add(category)
+            self.videos.append(video)
+        self.url = reverse("video-detail-batch")
+
+    def get_batch(self, ids):
+        return self.client.get(self.url, {"ids": ",".join(str(pk) for pk in ids)})
+
+    def test_results_follow_requested_order(self):
+        member = get_user_model().objects.create_user(
+            username="member", email="member@example.com", password="x", active=True
+        )
+        self.client.force_authenticate(member)
+        ids = [self.videos[3].id, self.videos[0].id, self.videos[2].id]
+        with self.assertNumQueries(2):
+            response = self.get_batch(ids)
+        self.assertEqual([video["id"] for video in response.data["results"]], ids)
+        self.assertEqual(len(response.data["results"][0]["categories"]), 1)
+
+    def test_anonymous_only_gets_free_videos(self):
+        ids = [video.id for video in self.videos] + [999]
+        response = self.get_batch(ids)
+        self.assertEqual(
+            [video["id"] for video in response.data["results"]], ids[0:3:2]
+        )
+        self.assertEqual(response.data["unauthorized"], ids[1:4:2])
+        self.assertEqual(response.data["not_found"], [999])
+
+    def test_invalid_ids(self):
+        self.assertEqual(
+            self.get_batch(["a"]).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            self.get_batch(range(1, MAX_BATCH_IDS + 2)).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
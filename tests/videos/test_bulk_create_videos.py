@@ -0,0 +1,84 @@
+import io
+import tempfile
+from unittest.mock import patch
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from tests.helpers import FakeRedisMixin
+from videos.cache import get_catalog_changes
+from videos.models import Category, Video
+from videos.serializers import VideoSerializer
+
+
+def make_upload(name):
+    buffer = io.BytesIO()
+    Image.new("RGB", (50, 50)).save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+def video_data(i):
+    return {
+        "title": f"Video {i}",
+        "image": make_upload(f"video_{i}.jpg"),
+        "description": "description",
+        "url": f"https://example.com/video/{i}/",
+        "free": True,
+    }
+
+
+class BulkCreateVideosTestCase(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        image_field = Video._meta.get_field("image")
+        original_storage = image_field.storage
+        image_field.storage = FileSystemStorage(location=tmpdir.name)
+        self.addCleanup(setattr, image_field, "storage", original_storage)
+
+        self.category = Category.objects.create(title="Yoga", description="")
+
+    def save_many(self, size):
+        serializer = VideoSerializer(
+            data=[video_data(i) for i in range(size)], many=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save(categories=[self.category])
+
+    def test_creates_and_links_videos(self):
+        with patch("core.tasks.generate_image_derivatives_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                videos = self.save_many(3)
+
+        self.assertTrue(all(video.id for video in videos))
+        self.assertCountEqual(
+            self.category.category_videos.values_list("id", flat=True),
+            [video.id for video in videos],
+        )
+        self.assertEqual(
+            [video_ids for _, video_ids in get_catalog_changes("0-0")],
+            [[video.id for video in videos]],
+        )
+        self.assertEqual(delay.call_count, 3)
+
+    def test_query_count_does_not_grow_with_size(self):
+        def count_queries(size):
+            with CaptureQueriesContext(connection) as queries:
+                self.save_many(size)
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(10))
+
+    def test_invalid_item_creates_nothing(self):
+        data = [video_data(0), dict(video_data(1), url="")]
+        serializer = VideoSerializer(data=data, many=True)
+
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors[0], {})
+        self.assertIn("url", serializer.errors[1])
+        self.assertFalse(Video.objects.exists())
@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from tests.helpers import FakeRedisMixin
+from videos.bulk import InvalidImportRow, import_video_rows
+from videos.cache import get_catalog_changes
+from videos.models import Category, Video
+
+
+def video_row(i, **extra):
+    return dict(
+        title=f"Video {i}",
+        image=f"videos/{i}.jpg",
+        description="description",
+        url=f"http://example.com/video/{i}/",
+        free=bool(i % 2),
+        **extra,
+    )
+
+
+class BulkVideosTestCase(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.yoga = Category.objects.create(title="Yoga", description="")
+        self.pilates = Category.objects.create(title="Pilates", description="")
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_import_resolves_categories_by_title_and_id(self):
+        rows = [
+            video_row(1, categories=["yoga", self.pilates.id]),
+            video_row(2, categories=[str(self.pilates.id)]),
+            video_row(3),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            created, updated = import_video_rows(rows)
+
+        self.assertEqual((created, updated), (3, 0))
+        first = Video.objects.get(title="Video 1")
+        self.assertCountEqual(
+            first.categories.values_list("id", flat=True),
+            [self.yoga.id, self.pilates.id],
+        )
+        self.assertFalse(Video.objects.get(title="Video 3").categories.exists())
+        (_, changed_ids), = get_catalog_changes("0-0")
+        self.assertCountEqual(
+            changed_ids, Video.objects.values_list("id", flat=True)
+        )
+
+    def test_import_updates_existing_videos_and_replaces_categories(self):
+        video = Video.objects.create(**video_row(1))
+        video.categories.add(self.yoga)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            created, updated = import_video_rows(
+                [dict(video_row(1, categories=["Pilates"]), id=video.id, title="New")]
+            )
+
+        self.assertEqual((created, updated), (0, 1))
+        video.refresh_from_db()
+        self.assertEqual(video.title, "New")
+        self.assertEqual(list(video.categories.all()), [self.pilates])
+        changes = get_catalog_changes("0-0")
+        self.assertEqual([video_ids for _, video_ids in changes], [[video.id]])
+
+    def test_import_unknown_category_raises(self):
+        with self.assertRaisesMessage(ValueError, "Unknown category 'Tai chi'"):
+            import_video_rows([video_row(1, categories=["Tai chi"])])
+        self.assertFalse(Video.objects.exists())
+
+    def test_import_query_count_is_constant_per_chunk(self):
+        def count_queries(size):
+            rows = [video_row(i, categories=["Yoga"]) for i in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                import_video_rows(rows, chunk_size=size)
+            return len(queries)
+
+        self.assertEqual(count_queries(5), count_queries(50))
+
+    def round_trip(self, file_format):
+        for i in range(5):
+            video = Video.objects.create(**video_row(i))
+            video.categories.add(self.yoga, self.pilates)
+        path = self.path(f"videos.{file_format}")
+        call_command("export_videos", path, "--chunk-size", "2")
+
+        exported = list(
+            Video.objects.order_by("id").values(
+                "title", "image", "description", "url", "free"
+            )
+        )
+        Video.objects.all().delete()
+        out = StringIO()
+        call_command("import_videos", path, "--chunk-size", "2", stdout=out)
+
+        self.assertIn("Created 5 and updated 0 videos", out.getvalue())
+        imported = list(
+            Video.objects.order_by("id").values(
+                "title", "image", "description", "url", "free"
+            )
+        )
+        self.assertEqual(imported, exported)
+        for video in Video.objects.all():
+            self.assertCountEqual(
+                video.categories.values_list("id", flat=True),
+                [self.yoga.id, self.pilates.id],
+            )
+
+    def test_round_trip_jsonl(self):
+        self.round_trip("jsonl")
+
+    def test_round_trip_csv(self):
+        self.round_trip("csv")
+
+    def test_export_writes_one_json_object_per_line(self):
+        video = Video.objects.create(**video_row(1))
+        video.categories.add(self.yoga)
+        out = StringIO()
+        call_command("export_videos", "-", stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows[0]["id"], video.id)
+        self.assertEqual(rows[0]["categories"], [self.yoga.id])
+
+    def test_import_reports_invalid_rows(self):
+        path = self.path("videos.jsonl")
+        with open(path, "w") as stream:
+            stream.write(json.dumps({"title": "No url"}) + "\n")
+        with self.assertRaisesMessage(CommandError, "missing url"):
+            call_command("import_videos", path)
+
+    def test_import_parses_booleans_strictly(self):
+        import_video_rows(
+            [
+                dict(video_row(1), free="false"),
+                dict(video_row(2), free="True"),
+                dict(video_row(3), free=0),
+            ]
+        )
+        self.assertEqual(
+            list(Video.objects.order_by("title").values_list("free", flat=True)),
+            [False, True, False],
+        )
+        with self.assertRaisesMessage(InvalidImportRow, "Invalid boolean 'maybe'"):
+            import_video_rows([dict(video_row(4), free="maybe")])
+
+    def test_import_validates_rows_before_writing(self):
+        rows = [video_row(1), dict(video_row(2), title="x" * 300)]
+        with self.assertRaisesMessage(InvalidImportRow, "is invalid: title:"):
+            import_video_rows(rows)
+        self.assertFalse(Video.objects.exists())
+
+    def test_unknown_extension_needs_format(self):
+        with self.assertRaisesMessage(CommandError, "--format"):
+            call_command("import_videos", self.path("videos.txt"))
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+import redis
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from tests.helpers import FakeRedisMixin
+from videos.models import Category, Video
+
+
+class CatalogCacheTestCase(FakeRedisMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(
+            title="Hatha", description="Hatha yoga"
+        )
+        for i in range(3):
+            video = Video.objects.create(
+                title=f"Sample Video {i}",
+                image="videos/sample.jpg",
+                description="description",
+                url=f"http://example.com/video{i}/",
+            )
+            video.categories.add(self.category)
+
+    def test_video_list_hit_does_not_touch_db(self):
+        url = reverse("video-list") + "?page=1&page_size=10"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_count"], 3)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, response.json())
+
+    def test_search_hit_does_not_touch_db(self):
+        url = reverse("search_videos") + "?search=Sample"
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_catalog_change_invalidates_cache(self):
+        url = reverse("video-list")
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.create(
+                title="New Video",
+                image="videos/new.jpg",
+                description="description",
+                url="http://example.com/new/",
+            )
+
+        response = self.client.get(url)
+        self.assertEqual(response.data["total_count"], 4)
+
+    def test_category_link_invalidates_cache(self):
+        url = reverse("video-list") + f"?category={self.category.id}"
+        video = Video.objects.create(
+            title="Unlinked",
+            image="videos/unlinked.jpg",
+            description="description",
+            url="http://example.com/unlinked/",
+        )
+        self.assertEqual(self.client.get(url).data["total_count"], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            video.categories.add(self.category)
+
+        self.assertEqual(self.client.get(url).data["total_count"], 4)
+
+    def test_redis_outage_falls_back_to_db(self):
+        with patch.object(
+            self.fake_redis, "pipeline", side_effect=redis.ConnectionError("down")
+        ):
+            response = self.client.get(reverse("video-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_count"], 3)
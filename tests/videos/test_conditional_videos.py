@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from tests.helpers import FakeRedisMixin, create_video
+
+
+class ConditionalGetTestCase(FakeRedisMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = create_video("Hatha yoga", free=True)
+
+    def test_matching_etag_returns_not_modified_without_queries(self):
+        url = reverse("video-list")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_catalog_change_changes_etag(self):
+        url = reverse("video-list")
+        etag = self.client.get(url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_video("Hatha flow", free=True)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Last-Modified", response)
+
+    def test_query_params_have_their_own_etag(self):
+        first = self.client.get(reverse("video-list") + "?page_size=1")
+        second = self.client.get(reverse("video-list") + "?page_size=2")
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_video_detail_etag(self):
+        url = reverse("video-detail", args=[self.video.id])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.title = "Hatha yoga II"
+            self.video.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["title"], "Hatha yoga II")
+
+    def test_without_redis_no_validators(self):
+        with patch("videos.cache.get_catalog_state", return_value=None):
+            response = self.client.get(reverse("video-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("ETag", response)
@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from videos.models import Category, Video
+
+
+@patch("videos.cache.get_catalog_state", return_value=None)
+class CursorPaginationTestCase(APITestCase):
+    def setUp(self):
+        for i in range(25):
+            Video.objects.create(
+                title=f"Sample Video {i}",
+                image="videos/sample.jpg",
+                description="description",
+                url=f"http://example.com/video{i}/",
+            )
+
+    def test_walks_every_video_once(self, _):
+        url = reverse("video-list") + "?pagination=cursor&page_size=10"
+        seen = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("total_count", response.data)
+            seen.extend(video["id"] for video in response.data["results"])
+            pages += 1
+            next_cursor = response.data["next"]
+            url = (
+                reverse("video-list") + f"?cursor={next_cursor}&page_size=10"
+                if next_cursor
+                else None
+            )
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, list(Video.objects.order_by("id").values_list("id", flat=True)))
+
+    def test_deep_page_costs_same_queries_as_first(self, _):
+        first = reverse("video-list") + "?pagination=cursor&page_size=5"
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(first)
+        first_queries = len(ctx.captured_queries)
+
+        cursor = response.data["next"]
+        for _ in range(3):
+            cursor = self.client.get(
+                reverse("video-list") + f"?cursor={cursor}&page_size=5"
+            ).data["next"]
+        with self.assertNumQueries(first_queries):
+            self.client.get(reverse("video-list") + f"?cursor={cursor}&page_size=5")
+
+    def test_include_total(self, _):
+        category = Category.objects.create(title="Hatha", description="")
+        category.category_videos.set(Video.objects.all())
+        url = (
+            reverse("search_videos")
+            + f"?category={category.id}&pagination=cursor&include_total=true"
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data["total_count"], 25)
+        self.assertEqual(response.data["count"], 10)
+
+    def test_search_results_cannot_use_cursors(self, _):
+        # Cursors walk the creation order and would drop the search ranking
+        for name in ("search_videos", "video-list"):
+            response = self.client.get(
+                reverse(name) + "?search=Sample&pagination=cursor"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(
+                response.data,
+                {"error": "Cursor pagination is not available for search results"},
+            )
+
+    def test_invalid_cursor(self, _):
+        response = self.client.get(reverse("video-list") + "?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"error": "Invalid cursor"})
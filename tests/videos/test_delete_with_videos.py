@@ -0,0 +1,119 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from tests.helpers import FakeRedisMixin
+from videos.cache import CATALOG_CHANGES_KEY, get_catalog_changes
+from videos.models import CatalogTombstone, Category, Video, VideoDailyViews
+
+
+def create_category_with_videos(size, title="Hatha"):
+    category = Category.objects.create(title=title, description="")
+    for i in range(size):
+        video = Video.objects.create(
+            title=f"{title} video {i}",
+            image=f"videos/{title}_{i}.jpg",
+            description="description",
+            url="http://example.com/video/",
+        )
+        video.categories.add(category)
+        category.videos.add(video)
+    return category
+
+
+class DeleteWithVideosTestCase(FakeRedisMixin, TestCase):
+    def count_queries(self, size):
+        category = create_category_with_videos(size, title=f"size{size}")
+        with CaptureQueriesContext(connection) as queries:
+            category.delete_with_videos()
+        return len(queries)
+
+    def test_statement_count_does_not_grow_with_category_size(self):
+        self.assertEqual(self.count_queries(2), self.count_queries(25))
+
+    def test_deletes_do_not_bind_every_video_id(self):
+        category = create_category_with_videos(5)
+        with CaptureQueriesContext(connection) as queries:
+            category.delete_with_videos()
+
+        deletes = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("DELETE") and "IN (" in query["sql"]
+        ]
+        for sql in deletes:
+            self.assertNotRegex(sql, r"IN \(\d+, \d+")
+
+    def test_deletes_videos_links_and_category(self):
+        other = Category.objects.create(title="Other", description="")
+        category = create_category_with_videos(3)
+        video_ids = list(Video.objects.values_list("id", flat=True))
+        Video.objects.get(id=video_ids[0]).categories.add(other)
+        category_id = category.id
+
+        with patch("videos.models.delete_media_files") as delete_media_files:
+            with self.captureOnCommitCallbacks(execute=True):
+                category.delete_with_videos()
+
+        self.assertFalse(Video.objects.exists())
+        self.assertFalse(Category.objects.filter(id=category_id).exists())
+        self.assertFalse(Video.categories.through.objects.exists())
+        self.assertFalse(Category.videos.through.objects.exists())
+        self.assertEqual(
+            sorted(
+                CatalogTombstone.objects.filter(
+                    kind=CatalogTombstone.VIDEO
+                ).values_list("object_id", flat=True)
+            ),
+            video_ids,
+        )
+        self.assertTrue(
+            CatalogTombstone.objects.filter(
+                kind=CatalogTombstone.CATEGORY, object_id=category_id
+            ).exists()
+        )
+        delete_media_files.assert_called_once_with(
+            [f"videos/Hatha_{i}.jpg" for i in range(3)]
+        )
+        changed = {
+            video_id
+            for _, changed_ids in get_catalog_changes("0-0")
+            for video_id in changed_ids
+        }
+        self.assertTrue(set(video_ids) <= changed)
+
+    def test_feed_entries_do_not_grow_with_category_size(self):
+        category = create_category_with_videos(25)
+        self.fake_redis.flushall()
+
+        with patch("videos.models.delete_media_files"):
+            with self.captureOnCommitCallbacks(execute=True):
+                category.delete_with_videos()
+
+        self.assertEqual(self.fake_redis.xlen(CATALOG_CHANGES_KEY), 2)
+
+    def test_every_table_referencing_video_is_cleared(self):
+        # delete_with_videos removes videos with one raw DELETE, which
+        # skips the collector; a new relation to Video must be handled there
+        self.assertCountEqual(
+            [
+                relation.related_model
+                for relation in Video._meta.get_fields()
+                if relation.is_relation and relation.auto_created
+            ],
+            [Category, VideoDailyViews],
+        )
+        self.assertEqual(
+            [field.remote_field.through for field in Video._meta.many_to_many],
+            [Video.categories.through],
+        )
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_delete_with_videos", sizes=[1, 5], stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertFalse(Video.objects.exists())
@@ -0,0 +1,56 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from tests.helpers import FakeRedisMixin
+from videos.models import Category, Video
+
+
+class CategoryFacetsTestCase(FakeRedisMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.hatha = Category.objects.create(title="Hatha", description="description")
+        self.kundalini = Category.objects.create(
+            title="Kundalini", description="description"
+        )
+        for i in range(4):
+            video = Video.objects.create(
+                title=f"Respiración {i}" if i % 2 else f"Postura {i}",
+                image="videos/sample.jpg",
+                description="description",
+                url=f"http://example.com/video{i}/",
+            )
+            video.categories.add(self.hatha)
+            if i < 1:
+                video.categories.add(self.kundalini)
+
+    def facets(self, response):
+        return {
+            facet["title"]: facet["count"]
+            for facet in response.data["facets"]["categories"]
+        }
+
+    def test_unfiltered_counts(self):
+        response = self.client.get(reverse("video-list") + "?facets=categories")
+        self.assertEqual(self.facets(response), {"Hatha": 4, "Kundalini": 1})
+
+    def test_counts_follow_search_but_not_category_filter(self):
+        url = (
+            reverse("video-list")
+            + f"?facets=categories&search=postura&category={self.kundalini.id}"
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data["total_count"], 1)
+        self.assertEqual(self.facets(response), {"Hatha": 2, "Kundalini": 1})
+
+    def test_unfiltered_counts_are_cached_per_catalog_version(self):
+        self.client.get(reverse("video-list") + "?facets=categories")
+        # A different page misses the response cache but not the facet cache:
+        # page rows, categories and total count only
+        with self.assertNumQueries(3):
+            self.client.get(
+                reverse("video-list") + "?facets=categories&page=2&page_size=2"
+            )
+
+    def test_without_facets_param(self):
+        response = self.client.get(reverse("video-list"))
+        self.assertNotIn("facets", response.data)
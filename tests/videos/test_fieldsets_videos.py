@@ -0,0 +1,88 @@
+from unittest.mock import patch
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from videos.models import Category, Video
+from videos.serializers import (VIDEO_FIELDS, InvalidFieldset,
+                                parse_fieldset)
+
+
+@patch("videos.cache.get_catalog_state", return_value=None)
+class SparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title="Hatha", description="Yoga")
+        for i in range(3):
+            video = Video.objects.create(
+                title=f"Sample Video {i}",
+                image="videos/sample.jpg",
+                description="description",
+                url=f"http://example.com/video{i}/",
+                free=True,
+            )
+            video.categories.add(self.category)
+        self.video = video
+
+    def test_parse_fieldset(self, _):
+        self.assertEqual(
+            parse_fieldset({"fields": "title,image"}, VIDEO_FIELDS),
+            ("id", "title", "image"),
+        )
+        self.assertEqual(
+            parse_fieldset(
+                {
+                    "exclude": "id,categories,description,"
+                    "image_srcset,image_placeholder"
+                },
+                VIDEO_FIELDS,
+            ),
+            (
+                "id",
+                "title",
+                "image",
+                "url",
+                "free",
+                "date_of_creation",
+                "date_of_modification",
+            ),
+        )
+        with self.assertRaises(InvalidFieldset):
+            parse_fieldset({"fields": "title,password"}, VIDEO_FIELDS)
+
+    def test_grid_fields_skip_categories_query(self, _):
+        # Page rows and the total count only
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("video-list") + "?fields=id,title,image"
+            )
+        self.assertEqual(
+            list(response.data["results"][0]), ["id", "title", "image"]
+        )
+
+    def test_cursor_pagination_with_fields(self, _):
+        response = self.client.get(
+            reverse("video-list") + "?pagination=cursor&page_size=2&fields=title"
+        )
+        self.assertEqual(list(response.data["results"][0]), ["id", "title"])
+        response = self.client.get(
+            reverse("video-list"),
+            {"cursor": response.data["next"], "page_size": 2, "fields": "title"},
+        )
+        self.assertEqual(response.data["count"], 1)
+
+    def test_video_detail_fields(self, _):
+        url = reverse("video-detail", args=[self.video.id])
+        response = self.client.get(url + "?exclude=description,categories")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("description", response.data)
+        self.assertNotIn("categories", response.data)
+        self.assertEqual(response.data["title"], self.video.title)
+
+    def test_category_fields(self, _):
+        response = self.client.get(reverse("category-list") + "?fields=title")
+        self.assertEqual(response.data, [{"id": self.category.id, "title": "Hatha"}])
+
+    def test_unknown_field_is_bad_request(self, _):
+        response = self.client.get(reverse("video-list") + "?fields=secret")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
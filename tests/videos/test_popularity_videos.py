@@ -0,0 +1,157 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import redis
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from tests.helpers import FakeRedisMixin, create_video
+from videos.models import Video, VideoDailyViews
+from videos.popularity import (FLUSH_LOCK_KEY, PENDING_VIEWS_KEY,
+                               TRENDING_RANKING_KEY, flush_view_counts,
+                               get_trending_ranking, record_video_view)
+
+
+class PopularityTestCase(FakeRedisMixin, APITestCase):
+    redis_modules = ("videos.cache", "videos.popularity")
+
+    def setUp(self):
+        super().setUp()
+        self.first = create_video("first", free=True)
+        self.second = create_video("second", free=True)
+
+    def test_detail_fetch_counts_view_without_db_write(self):
+        url = reverse("video-detail", args=[self.first.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, REMOTE_ADDR="10.0.0.1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            [query for query in queries if not query["sql"].startswith("SELECT")]
+        )
+        self.assertEqual(get_trending_ranking(), [(self.first.id, 1.0)])
+
+    def test_revalidation_is_not_counted(self):
+        url = reverse("video-detail", args=[self.first.id])
+        etag = self.client.get(url)["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.fake_redis.hget(PENDING_VIEWS_KEY, self.first.id), b"1")
+
+    def test_unauthorized_fetch_is_not_counted(self):
+        paid = create_video("paid")
+        response = self.client.get(reverse("video-detail", args=[paid.id]))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(get_trending_ranking(), [])
+
+    def test_flush_adds_counts_and_daily_stats(self):
+        record_video_view(self.first.id, "ip:1")
+        record_video_view(self.first.id, "ip:1")
+        record_video_view(self.first.id, "ip:2")
+        record_video_view(self.second.id, "ip:1")
+
+        self.assertEqual(flush_view_counts(), 2)
+        record_video_view(self.first.id, "ip:3")
+        self.assertEqual(flush_view_counts(), 1)
+        self.assertEqual(flush_view_counts(), 0)
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.view_count, self.second.view_count), (4, 1))
+        stats = VideoDailyViews.objects.get(video=self.first)
+        self.assertEqual(stats.day, timezone.now().date())
+        self.assertEqual((stats.views, stats.unique_viewers), (4, 3))
+
+    def test_flush_waits_for_a_running_flush(self):
+        record_video_view(self.first.id, "ip:1")
+        self.fake_redis.set(FLUSH_LOCK_KEY, "other worker")
+
+        self.assertEqual(flush_view_counts(), 0)
+        self.assertTrue(self.fake_redis.exists(PENDING_VIEWS_KEY))
+
+    def test_flush_is_not_applied_twice_when_redis_fails(self):
+        record_video_view(self.first.id, "ip:1")
+        with patch.object(
+            self.fake_redis, "delete", side_effect=redis.ConnectionError("down")
+        ):
+            with self.assertRaises(redis.ConnectionError):
+                flush_view_counts()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.view_count, 0)
+
+        self.assertEqual(flush_view_counts(), 1)
+        self.assertEqual(flush_view_counts(), 0)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.view_count, 1)
+
+    def test_flush_skips_deleted_videos(self):
+        record_video_view(self.first.id, "ip:1")
+        Video.objects.filter(id=self.first.id).delete()
+
+        self.assertEqual(flush_view_counts(), 0)
+        self.assertFalse(VideoDailyViews.objects.exists())
+
+    def test_trending_decays_older_views(self):
+        now = timezone.now()
+        two_days_ago = now - timedelta(hours=48)
+        with patch("videos.popularity.timezone.now", return_value=two_days_ago):
+            for viewer in range(3):
+                record_video_view(self.first.id, f"ip:{viewer}")
+        for viewer in range(2):
+            record_video_view(self.second.id, f"ip:{viewer}")
+
+        ranking = get_trending_ranking()
+        self.assertEqual(
+            [video_id for video_id, _ in ranking], [self.second.id, self.first.id]
+        )
+        # Two half-lives old
+        self.assertAlmostEqual(ranking[1][1], 0.75)
+
+    def test_trending_endpoint(self):
+        record_video_view(self.second.id, "ip:1")
+        record_video_view(self.second.id, "ip:2")
+        record_video_view(self.first.id, "ip:1")
+        self.fake_redis.delete(TRENDING_RANKING_KEY)
+
+        response = self.client.get(
+            reverse("videos-trending"), {"limit": 5, "fields": "id,title"}
+        )
+
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"id": self.second.id, "title": "second"},
+                {"id": self.first.id, "title": "first"},
+            ],
+        )
+
+    def test_trending_falls_back_to_view_counts(self):
+        Video.objects.filter(id=self.first.id).update(view_count=10)
+        with patch("videos.popularity.get_trending_ranking", return_value=None):
+            response = self.client.get(reverse("videos-trending"), {"fields": "id"})
+
+        self.assertEqual(
+            response.json()["results"], [{"id": self.first.id}, {"id": self.second.id}]
+        )
+
+    def test_trending_rejects_invalid_limit(self):
+        response = self.client.get(reverse("videos-trending"), {"limit": "many"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "limit must be an integer"})
+
+    def test_trending_degrades_to_empty_results_on_errors(self):
+        with patch(
+            "videos.views.trending_videos", side_effect=DatabaseError("db down")
+        ):
+            with self.assertLogs("videos.views", "ERROR"):
+                response = self.client.get(reverse("videos-trending"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"results": []})
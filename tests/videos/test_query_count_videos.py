@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from videos.models import Category, Video
+from videos.serializers import VideoSerializer, serialize_videos
+
+
+def create_videos_with_categories(count, categories):
+    for i in range(count):
+        video = Video.objects.create(
+            title=f"Sample Video {i}",
+            image=f"videos/sample_{i}.jpg",
+            description="description",
+            url=f"http://example.com/video{i}/",
+            free=i % 2 == 0,
+        )
+        video.categories.set(categories)
+
+
+@patch("videos.cache.get_catalog_state", return_value=None)
+class VideoListQueryCountTestCase(APITestCase):
+    def setUp(self):
+        self.categories = [
+            Category.objects.create(title=f"Category {i}", description="description")
+            for i in range(3)
+        ]
+        create_videos_with_categories(30, self.categories)
+
+    def test_list_payload_matches_video_serializer(self, _):
+        queryset = Video.objects.order_by("id")
+        self.assertEqual(
+            serialize_videos(queryset),
+            [dict(video) for video in VideoSerializer(queryset, many=True).data],
+        )
+
+    def test_video_list_query_count_is_constant(self, _):
+        # Page rows, categories for the page and the total count
+        for page_size in (5, 30):
+            with self.assertNumQueries(3):
+                response = self.client.get(
+                    reverse("video-list") + f"?page=1&page_size={page_size}"
+                )
+            self.assertEqual(response.data["count"], page_size)
+            self.assertEqual(len(response.data["results"][0]["categories"]), 3)
+
+    def test_search_query_count_is_constant(self, _):
+        # Warm the search index
+        self.client.get(reverse("search_videos") + "?search=Sample")
+        # Index freshness check, page rows, categories and the total count
+        for page_size in (5, 30):
+            with self.assertNumQueries(4):
+                self.client.get(
+                    reverse("search_videos") + f"?search=Sample&page_size={page_size}"
+                )
+
+    def test_cursor_query_count_is_constant(self, _):
+        for page_size in (5, 30):
+            with self.assertNumQueries(2):
+                self.client.get(
+                    reverse("video-list") + f"?pagination=cursor&page_size={page_size}"
+                )
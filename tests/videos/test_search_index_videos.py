@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from tests.helpers import FakeRedisMixin, create_video
+from videos.search_index import InvertedIndex, VideoSearchIndex
+
+
+class InvertedIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, "Yoga para principiantes", "Respiración y posturas")
+        self.index.add(2, "Meditación guiada", "Yoga nidra para dormir")
+        self.index.add(3, "Kundalini", "Kriyas de respiración")
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self.index.search("yoga"), [1, 2])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.index.search("yoga respiracion"), [1])
+        self.assertEqual(self.index.search("yoga kriyas"), [])
+
+    def test_accents_and_stopwords_are_ignored(self):
+        self.assertEqual(self.index.search("MEDITACION"), [2])
+        self.assertEqual(self.index.search("de la"), [])
+
+    def test_remove(self):
+        self.index.remove(1)
+        self.assertEqual(self.index.search("yoga"), [2])
+        self.assertNotIn("principiantes", self.index.postings)
+
+
+class VideoSearchIndexSyncTestCase(FakeRedisMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = VideoSearchIndex()
+
+    def test_replays_only_changed_videos(self):
+        first = create_video("Hatha yoga")
+        self.index.sync()
+        self.assertEqual(self.index.search("hatha"), [first.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = create_video("Hatha flow")
+            first.delete()
+
+        with patch.object(self.index, "_rebuild") as rebuild:
+            with self.assertNumQueries(1):
+                self.index.sync()
+        rebuild.assert_not_called()
+        self.assertEqual(self.index.search("hatha"), [second.id])
+
+    def test_redis_reset_forces_rebuild(self):
+        create_video("Hatha yoga")
+        self.index.sync()
+        self.fake_redis.flushall()
+        with patch.object(self.index, "_rebuild") as rebuild:
+            self.index.sync()
+        rebuild.assert_called_once()
+
+    def test_without_redis_rebuilds_on_fingerprint_change(self):
+        with patch("videos.search_index.get_catalog_state", return_value=None):
+            create_video("Hatha yoga")
+            self.assertEqual(len(self.index.ranked_ids("hatha")), 1)
+            create_video("Hatha flow")
+            self.assertEqual(len(self.index.ranked_ids("hatha")), 2)
@@ -0,0 +1,109 @@
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+
+from tests.helpers import create_video
+from videos.models import Video
+from videos.search import (HotQueryCache, hot_query_search, postgres_search,
+                           search_videos)
+
+
+@patch("videos.search_index.get_catalog_state", return_value=None)
+class SearchFallbackTestCase(TestCase):
+    def test_ranks_title_matches_first(self, _):
+        in_description = create_video("Meditación guiada", "Yoga nidra para dormir")
+        in_title = create_video("Yoga para principiantes")
+        create_video("Kundalini")
+
+        results = search_videos(Video.objects.all(), "yoga")
+
+        self.assertEqual(list(results), [in_title, in_description])
+
+    def test_keeps_queryset_filters(self, _):
+        create_video("Yoga para principiantes")
+        other = create_video("Yoga nidra")
+
+        results = search_videos(Video.objects.exclude(id=other.id), "yoga")
+
+        self.assertNotIn(other, results)
+        self.assertEqual(results.count(), 1)
+
+    def test_no_matches(self, _):
+        create_video("Yoga para principiantes")
+        self.assertFalse(search_videos(Video.objects.all(), "pilates").exists())
+
+
+class HotQueryCacheTestCase(TestCase):
+    def test_results_expire_with_catalog_state(self):
+        cache = HotQueryCache(size=2)
+        cache.get("yoga", ("epoch", 1))
+        cache.store("yoga", ("epoch", 1), [3, 1])
+
+        self.assertEqual(cache.get("yoga", ("epoch", 1)), [3, 1])
+        self.assertIsNone(cache.get("yoga", ("epoch", 2)))
+
+    def test_keeps_only_hot_queries(self):
+        cache = HotQueryCache(size=1)
+        for _ in range(3):
+            cache.get("yoga", "state")
+        cache.get("pilates", "state")
+
+        self.assertTrue(cache.is_hot("yoga"))
+        self.assertFalse(cache.is_hot("pilates"))
+        cache.store("pilates", "state", [2])
+        cache.store("yoga", "state", [1])
+        self.assertIsNone(cache.get("pilates", "state"))
+        self.assertEqual(cache.get("yoga", "state"), [1])
+
+
+class HotQuerySearchTestCase(TestCase):
+    def setUp(self):
+        self.first = create_video("Yoga para principiantes")
+        self.second = create_video("Yoga nidra")
+        cache = patch("videos.search.hot_queries", HotQueryCache(size=2))
+        cache.start()
+        self.addCleanup(cache.stop)
+
+    @patch("videos.search.postgres_search")
+    @patch("videos.search.get_catalog_state", return_value=None)
+    def test_without_redis_queries_postgres(self, _, postgres):
+        queryset = Video.objects.all()
+        hot_query_search(queryset, "Yoga")
+        postgres.assert_called_once_with(queryset, "Yoga")
+
+    @patch("videos.search.get_catalog_state", return_value=("epoch", 1, "0-0"))
+    def test_hot_query_is_answered_from_memory(self, _):
+        ranked = Video.objects.filter(id__in=[self.first.id, self.second.id])
+        with patch(
+            "videos.search.postgres_search",
+            side_effect=lambda queryset, query: ranked.order_by("-id"),
+        ) as postgres:
+            hot_query_search(Video.objects.all(), "yoga")
+            results = hot_query_search(Video.objects.all(), "  YOGA ")
+            self.assertEqual(list(results), [self.second, self.first])
+            calls = postgres.call_count
+            results = hot_query_search(Video.objects.all(), "yoga")
+            self.assertEqual(list(results), [self.second, self.first])
+        self.assertEqual(postgres.call_count, calls)
+
+
+@skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+class PostgresSearchTestCase(TestCase):
+    def test_title_matches_rank_above_description_matches(self):
+        in_description = create_video("Meditación guiada", "Yoga nidra para dormir")
+        in_title = create_video("Yoga para principiantes")
+        create_video("Kundalini")
+
+        results = postgres_search(Video.objects.all(), "yoga")
+
+        self.assertEqual(list(results), [in_title, in_description])
+
+    def test_accents_are_ignored(self):
+        video = create_video("Meditación guiada")
+        self.assertEqual(list(postgres_search(Video.objects.all(), "meditacion")), [video])
+
+    def test_tolerates_typos_in_title(self):
+        video = create_video("Kundalini para principiantes")
+        self.assertIn(video, postgres_search(Video.objects.all(), "kundalni"))
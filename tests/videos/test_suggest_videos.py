@@ -0,0 +1,76 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from tests.helpers import FakeRedisMixin
+from videos.models import Category, Video
+from videos.suggest import PrefixIndex, catalog_suggestions
+
+
+class PrefixIndexTestCase(APITestCase):
+    def setUp(self):
+        self.index = PrefixIndex(
+            [
+                ("video", 1, "Vinyasa flow intermedio"),
+                ("video", 2, "Hatha yoga"),
+                ("video", 3, "Hatha para principiantes"),
+                ("category", 1, "Hatha"),
+                ("video", 4, "Meditación"),
+            ]
+        )
+
+    def test_whole_title_matches_come_first_shortest_first(self):
+        titles = [result["title"] for result in self.index.suggest("hat")]
+        self.assertEqual(titles, ["Hatha", "Hatha yoga", "Hatha para principiantes"])
+
+    def test_matches_inside_title(self):
+        self.assertEqual(
+            self.index.suggest("flow"),
+            [{"type": "video", "id": 1, "title": "Vinyasa flow intermedio"}],
+        )
+
+    def test_accent_insensitive_and_limited(self):
+        self.assertEqual(self.index.suggest("MEDITACION")[0]["id"], 4)
+        self.assertEqual(len(self.index.suggest("h", limit=2)), 2)
+        self.assertEqual(self.index.suggest("   "), [])
+
+
+class SuggestVideoAPITestCase(FakeRedisMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        catalog_suggestions.index = None
+
+        Category.objects.create(title="Kundalini", description="description")
+        Video.objects.create(
+            title="Kundalini para principiantes",
+            image="videos/sample.jpg",
+            description="description",
+            url="http://example.com/video/",
+        )
+
+    def test_suggestions_are_served_from_memory(self):
+        url = reverse("suggest_videos") + "?search=kun"
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["type"] for result in response.data["results"]],
+            ["category", "video"],
+        )
+
+    def test_catalog_change_refreshes_suggestions(self):
+        url = reverse("suggest_videos") + "?search=kri"
+        self.assertEqual(self.client.get(url).data["results"], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Video.objects.create(
+                title="Kriyas de respiración",
+                image="videos/sample.jpg",
+                description="description",
+                url="http://example.com/video/",
+            )
+        self.assertEqual(len(self.client.get(url).data["results"]), 1)
+
+    def test_invalid_limit(self):
+        response = self.client.get(reverse("suggest_videos") + "?search=k&limit=x")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
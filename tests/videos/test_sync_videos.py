@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from tests.helpers import FakeRedisMixin, create_video
+from videos.models import CatalogTombstone, Category, Video
+from videos.sync import (SYNC_OVERLAP, TOMBSTONE_RETENTION, decode_sync_token,
+                         encode_sync_token, prune_tombstones)
+
+
+class CatalogChangesTestCase(FakeRedisMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("video-list-changes")
+        self.category = Category.objects.create(title="Hatha", description="")
+        self.video = create_video("Hatha yoga")
+
+    def sync(self, token=None):
+        return self.client.get(self.url, {"since": token} if token else {})
+
+    def backdate(self, token):
+        # Move the token past the overlap window so only newer rows match
+        synced_at, stamp = decode_sync_token(token)
+        return encode_sync_token(synced_at - 2 * SYNC_OVERLAP, stamp)
+
+    def test_first_sync_returns_whole_catalog(self):
+        response = self.sync()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["reset"])
+        self.assertEqual([v["id"] for v in response.data["videos"]], [self.video.id])
+        self.assertEqual(response.data["categories"][0]["id"], self.category.id)
+        self.assertTrue(response.data["next"])
+
+    def test_unchanged_catalog_is_answered_without_queries(self):
+        token = self.sync().data["next"]
+        with self.assertNumQueries(0):
+            response = self.sync(token)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_changes_and_deletions_since_token(self):
+        Video.objects.filter(pk=self.video.pk).update(
+            date_of_modification=timezone.now() - 3 * SYNC_OVERLAP
+        )
+        token = self.backdate(self.sync().data["next"])
+
+        deleted_id = self.video.id
+        with self.captureOnCommitCallbacks(execute=True):
+            new_video = create_video("Hatha flow")
+            self.video.delete()
+
+        response = self.sync(token)
+        self.assertFalse(response.data["reset"])
+        self.assertEqual([v["id"] for v in response.data["videos"]], [new_video.id])
+        self.assertEqual(response.data["deleted"]["videos"], [deleted_id])
+
+    def test_category_link_touches_video(self):
+        Video.objects.filter(pk=self.video.pk).update(
+            date_of_modification=timezone.now() - 3 * SYNC_OVERLAP
+        )
+        Category.objects.filter(pk=self.category.pk).update(
+            date_of_modification=timezone.now() - 3 * SYNC_OVERLAP
+        )
+        token = self.backdate(self.sync().data["next"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.category_videos.add(self.video)
+
+        response = self.sync(token)
+        self.assertEqual([v["id"] for v in response.data["videos"]], [self.video.id])
+        self.assertEqual(response.data["categories"], [])
+
+    def test_delete_with_videos_leaves_tombstones(self):
+        self.video.categories.add(self.category)
+        expected = {
+            (CatalogTombstone.VIDEO, self.video.id),
+            (CatalogTombstone.CATEGORY, self.category.id),
+        }
+        self.category.delete_with_videos()
+        self.assertEqual(
+            set(CatalogTombstone.objects.values_list("kind", "object_id")), expected
+        )
+
+    def test_invalid_token(self):
+        response = self.sync("not-a-token")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_token_resets(self):
+        token = encode_sync_token(timezone.now() - 2 * TOMBSTONE_RETENTION)
+        self.assertTrue(self.sync(token).data["reset"])
+
+    def test_prune_tombstones(self):
+        self.video.delete()
+        later = timezone.now() + TOMBSTONE_RETENTION + timedelta(days=1)
+        self.assertEqual(prune_tombstones(later), 1)
+        self.assertFalse(CatalogTombstone.objects.exists())
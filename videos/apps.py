@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class VideosConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "videos"
+
+    def ready(self):
+        from core.images import track_image_derivatives
+
+        from . import signals  # noqa: F401
+        from .models import Video
+
+        track_image_derivatives(Video)
@@ -0,0 +1,211 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_versions
+from .models import Category, Video
+
+BULK_CHUNK_SIZE = 1000
+VIDEO_EXPORT_FIELDS = ("id", "title", "image", "description", "url", "free")
+VIDEO_IMPORT_FIELDS = ("title", "image", "description", "url", "free")
+CSV_LIST_SEPARATOR = "|"
+TRUE_VALUES = ("1", "true", "yes")
+FALSE_VALUES = ("", "0", "false", "no")
+
+
+class InvalidImportRow(ValueError):
+    pass
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def read_rows(stream, file_format):
+    """Yield video dicts from a JSONL or CSV text stream, one line at a time."""
+    if file_format == "jsonl":
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise InvalidImportRow(f"Line {line_number}: {e}")
+        return
+
+    for row in csv.DictReader(stream):
+        if row.get("categories") is not None:
+            row["categories"] = [
+                value for value in row["categories"].split(CSV_LIST_SEPARATOR) if value
+            ]
+        yield row
+
+
+def write_rows(stream, rows, file_format):
+    if file_format == "jsonl":
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return
+
+    writer = csv.DictWriter(stream, fieldnames=VIDEO_EXPORT_FIELDS + ("categories",))
+    writer.writeheader()
+    for row in rows:
+        categories = CSV_LIST_SEPARATOR.join(map(str, row["categories"]))
+        writer.writerow(dict(row, categories=categories))
+
+
+def export_video_rows(chunk_size=BULK_CHUNK_SIZE):
+    """
+    Yield every video as a dict with its category ids, walking the table in
+    id order one chunk at a time so memory stays flat.
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            Video.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values(*VIDEO_EXPORT_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return
+        categories = {row["id"]: [] for row in rows}
+        links = (
+            Video.categories.through.objects.filter(video_id__in=categories)
+            .order_by("id")
+            .values_list("video_id", "category_id")
+        )
+        for video_id, category_id in links:
+            categories[video_id].append(category_id)
+        for row in rows:
+            row["categories"] = categories[row["id"]]
+            yield row
+        last_id = rows[-1]["id"]
+
+
+class CategoryResolver:
+    """Maps category ids or titles to ids with a single query."""
+
+    def __init__(self):
+        self.ids = {}
+        self.titles = {}
+        for pk, title in Category.objects.values_list("id", "title"):
+            self.ids[pk] = pk
+            self.titles.setdefault(title.strip().lower(), pk)
+
+    def resolve(self, value):
+        if isinstance(value, int) or str(value).strip().isdigit():
+            pk = self.ids.get(int(value))
+        else:
+            pk = self.titles.get(str(value).strip().lower())
+        if pk is None:
+            raise InvalidImportRow(f"Unknown category {value!r}")
+        return pk
+
+
+def import_video_rows(rows, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Create or update videos from dicts in chunks: rows with the id of an
+    existing video update it, every other row creates a new video. A row's
+    "categories", when present, replaces that video's categories.
+
+    Each chunk is one transaction with a fixed number of statements. Bulk
+    writes skip model signals, so the catalog change feed is bumped here.
+    Returns (created, updated).
+    """
+    resolver = CategoryResolver()
+    created = updated = 0
+    for chunk in chunked(rows, chunk_size):
+        chunk_created, chunk_updated = _import_chunk(chunk, resolver)
+        created += chunk_created
+        updated += chunk_updated
+    return created, updated
+
+
+def _import_chunk(chunk, resolver):
+    parsed = [_parse_row(row, resolver) for row in chunk]
+    existing_ids = set(
+        Video.objects.filter(
+            id__in=[video.id for video, _ in parsed if video.id]
+        ).values_list("id", flat=True)
+    )
+    new_videos, changed_videos, links = [], [], []
+    now = timezone.now()
+    for video, categories in parsed:
+        if video.id in existing_ids:
+            video.date_of_modification = now
+            changed_videos.append(video)
+        else:
+            video.id = None
+            new_videos.append(video)
+        if categories is not None:
+            links.append((video, categories))
+
+    Through = Video.categories.through
+    with transaction.atomic():
+        Video.objects.bulk_create(new_videos)
+        Video.objects.bulk_update(
+            changed_videos, VIDEO_IMPORT_FIELDS + ("date_of_modification",)
+        )
+        Through.objects.filter(
+            video_id__in=[video.id for video, _ in links if video.id in existing_ids]
+        ).delete()
+        Through.objects.bulk_create(
+            Through(video_id=video.id, category_id=category_id)
+            for video, categories in links
+            for category_id in dict.fromkeys(categories)
+        )
+
+        video_ids = [video.id for video in new_videos + changed_videos]
+        transaction.on_commit(lambda: bump_catalog_versions(video_ids))
+    return len(new_videos), len(changed_videos)
+
+
+def _parse_bool(value):
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise InvalidImportRow(f"Invalid boolean {value!r}")
+
+
+def _parse_row(row, resolver):
+    missing = [field for field in ("title", "url") if not row.get(field)]
+    if missing:
+        raise InvalidImportRow(f"Row {row!r} is missing {', '.join(missing)}")
+    try:
+        pk = int(row["id"]) if row.get("id") not in (None, "") else None
+    except (TypeError, ValueError):
+        raise InvalidImportRow(f"Invalid id {row['id']!r}")
+    video = Video(
+        id=pk,
+        title=row["title"],
+        image=row.get("image") or "",
+        description=row.get("description") or "",
+        url=row["url"],
+        free=_parse_bool(row.get("free")),
+    )
+    try:
+        # Uniqueness is left to the database: rows with an id update a video.
+        # Images and descriptions are optional in import files.
+        video.full_clean(
+            exclude=[field for field in ("image", "description") if not row.get(field)],
+            validate_unique=False,
+            validate_constraints=False,
+        )
+    except ValidationError as e:
+        errors = "; ".join(
+            f"{field}: {' '.join(messages)}" for field, messages in e.message_dict.items()
+        )
+        raise InvalidImportRow(f"Row {row!r} is invalid: {errors}")
+    categories = row.get("categories")
+    if categories is not None:
+        categories = [resolver.resolve(value) for value in categories]
+    return video, categories
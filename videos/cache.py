@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import uuid
+from collections import namedtuple
+
+import redis
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from core.conditional import make_etag
+from core.redis_connection import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "videos:catalog_version"
+CATALOG_EPOCH_KEY = "videos:catalog_epoch"
+CATALOG_CHANGES_KEY = "videos:catalog_changes"
+CATALOG_CHANGES_MAXLEN = 10000
+# Video ids recorded per feed entry by bump_catalog_versions
+CATALOG_CHANGE_BATCH_SIZE = 1000
+RESPONSE_CACHE_PREFIX = "videos:response"
+RESPONSE_CACHE_TTL = 60 * 60 * 6
+
+CatalogValidators = namedtuple(
+    "CatalogValidators", ["cache_key", "etag", "last_modified"]
+)
+
+
+def bump_catalog_version(video_id=None):
+    """
+    Invalidate every cached catalog response by moving to a new version.
+    Old entries are never read again and expire through their TTL.
+
+    Each bump also appends an entry to the catalog change feed, in the same
+    transaction, so feed readers can count on one entry per version.
+    """
+    return bump_catalog_versions([video_id])
+
+
+def bump_catalog_versions(video_ids):
+    """
+    Record a change to `video_ids` with a single Redis round trip. The ids
+    share one version and feed entry per CATALOG_CHANGE_BATCH_SIZE, so bulk
+    writes cost a handful of commands however many videos they touch.
+    """
+    video_ids = list(video_ids)
+    batches = [
+        video_ids[start : start + CATALOG_CHANGE_BATCH_SIZE]
+        for start in range(0, len(video_ids), CATALOG_CHANGE_BATCH_SIZE)
+    ]
+    try:
+        pipeline = get_redis_connection().pipeline(transaction=True)
+        for batch in batches:
+            pipeline.incr(CATALOG_VERSION_KEY)
+            pipeline.xadd(
+                CATALOG_CHANGES_KEY,
+                {"video_ids": ",".join(str(video_id) for video_id in batch if video_id)},
+                maxlen=CATALOG_CHANGES_MAXLEN,
+                approximate=True,
+            )
+        results = pipeline.execute()
+        return results[-2] if results else None
+    except redis.RedisError as e:
+        logger.error(f"Error bumping catalog version in Redis: {e}")
+        return None
+
+
+def get_catalog_state():
+    """
+    Return a consistent (epoch, version, last_change_id) snapshot, or None if
+    Redis is unavailable. The epoch changes whenever the Redis data is lost,
+    so readers can tell a reset counter from an unchanged catalog.
+    """
+    try:
+        connection = get_redis_connection()
+        pipeline = connection.pipeline(transaction=True)
+        pipeline.mget(CATALOG_EPOCH_KEY, CATALOG_VERSION_KEY)
+        pipeline.xrevrange(CATALOG_CHANGES_KEY, count=1)
+        (epoch, version), last_change = pipeline.execute()
+        if epoch is None:
+            connection.set(CATALOG_EPOCH_KEY, uuid.uuid4().hex, nx=True)
+            epoch = connection.get(CATALOG_EPOCH_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Error reading catalog state from Redis: {e}")
+        return None
+    last_change_id = last_change[0][0].decode() if last_change else "0-0"
+    return epoch.decode(), int(version or 0), last_change_id
+
+
+def get_catalog_changes(after_change_id):
+    """
+    Return the (change_id, video_ids) feed entries after `after_change_id`,
+    oldest first. video_ids is empty for changes that are not about
+    particular videos.
+    """
+    try:
+        entries = get_redis_connection().xrange(
+            CATALOG_CHANGES_KEY, min=after_change_id
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Error reading catalog changes from Redis: {e}")
+        return None
+
+    changes = []
+    for change_id, fields in entries:
+        change_id = change_id.decode()
+        if change_id == after_change_id:
+            continue
+        video_ids = fields.get(b"video_ids", b"")
+        changes.append(
+            (change_id, [int(video_id) for video_id in video_ids.split(b",") if video_id])
+        )
+    return changes
+
+
+def get_auth_tier(request):
+    """
+    Classify the caller as anonymous, member or staff from the JWT claims so
+    the tier can be part of a cache key without loading the user row.
+    An invalid token raises InvalidToken, which DRF turns into a 401.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        user = getattr(request._request, "user", None)
+        if user is not None and user.is_authenticated:
+            return _tier_for(user.is_staff, user.active)
+        return "anonymous"
+
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return "anonymous"
+    token = authentication.get_validated_token(raw_token)
+    return _tier_for(token.get("is_staff", False), token.get("active", False))
+
+
+def _tier_for(is_staff, active):
+    if is_staff:
+        return "staff"
+    if active:
+        return "member"
+    return "anonymous"
+
+
+def build_response_cache_key(view_name, request, tier, version):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    digest = hashlib.sha1(json.dumps(params).encode()).hexdigest()
+    return f"{RESPONSE_CACHE_PREFIX}:{version}:{view_name}:{tier}:{digest}"
+
+
+def get_cached_response(cache_key):
+    try:
+        payload = get_redis_connection().get(cache_key)
+    except redis.RedisError as e:
+        logger.warning(f"Error reading cached response {cache_key}: {e}")
+        return None
+    if payload is None:
+        return None
+    return json.loads(payload)
+
+
+def set_cached_response(cache_key, data, ttl=RESPONSE_CACHE_TTL):
+    try:
+        get_redis_connection().set(
+            cache_key, json.dumps(data, cls=DjangoJSONEncoder), ex=ttl
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Error caching response {cache_key}: {e}")
+
+
+def get_catalog_validators(view_name, request):
+    """
+    Return the response cache key and the ETag/Last-Modified validators for
+    a catalog read, or None when Redis is unavailable. Both are derived from
+    the catalog version, so neither needs a database query.
+    """
+    tier = get_auth_tier(request)
+    state = get_catalog_state()
+    if state is None:
+        return None
+    epoch, version, last_change_id = state
+    cache_key = build_response_cache_key(
+        view_name, request, tier, f"{epoch}:{version}"
+    )
+    return CatalogValidators(
+        cache_key, make_etag(cache_key), change_timestamp(last_change_id)
+    )
+
+
+def get_video_validators(video, fields=()):
+    """
+    Return (etag, last_modified) for a video detail payload, or None when
+    Redis is unavailable. The payload nests categories, whose changes only
+    show up in the catalog version, so both stamps are combined.
+    """
+    state = get_catalog_state()
+    if state is None:
+        return None
+    epoch, version, last_change_id = state
+    etag = make_etag(
+        "video_detail",
+        video.id,
+        video.date_of_modification.isoformat(),
+        epoch,
+        version,
+        *fields,
+    )
+    last_modified = max(
+        video.date_of_modification.timestamp(),
+        change_timestamp(last_change_id) or 0,
+    )
+    return etag, last_modified
+
+
+def change_timestamp(change_id):
+    """Unix time of a change feed entry; stream ids start with milliseconds."""
+    milliseconds = int(change_id.split("-")[0])
+    return milliseconds / 1000 if milliseconds else None
@@ -0,0 +1,46 @@
+from django.db.models import Count
+
+from .cache import get_cached_response, get_catalog_state, set_cached_response
+from .models import Video
+
+FACETS_CACHE_PREFIX = "videos:facets"
+
+
+def count_videos_by_category(queryset=None):
+    """
+    Count videos per category with a single GROUP BY over the
+    video/category through table, optionally restricted to `queryset`.
+    """
+    links = Video.categories.through.objects.all()
+    if queryset is not None:
+        links = links.filter(video_id__in=queryset.order_by().values("id"))
+    rows = (
+        links.values("category_id", "category__title")
+        .annotate(count=Count("video_id"))
+        .order_by("category__title", "category_id")
+    )
+    return [
+        {"id": row["category_id"], "title": row["category__title"], "count": row["count"]}
+        for row in rows
+    ]
+
+
+def category_facets(queryset=None):
+    """
+    Category counts for `queryset`, or for the whole catalog when it is None.
+    Whole-catalog counts are cached per catalog version, so the landing page
+    does not pay for the GROUP BY.
+    """
+    if queryset is not None:
+        return count_videos_by_category(queryset)
+
+    state = get_catalog_state()
+    if state is None:
+        return count_videos_by_category()
+    epoch, version, _ = state
+    cache_key = f"{FACETS_CACHE_PREFIX}:{epoch}:{version}:categories"
+    facets = get_cached_response(cache_key)
+    if facets is None:
+        facets = count_videos_by_category()
+        set_cached_response(cache_key, facets)
+    return facets
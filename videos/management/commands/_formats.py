@@ -0,0 +1,22 @@
+from django.core.management.base import CommandError
+
+FORMATS = ("jsonl", "csv")
+
+
+def add_format_arguments(parser):
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="Defaults to the file extension, or jsonl for stdin/stdout",
+    )
+
+
+def file_format(path, requested=None):
+    if requested:
+        return requested
+    if path == "-":
+        return "jsonl"
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension not in FORMATS:
+        raise CommandError(f"Cannot tell the format of {path}, pass --format")
+    return extension
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from videos.models import Category, Video
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time Category.delete_with_videos for several category sizes. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000, 5000],
+            help="Number of videos in the deleted category",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'videos':>8} {'queries':>8} {'ms':>10}")
+        for size in options["sizes"]:
+            try:
+                with transaction.atomic():
+                    category = self.create_category(size)
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        category.delete_with_videos()
+                        elapsed = (time.perf_counter() - start) * 1000
+                    self.stdout.write(f"{size:>8} {len(queries):>8} {elapsed:>10.1f}")
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def create_category(self, size):
+        category = Category.objects.create(title="Benchmark", description="")
+        videos = Video.objects.bulk_create(
+            Video(
+                title=f"Benchmark video {i}",
+                image=f"videos/benchmark_{i}.jpg",
+                description="",
+                url="http://example.com/",
+            )
+            for i in range(size)
+        )
+        Video.categories.through.objects.bulk_create(
+            Video.categories.through(video_id=video.id, category_id=category.id)
+            for video in videos
+        )
+        return category
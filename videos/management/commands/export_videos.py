@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from videos.bulk import BULK_CHUNK_SIZE, export_video_rows, write_rows
+
+from ._formats import add_format_arguments, file_format
+
+
+class Command(BaseCommand):
+    help = "Write every video with its category ids as JSONL or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to write, or - for stdout")
+        add_format_arguments(parser)
+        parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = file_format(path, options["format"])
+        rows = export_video_rows(max(1, options["chunk_size"]))
+
+        if path == "-":
+            write_rows(self.stdout, rows, fmt)
+            return
+        with open(path, "w", newline="", encoding="utf-8") as stream:
+            write_rows(stream, rows, fmt)
@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.bulk import (BULK_CHUNK_SIZE, InvalidImportRow, import_video_rows,
+                         read_rows)
+
+from ._formats import add_format_arguments, file_format
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update videos from a JSONL or CSV file, as written by "
+        "export_videos. Rows with the id of an existing video update it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, or - for stdin")
+        add_format_arguments(parser)
+        parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = file_format(path, options["format"])
+        start = time.perf_counter()
+
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            created, updated = import_video_rows(
+                read_rows(stream, fmt), max(1, options["chunk_size"])
+            )
+        except InvalidImportRow as e:
+            # Chunks before the bad row are already committed
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {created} and updated {updated} videos in {elapsed:.1f}s"
+            )
+        )
+        self.stdout.write(
+            "Run backfill_image_placeholders to build thumbnails for the new images"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from videos.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete catalog tombstones older than the delta sync retention window"
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} catalog tombstones"))
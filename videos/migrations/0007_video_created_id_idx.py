@@ -0,0 +1,19 @@
+# Generated by Django 5.0.8 on 2026-10-17 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0006_alter_video_url"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="video",
+            index=models.Index(
+                fields=["date_of_creation", "id"], name="video_created_id_idx"
+            ),
+        ),
+    ]
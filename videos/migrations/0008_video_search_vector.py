@@ -0,0 +1,84 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Full-text and trigram search only exist on PostgreSQL. Dev and test run on
+# SQLite, where search falls back to the portable backend in videos.search.
+
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_ts_config WHERE cfgname = 'spanish_unaccent'
+        ) THEN
+            CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = spanish);
+            ALTER TEXT SEARCH CONFIGURATION spanish_unaccent
+                ALTER MAPPING FOR hword, hword_part, word
+                WITH unaccent, spanish_stem;
+        END IF;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION videos_video_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('spanish_unaccent', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('spanish_unaccent', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER videos_video_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON videos_video
+    FOR EACH ROW EXECUTE FUNCTION videos_video_search_vector_update()
+    """,
+    """
+    UPDATE videos_video SET search_vector =
+        setweight(to_tsvector('spanish_unaccent', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('spanish_unaccent', coalesce(description, '')), 'B')
+    """,
+    "CREATE INDEX videos_video_search_vector_idx ON videos_video USING gin (search_vector)",
+    "CREATE INDEX videos_video_title_trgm_idx ON videos_video USING gin (title gin_trgm_ops)",
+]
+
+REVERSE_SQL = [
+    "DROP INDEX IF EXISTS videos_video_title_trgm_idx",
+    "DROP INDEX IF EXISTS videos_video_search_vector_idx",
+    "DROP TRIGGER IF EXISTS videos_video_search_vector_trigger ON videos_video",
+    "DROP FUNCTION IF EXISTS videos_video_search_vector_update()",
+]
+
+
+def run_on_postgres(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0007_video_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(
+            run_on_postgres(FORWARD_SQL), run_on_postgres(REVERSE_SQL)
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0009_catalog_sync"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.8 on 2026-10-17 11:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos", "0010_video_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="view_count",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="VideoDailyViews",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("views", models.PositiveIntegerField(default=0)),
+                ("unique_viewers", models.PositiveIntegerField(default=0)),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_views",
+                        to="videos.video",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="videodailyviews",
+            constraint=models.UniqueConstraint(
+                fields=("video", "day"), name="video_daily_views_unique"
+            ),
+        ),
+    ]
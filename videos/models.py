@@ -1,9 +1,12 @@
 import logging
-import os
 
-import boto3
-from django.conf import settings
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+
+from core.images import variant_names
+from core.media import delete_media_files
+
+from .cache import bump_catalog_versions
 
 logger = logging.getLogger("django")
 
@@ -17,50 +20,131 @@ class Video(models.Model):
     date_of_creation = models.DateTimeField(auto_now_add=True)
     date_of_modification = models.DateTimeField(auto_now=True)
     categories = models.ManyToManyField("Category", related_name="category_videos")
+    # Maintained by a database trigger on PostgreSQL, see migration 0008
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Thumbnails generated from `image`, see core.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Flushed from the Redis view counters, see videos.popularity
+    view_count = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["date_of_creation", "id"], name="video_created_id_idx"
+            ),
+            models.Index(fields=["date_of_modification"], name="video_modified_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
-    def delete(self, *args, **kwargs):
-        # Delete associated image file
-        if self.image:
-            if settings.DEBUG:
-                # Delete image locally
-                if os.path.isfile(self.image.path):
-                    os.remove(self.image.path)
-            else:
-                # Delete image from S3
-                s3 = boto3.client(
-                    "s3",
-                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                )
-                try:
-                    s3.delete_object(
-                        Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=self.image.name
-                    )
-                except Exception as e:
-                    logger.error(f"Error deleting image from S3: {e}")
-
-        super(Video, self).delete(*args, **kwargs)
+    def delete(self, *args, delete_media=True, **kwargs):
+        media_names = [self.image.name] + variant_names(self.image_variants)
+        result = super(Video, self).delete(*args, **kwargs)
+        # Pass delete_media=False to collect the files of many videos into
+        # one deletion instead
+        if delete_media:
+            delete_media_files(media_names)
+        return result
 
 
 class Category(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     videos = models.ManyToManyField(Video, related_name="video_categories")
+    date_of_modification = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
 
     def delete_with_videos(self):
-        # Retrieve and delete all related videos by querying the Video model
-        videos = Video.objects.filter(categories__id=self.id)
-        for video in videos:
+        """
+        Delete the category and every video in it with a fixed number of
+        statements, whatever the category size. Bulk deletes skip the model
+        signals, so tombstones and the catalog change feed are written here.
+        """
+        with transaction.atomic():
+            videos = list(
+                Video.objects.filter(categories__id=self.id)
+                .order_by("id")
+                .values_list("id", "image", "image_variants")
+            )
+            video_ids = [video_id for video_id, _, _ in videos]
             logger.info(
-                f"Deleting video '{video.title}' due to category deletion (ID: {self.id})"
+                f"Deleting {len(video_ids)} videos due to category deletion (ID: {self.id})"
+            )
+
+            # The statements select the videos with a subquery on the
+            # category's own links, which the category delete below removes
+            # last; binding the ids would hit parameter limits on big
+            # categories. The list is only kept for tombstones and media.
+            in_category = Video.categories.through.objects.filter(
+                category_id=self.id
+            ).values("video_id")
+            Video.categories.through.objects.filter(
+                video_id__in=in_category
+            ).exclude(category_id=self.id).delete()
+            Category.videos.through.objects.filter(video_id__in=in_category).delete()
+            VideoDailyViews.objects.filter(video_id__in=in_category).delete()
+            # _raw_delete issues a single DELETE, skipping the collector and
+            # the per-video signals; the through rows and view stats are gone
+            # and test_every_table_referencing_video_is_cleared fails if Video
+            # gains another dependant. The category's links still point at
+            # the videos until the end of the transaction, which the deferred
+            # foreign key checks allow.
+            deleted_videos = Video.objects.filter(id__in=in_category)
+            deleted_videos._raw_delete(deleted_videos.db)
+            CatalogTombstone.objects.bulk_create(
+                CatalogTombstone(kind=CatalogTombstone.VIDEO, object_id=video_id)
+                for video_id in video_ids
+            )
+
+            # Delete the category
+            super(Category, self).delete()
+            transaction.on_commit(lambda: bump_catalog_versions(video_ids))
+            delete_media_files(
+                [
+                    name
+                    for _, image, variants in videos
+                    for name in [image] + variant_names(variants)
+                ]
+            )
+
+
+class CatalogTombstone(models.Model):
+    """
+    Remembers deleted videos and categories so delta-syncing clients can
+    drop them. Rows older than the sync retention window are pruned.
+    """
+
+    VIDEO = "video"
+    CATEGORY = "category"
+    KIND_CHOICES = [(VIDEO, "Video"), (CATEGORY, "Category")]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    date_of_deletion = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+
+class VideoDailyViews(models.Model):
+    """Views and unique viewers of a video per UTC day."""
+
+    video = models.ForeignKey(
+        Video, on_delete=models.CASCADE, related_name="daily_views"
+    )
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    unique_viewers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["video", "day"], name="video_daily_views_unique"
             )
-            video.delete()
+        ]
 
-        # Delete the category
-        super(Category, self).delete()
+    def __str__(self):
+        return f"{self.video_id} {self.day}"
@@ -0,0 +1,61 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_ORDERING = ("date_of_creation", "id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def is_cursor_request(request):
+    """Cursor mode is opt-in with ?pagination=cursor or by sending a cursor."""
+    return (
+        request.query_params.get("pagination") == "cursor"
+        or "cursor" in request.query_params
+    )
+
+
+def encode_cursor(row):
+    position = [row["date_of_creation"].isoformat(), row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        date_of_creation = parse_datetime(created)
+        pk = int(pk)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if date_of_creation is None:
+        raise InvalidCursor("Invalid cursor")
+    return date_of_creation, pk
+
+
+def paginate_queryset_by_cursor(queryset, request):
+    """
+    Keyset pagination of Video .values() rows over (date_of_creation, id).
+    Every page is an indexed range scan of page_size + 1 rows, so deep pages
+    cost the same as page 1.
+    Returns the page and the cursor of the next one (None on the last page).
+    """
+    page_size = max(int(request.query_params.get("page_size", 10)), 1)
+    cursor = request.query_params.get("cursor")
+
+    queryset = queryset.order_by(*CURSOR_ORDERING)
+    if cursor:
+        date_of_creation, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(date_of_creation__gt=date_of_creation)
+            | Q(date_of_creation=date_of_creation, id__gt=pk)
+        )
+
+    rows = list(queryset[: page_size + 1])
+    page = rows[:page_size]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > page_size else None
+    return page, next_cursor
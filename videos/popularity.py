@@ -0,0 +1,219 @@
+import logging
+from datetime import timedelta
+
+import redis
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from core.redis_connection import get_redis_connection
+
+from .models import Video, VideoDailyViews
+from .serializers import VIDEO_FIELDS, serialize_video_rows, video_columns
+
+logger = logging.getLogger(__name__)
+
+# Views not yet flushed to Video.view_count, video id -> count
+PENDING_VIEWS_KEY = "videos:views:pending"
+FLUSHING_VIEWS_KEY = "videos:views:flushing"
+FLUSH_LOCK_KEY = "videos:views:flush_lock"
+FLUSH_LOCK_TTL = 60 * 5
+# Hash per UTC day, video id -> views that day
+DAILY_VIEWS_PREFIX = "videos:views:daily"
+# HyperLogLog of viewers per UTC day and video
+DAILY_VIEWERS_PREFIX = "videos:viewers"
+DAILY_KEY_TTL = 60 * 60 * 24 * 3
+# Sorted set per hour, video id -> views that hour
+TRENDING_BUCKET_PREFIX = "videos:trending:hour"
+TRENDING_RANKING_KEY = "videos:trending:ranking"
+TRENDING_WINDOW_HOURS = 72
+TRENDING_HALF_LIFE_HOURS = 24
+TRENDING_CACHE_TTL = 60
+TRENDING_LIMIT = 20
+MAX_TRENDING_LIMIT = 100
+FLUSH_CHUNK_SIZE = 500
+
+
+def viewer_key(request, entitlement=None):
+    """Identify a viewer for unique counts: the user if known, else the IP."""
+    if entitlement and entitlement.get("id") is not None:
+        return f"user:{entitlement['id']}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def record_video_view(video_id, viewer):
+    """
+    Count a view of `video_id` in Redis with a single round trip. Nothing
+    is written to the database here; flush_view_counts does that in bulk.
+    """
+    now = timezone.now()
+    daily_views = f"{DAILY_VIEWS_PREFIX}:{now.date().isoformat()}"
+    viewers = f"{DAILY_VIEWERS_PREFIX}:{now.date().isoformat()}:{video_id}"
+    bucket = f"{TRENDING_BUCKET_PREFIX}:{int(now.timestamp() // 3600)}"
+    try:
+        pipeline = get_redis_connection().pipeline(transaction=False)
+        pipeline.hincrby(PENDING_VIEWS_KEY, video_id, 1)
+        pipeline.hincrby(daily_views, video_id, 1)
+        pipeline.expire(daily_views, DAILY_KEY_TTL)
+        pipeline.pfadd(viewers, viewer)
+        pipeline.expire(viewers, DAILY_KEY_TTL)
+        pipeline.zincrby(bucket, 1, video_id)
+        pipeline.expire(bucket, (TRENDING_WINDOW_HOURS + 1) * 3600)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Error recording view of video {video_id}: {e}")
+
+
+def get_trending_ranking(limit=TRENDING_LIMIT):
+    """
+    Return [(video_id, score)] best first, or None if Redis is unavailable.
+    The score sums the hourly views of the trending window, each hour
+    weighted by 0.5 ** (age / half-life). The ranking is rebuilt at most
+    once per TRENDING_CACHE_TTL.
+    """
+    try:
+        connection = get_redis_connection()
+        if not connection.exists(TRENDING_RANKING_KEY):
+            current_hour = int(timezone.now().timestamp() // 3600)
+            weights = {
+                f"{TRENDING_BUCKET_PREFIX}:{current_hour - age}": 0.5
+                ** (age / TRENDING_HALF_LIFE_HOURS)
+                for age in range(TRENDING_WINDOW_HOURS)
+            }
+            pipeline = connection.pipeline(transaction=True)
+            pipeline.zunionstore(TRENDING_RANKING_KEY, weights)
+            pipeline.expire(TRENDING_RANKING_KEY, TRENDING_CACHE_TTL)
+            pipeline.execute()
+        ranking = connection.zrevrange(
+            TRENDING_RANKING_KEY, 0, limit - 1, withscores=True
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Error reading trending videos from Redis: {e}")
+        return None
+    return [(int(video_id), score) for video_id, score in ranking]
+
+
+def trending_videos(limit=TRENDING_LIMIT, request=None, fields=VIDEO_FIELDS):
+    """
+    Serialized trending videos, best first. Falls back to the all-time view
+    counts when Redis is unavailable.
+    """
+    ranking = get_trending_ranking(limit)
+    if ranking is None:
+        video_ids = list(
+            Video.objects.order_by("-view_count", "-id").values_list(
+                "id", flat=True
+            )[:limit]
+        )
+    else:
+        video_ids = [video_id for video_id, _ in ranking]
+
+    rows = {
+        row["id"]: row
+        for row in Video.objects.filter(id__in=video_ids).values(
+            *video_columns(fields)
+        )
+    }
+    # Deleted videos can linger in the ranking until their buckets expire
+    return serialize_video_rows(
+        [rows[video_id] for video_id in video_ids if video_id in rows],
+        request,
+        fields,
+    )
+
+
+def flush_view_counts():
+    """
+    Add the views counted in Redis to Video.view_count and refresh the
+    VideoDailyViews rows of today and yesterday. Returns the number of
+    videos flushed, or 0 if another flush is running.
+
+    The pending counts are claimed by renaming their hash, so views recorded
+    meanwhile go to a fresh one. A claimed batch whose database write fails
+    stays claimed and is retried first on the next run. It is deleted
+    before the transaction commits, so a batch is never added twice. A
+    failed commit after that loses those views rather than doubling them.
+    """
+    connection = get_redis_connection()
+    lock = connection.lock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_TTL, blocking=False)
+    if not lock.acquire():
+        return 0
+    try:
+        return _flush_claimed_views(connection)
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            logger.warning("View count flush lock expired before release")
+
+
+def _flush_claimed_views(connection):
+    if not connection.exists(FLUSHING_VIEWS_KEY):
+        try:
+            connection.rename(PENDING_VIEWS_KEY, FLUSHING_VIEWS_KEY)
+        except redis.ResponseError:
+            # No views since the last flush
+            return 0
+    counts = {
+        int(video_id): int(count)
+        for video_id, count in connection.hgetall(FLUSHING_VIEWS_KEY).items()
+    }
+    video_ids = list(
+        Video.objects.filter(id__in=counts).order_by("id").values_list(
+            "id", flat=True
+        )
+    )
+    today = timezone.now().date()
+    days = [today - timedelta(days=1), today]
+    daily_rows = _daily_view_rows(connection, video_ids, days)
+
+    with transaction.atomic():
+        for start in range(0, len(video_ids), FLUSH_CHUNK_SIZE):
+            chunk = video_ids[start : start + FLUSH_CHUNK_SIZE]
+            increments = [
+                When(id=video_id, then=Value(counts[video_id])) for video_id in chunk
+            ]
+            Video.objects.filter(id__in=chunk).update(
+                view_count=F("view_count") + Case(*increments, default=Value(0))
+            )
+        VideoDailyViews.objects.bulk_create(
+            daily_rows,
+            batch_size=FLUSH_CHUNK_SIZE,
+            update_conflicts=True,
+            unique_fields=["video", "day"],
+            update_fields=["views", "unique_viewers"],
+        )
+        # A Redis error here rolls the increments back
+        connection.delete(FLUSHING_VIEWS_KEY)
+    return len(video_ids)
+
+
+def _daily_view_rows(connection, video_ids, days):
+    """
+    VideoDailyViews rows with the absolute totals Redis holds for `days`,
+    so writing them again is harmless.
+    """
+    if not video_ids:
+        return []
+    pipeline = connection.pipeline(transaction=False)
+    for day in days:
+        pipeline.hmget(f"{DAILY_VIEWS_PREFIX}:{day.isoformat()}", video_ids)
+        for video_id in video_ids:
+            pipeline.pfcount(f"{DAILY_VIEWERS_PREFIX}:{day.isoformat()}:{video_id}")
+    results = iter(pipeline.execute())
+
+    rows = []
+    for day in days:
+        views = next(results)
+        viewers = [next(results) for _ in video_ids]
+        for video_id, day_views, unique_viewers in zip(video_ids, views, viewers):
+            if day_views is not None:
+                rows.append(
+                    VideoDailyViews(
+                        video_id=video_id,
+                        day=day,
+                        views=int(day_views),
+                        unique_viewers=unique_viewers,
+                    )
+                )
+    return rows
@@ -0,0 +1,120 @@
+import threading
+from collections import Counter
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, When
+
+from .cache import get_catalog_state
+from .models import Video
+from .search_index import video_search_index
+
+SEARCH_CONFIG = "spanish_unaccent"
+MAX_RANKED_RESULTS = 500
+HOT_QUERY_COUNT = 50
+
+
+def search_videos(queryset, query):
+    """
+    Filter `queryset` to the videos matching `query`, best matches first.
+    PostgreSQL ranks full-text matches over title and description and uses
+    trigram similarity on the title to tolerate typos, with the hottest
+    queries answered from memory. Other databases use the in-process
+    inverted index.
+    """
+    if connection.vendor == "postgresql":
+        return hot_query_search(queryset, query)
+    return filter_ranked(
+        queryset, video_search_index.ranked_ids(query, MAX_RANKED_RESULTS)
+    )
+
+
+def postgres_search(queryset, query):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+    # Both predicates are served by GIN indexes (search_vector and
+    # title gin_trgm_ops), so the scan does not grow with the catalog.
+    return (
+        queryset.filter(Q(search_vector=search_query) | Q(title__trigram_similar=query))
+        .annotate(
+            rank=SearchRank(F("search_vector"), search_query),
+            similarity=TrigramSimilarity("title", query),
+        )
+        .order_by("-rank", "-similarity", "id")
+    )
+
+
+def filter_ranked(queryset, ranked_ids):
+    """Restrict `queryset` to `ranked_ids`, keeping their order."""
+    if not ranked_ids:
+        return queryset.none()
+    ordering = Case(
+        *[When(id=video_id, then=position) for position, video_id in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ranked_ids).order_by(ordering)
+
+
+class HotQueryCache:
+    """
+    Per-process first tier for the most frequent search queries. Holds the
+    ranked ids Postgres returned for each hot query, tagged with the catalog
+    state they were computed at, so any catalog change retires them.
+    """
+
+    def __init__(self, size=HOT_QUERY_COUNT):
+        self.size = size
+        self.hits = Counter()
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, state):
+        with self.lock:
+            self.hits[key] += 1
+            if len(self.hits) > self.size * 20:
+                # Forget the long tail so the counter stays bounded
+                self.hits = Counter(dict(self.hits.most_common(self.size * 2)))
+            cached = self.results.get(key)
+        if cached and cached[0] == state:
+            return cached[1]
+        return None
+
+    def is_hot(self, key):
+        with self.lock:
+            return key in dict(self.hits.most_common(self.size))
+
+    def store(self, key, state, ranked_ids):
+        with self.lock:
+            hot = dict(self.hits.most_common(self.size))
+            self.results = {
+                cached_key: value
+                for cached_key, value in self.results.items()
+                if cached_key in hot
+            }
+            self.results[key] = (state, ranked_ids)
+
+
+hot_queries = HotQueryCache()
+
+
+def hot_query_search(queryset, query):
+    key = " ".join(query.lower().split())
+    state = get_catalog_state()
+    if state is None:
+        return postgres_search(queryset, query)
+    state = state[:2]
+
+    ranked_ids = hot_queries.get(key, state)
+    if ranked_ids is not None:
+        return filter_ranked(queryset, ranked_ids)
+
+    if hot_queries.is_hot(key):
+        ranked_ids = list(
+            postgres_search(Video.objects.all(), query).values_list("id", flat=True)[
+                : MAX_RANKED_RESULTS + 1
+            ]
+        )
+        if len(ranked_ids) <= MAX_RANKED_RESULTS:
+            hot_queries.store(key, state, ranked_ids)
+            return filter_ranked(queryset, ranked_ids)
+    return postgres_search(queryset, query)
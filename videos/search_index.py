@@ -0,0 +1,180 @@
+import logging
+import math
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db.models import Count, Max
+
+from chatbot.nlp_utils import preprocess
+
+from .cache import (CATALOG_CHANGES_MAXLEN, get_catalog_changes,
+                    get_catalog_state)
+from .models import Video
+
+logger = logging.getLogger(__name__)
+
+TITLE_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+REBUILD_CHUNK_SIZE = 2000
+
+
+def strip_accents(text):
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in normalized if not unicodedata.combining(char))
+
+
+def index_tokens(text):
+    """Tokenize like chatbot.nlp_utils.preprocess, ignoring accents."""
+    return preprocess(strip_accents(text or ""))
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index over video titles and descriptions, ranked
+    with TF-IDF where title terms weigh more than description terms.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+
+    def add(self, video_id, title, description):
+        self.remove(video_id)
+        weights = Counter()
+        for token in index_tokens(title):
+            weights[token] += TITLE_WEIGHT
+        for token in index_tokens(description):
+            weights[token] += DESCRIPTION_WEIGHT
+        for token, weight in weights.items():
+            self.postings[token][video_id] = weight
+        self.documents[video_id] = tuple(weights)
+
+    def remove(self, video_id):
+        for token in self.documents.pop(video_id, ()):
+            postings = self.postings[token]
+            postings.pop(video_id, None)
+            if not postings:
+                del self.postings[token]
+
+    def clear(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+
+    def search(self, query, limit=None):
+        """Return the ids of videos containing every query term, best first."""
+        tokens = set(index_tokens(query))
+        if not tokens:
+            return []
+
+        matches = []
+        for token in tokens:
+            postings = self.postings.get(token)
+            if not postings:
+                return []
+            matches.append((token, postings))
+        # Intersect starting from the rarest term
+        matches.sort(key=lambda match: len(match[1]))
+        candidates = set(matches[0][1])
+        for _, postings in matches[1:]:
+            candidates.intersection_update(postings)
+
+        total = len(self.documents)
+        scores = {}
+        for video_id in candidates:
+            scores[video_id] = sum(
+                (1 + math.log(postings[video_id]))
+                * math.log(1 + total / len(postings))
+                for _, postings in matches
+            )
+        ranked = sorted(scores, key=lambda video_id: (-scores[video_id], video_id))
+        return ranked[:limit] if limit else ranked
+
+
+class VideoSearchIndex(InvertedIndex):
+    """
+    Per-process index kept in sync with the catalog. With Redis available it
+    replays the catalog change feed and only reindexes the videos that
+    changed; without Redis it rebuilds when a cheap row fingerprint changes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.epoch = None
+        self.version = None
+        self.last_change_id = None
+        self.fingerprint = None
+
+    def ranked_ids(self, query, limit=None):
+        self.sync()
+        with self.lock:
+            return self.search(query, limit)
+
+    def sync(self):
+        with self.lock:
+            state = get_catalog_state()
+            if state is None:
+                self._sync_by_fingerprint()
+                return
+
+            epoch, version, last_change_id = state
+            needs_rebuild = (
+                epoch != self.epoch
+                or self.version is None
+                or version < self.version
+                or version - self.version > CATALOG_CHANGES_MAXLEN // 2
+            )
+            if needs_rebuild or (
+                version > self.version and not self._apply_changes(version)
+            ):
+                # Changes made after the snapshot are replayed on the next sync
+                self._rebuild()
+                self.epoch, self.version = epoch, version
+                self.last_change_id = last_change_id
+
+    def _apply_changes(self, version):
+        changes = get_catalog_changes(self.last_change_id)
+        if changes is None or len(changes) < version - self.version:
+            # The feed was trimmed past our position
+            return False
+
+        changed_ids = {
+            video_id for _, video_ids in changes for video_id in video_ids
+        }
+        rows = Video.objects.filter(id__in=changed_ids).values_list(
+            "id", "title", "description"
+        )
+        found = set()
+        for video_id, title, description in rows:
+            self.add(video_id, title, description)
+            found.add(video_id)
+        for video_id in changed_ids - found:
+            self.remove(video_id)
+
+        self.version += len(changes)
+        self.last_change_id = changes[-1][0]
+        logger.info(f"Search index applied {len(changes)} catalog changes")
+        return True
+
+    def _sync_by_fingerprint(self):
+        self.epoch = self.version = self.last_change_id = None
+        fingerprint = Video.objects.aggregate(
+            count=Count("id"), modified=Max("date_of_modification")
+        )
+        if fingerprint != self.fingerprint:
+            self._rebuild()
+            self.fingerprint = fingerprint
+
+    def _rebuild(self):
+        self.clear()
+        rows = Video.objects.values_list("id", "title", "description")
+        for video_id, title, description in rows.iterator(
+            chunk_size=REBUILD_CHUNK_SIZE
+        ):
+            self.add(video_id, title, description)
+        self.fingerprint = None
+        logger.info(f"Search index rebuilt with {len(self.documents)} videos")
+
+
+video_search_index = VideoSearchIndex()
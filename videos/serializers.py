@@ -1,16 +1,69 @@
+from django.db import transaction
 from rest_framework import serializers
 
+from core.images import image_placeholder, image_srcset, queue_image_derivatives
+
+from .cache import bump_catalog_versions
 from .models import Category, Video
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class InvalidFieldset(ValueError):
+    pass
+
+
+class FieldsetMixin:
+    """Accepts fields=(...) to serialize only a subset of the declared fields."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CategorySerializer(FieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "title", "description"]
 
 
-class VideoSerializer(serializers.ModelSerializer):
+class VideoListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        """
+        Insert every video with one bulk INSERT and link them to the
+        categories passed as save(categories=[...]) with one more, in a
+        single transaction. Bulk writes skip post_save, so the catalog
+        version and image derivatives are handled here.
+        """
+        links = [attrs.pop("categories", []) for attrs in validated_data]
+        videos = [Video(**attrs) for attrs in validated_data]
+        Through = Video.categories.through
+        with transaction.atomic():
+            Video.objects.bulk_create(videos)
+            Through.objects.bulk_create(
+                Through(video_id=video.id, category_id=category.id)
+                for video, categories in zip(videos, links)
+                for category in categories
+            )
+            video_ids = [video.id for video in videos]
+            transaction.on_commit(lambda: bump_catalog_versions(video_ids))
+            for video in videos:
+                queue_image_derivatives(video)
+        return videos
+
+
+class VideoSerializer(FieldsetMixin, serializers.ModelSerializer):
     categories = CategorySerializer(many=True, read_only=True)
+    image_srcset = serializers.SerializerMethodField()
+    image_placeholder = serializers.SerializerMethodField()
+
+    def get_image_srcset(self, obj):
+        return image_srcset(
+            obj.image_variants, obj.image.storage, self.context.get("request")
+        )
+
+    def get_image_placeholder(self, obj):
+        return image_placeholder(obj.image_variants)
 
     def validate(self, data):
         # Check if 'image' field contains base64-encoded data
@@ -27,10 +80,13 @@ class VideoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Video
+        list_serializer_class = VideoListSerializer
         fields = (
             "id",
             "title",
             "image",
+            "image_srcset",
+            "image_placeholder",
             "description",
             "url",
             "free",
@@ -38,3 +94,115 @@ class VideoSerializer(serializers.ModelSerializer):
             "date_of_modification",
             "categories",
         )
+
+
+VIDEO_LIST_FIELDS = (
+    "id",
+    "title",
+    "image",
+    "description",
+    "url",
+    "free",
+    "date_of_creation",
+    "date_of_modification",
+)
+
+VIDEO_FIELDS = VideoSerializer.Meta.fields
+# Serialized fields computed from another column
+VIDEO_FIELD_SOURCES = {
+    "image_srcset": "image_variants",
+    "image_placeholder": "image_variants",
+}
+CATEGORY_FIELDS = ("id", "title", "description")
+
+_datetime_field = serializers.DateTimeField()
+
+
+def parse_fieldset(query_params, available):
+    """
+    Return the fields of `available` selected by the ?fields= and ?exclude=
+    comma-separated query parameters, in declaration order. The id is always
+    kept so clients can match records across requests.
+    """
+    selected = set(available)
+    for param in ("fields", "exclude"):
+        value = query_params.get(param)
+        if not value:
+            continue
+        names = {name.strip() for name in value.split(",") if name.strip()}
+        unknown = names - set(available)
+        if unknown:
+            raise InvalidFieldset(f"Unknown fields: {', '.join(sorted(unknown))}")
+        selected = selected & names if param == "fields" else selected - names
+    return tuple(name for name in available if name in selected or name == "id")
+
+
+def video_columns(fields, *extra):
+    """Database columns needed to serialize `fields`, plus any `extra` ones."""
+    columns = [name for name in VIDEO_LIST_FIELDS if name in fields or name in extra]
+    for name, source in VIDEO_FIELD_SOURCES.items():
+        if name in fields and source not in columns:
+            columns.append(source)
+    return columns
+
+
+def serialize_video_rows(rows, request=None, fields=VIDEO_FIELDS):
+    """
+    Read-only fast path producing the same payload as VideoSerializer from
+    Video .values() rows. Categories for the whole page are loaded with a
+    single query instead of one query per video, and only when requested.
+    """
+    rows = list(rows)
+    categories_by_video = {row["id"]: [] for row in rows}
+    if categories_by_video and "categories" in fields:
+        links = (
+            Video.categories.through.objects.filter(
+                video_id__in=categories_by_video
+            )
+            .order_by("id")
+            .values_list(
+                "video_id", "category_id", "category__title", "category__description"
+            )
+        )
+        for video_id, category_id, title, description in links:
+            categories_by_video[video_id].append(
+                {"id": category_id, "title": title, "description": description}
+            )
+
+    storage = Video._meta.get_field("image").storage
+
+    def image_url(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    converters = {
+        "image": image_url,
+        "image_srcset": lambda variants: image_srcset(variants, storage, request),
+        "image_placeholder": image_placeholder,
+        "date_of_creation": _datetime_field.to_representation,
+        "date_of_modification": _datetime_field.to_representation,
+    }
+    columns = [
+        (name, VIDEO_FIELD_SOURCES.get(name, name), converters.get(name))
+        for name in fields
+        if name != "categories"
+    ]
+    with_categories = "categories" in fields
+
+    results = []
+    for row in rows:
+        video = {
+            name: convert(row[source]) if convert else row[source]
+            for name, source, convert in columns
+        }
+        if with_categories:
+            video["categories"] = categories_by_video[row["id"]]
+        results.append(video)
+    return results
+
+
+def serialize_videos(queryset, request=None, fields=VIDEO_FIELDS):
+    rows = queryset.values(*video_columns(fields))
+    return serialize_video_rows(rows, request, fields)
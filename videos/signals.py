@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import CatalogTombstone, Category, Video
+
+
+def invalidate_catalog(video_id=None):
+    # Bump only once the write is visible, so a concurrent reader cannot
+    # cache the old rows under the new version.
+    transaction.on_commit(lambda: bump_catalog_version(video_id))
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_catalog_on_video_change(sender, instance, **kwargs):
+    invalidate_catalog(instance.pk)
+
+
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=Category)
+def record_catalog_tombstone(sender, instance, **kwargs):
+    kind = CatalogTombstone.VIDEO if sender is Video else CatalogTombstone.CATEGORY
+    CatalogTombstone.objects.create(kind=kind, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_on_category_change(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=Video.categories.through)
+@receiver(m2m_changed, sender=Category.videos.through)
+def invalidate_catalog_on_m2m_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_catalog()
+
+
+@receiver(m2m_changed, sender=Video.categories.through)
+def touch_videos_on_category_links(sender, instance, action, reverse, pk_set, **kwargs):
+    # A video's payload embeds its categories, so linking or unlinking has to
+    # move date_of_modification for delta sync to pick the video up again.
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        videos = Video.objects.filter(pk=instance.pk)
+    elif action == "pre_clear":
+        videos = Video.objects.filter(categories=instance)
+    else:
+        videos = Video.objects.filter(pk__in=pk_set)
+    videos.update(date_of_modification=timezone.now())
@@ -0,0 +1,109 @@
+import bisect
+import threading
+import time
+
+from .cache import get_catalog_state
+from .models import Category, Video
+from .search_index import strip_accents
+
+SUGGEST_INDEX_TTL = 60
+MAX_SCANNED_ENTRIES = 200
+
+
+def normalize(text):
+    return " ".join(strip_accents(text).lower().split())
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over video and category titles. Titles are
+    indexed whole and from the start of every later word, so "flow" also
+    completes "Vinyasa flow". Lookups are a binary search plus a short scan.
+    """
+
+    def __init__(self, entries=()):
+        title_entries = []
+        word_entries = []
+        for kind, pk, title in entries:
+            normalized = normalize(title)
+            title_entries.append((normalized, kind, pk, title))
+            words = normalized.split(" ")
+            for position in range(1, len(words)):
+                word_entries.append((" ".join(words[position:]), kind, pk, title))
+        title_entries.sort()
+        word_entries.sort()
+        self.tables = [
+            ([entry[0] for entry in title_entries], title_entries),
+            ([entry[0] for entry in word_entries], word_entries),
+        ]
+
+    def suggest(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        # Whole-title matches first, then matches later in the title
+        for keys, entries in self.tables:
+            matches = []
+            start = bisect.bisect_left(keys, prefix)
+            for key, kind, pk, title in entries[start : start + MAX_SCANNED_ENTRIES]:
+                if not key.startswith(prefix):
+                    break
+                matches.append((len(title), title, kind, pk))
+            for _, title, kind, pk in sorted(matches):
+                if (kind, pk) in seen:
+                    continue
+                seen.add((kind, pk))
+                results.append({"type": kind, "id": pk, "title": title})
+                if len(results) == limit:
+                    return results
+        return results
+
+
+class CatalogSuggestions:
+    """
+    Per-process prefix index rebuilt whenever the catalog state in Redis
+    moves, or every SUGGEST_INDEX_TTL seconds when Redis is unavailable.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.state = None
+        self.built_at = 0
+
+    def is_fresh(self, state):
+        if self.index is None or self.state != state:
+            return False
+        return state is not None or time.monotonic() - self.built_at < SUGGEST_INDEX_TTL
+
+    def suggest(self, prefix, limit=10):
+        self.refresh()
+        return self.index.suggest(prefix, limit)
+
+    def refresh(self):
+        state = get_catalog_state()
+        state = state[:2] if state else None
+        if self.is_fresh(state):
+            return
+
+        with self.lock:
+            if self.is_fresh(state):
+                return
+            entries = [
+                ("video", pk, title)
+                for pk, title in Video.objects.values_list("id", "title").iterator()
+            ]
+            entries += [
+                ("category", pk, title)
+                for pk, title in Category.objects.values_list("id", "title")
+            ]
+            # Swap in a fully built index so readers never see a partial one
+            self.index = PrefixIndex(entries)
+            self.state = state
+            self.built_at = time.monotonic()
+
+
+catalog_suggestions = CatalogSuggestions()
@@ -0,0 +1,109 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CatalogTombstone, Category, Video
+from .serializers import VIDEO_FIELDS, serialize_video_rows, video_columns
+
+# Rows committed slightly out of timestamp order are still picked up;
+# clients apply changes as upserts, so repeats are harmless.
+SYNC_OVERLAP = timedelta(seconds=60)
+TOMBSTONE_RETENTION = timedelta(days=90)
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def catalog_stamp(state):
+    """Reduce a get_catalog_state() snapshot to what a sync token stores."""
+    if state is None:
+        return None
+    epoch, version, _ = state
+    return f"{epoch}:{version}"
+
+
+def encode_sync_token(synced_at, stamp=None):
+    payload = [synced_at.isoformat(), stamp]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_sync_token(token):
+    """Return (synced_at, stamp) for a token made by encode_sync_token."""
+    try:
+        synced_at, stamp = json.loads(base64.urlsafe_b64decode(token.encode()))
+        synced_at = parse_datetime(synced_at)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidSyncToken("Invalid sync token")
+    if synced_at is None or not (stamp is None or isinstance(stamp, str)):
+        raise InvalidSyncToken("Invalid sync token")
+    return synced_at, stamp
+
+
+def build_catalog_delta(since=None, request=None, fields=VIDEO_FIELDS):
+    """
+    Return the videos and categories changed after `since` plus the ids
+    deleted since then. Without `since`, or when `since` is older than the
+    tombstones we keep, the whole catalog is returned with "reset" set so the
+    client replaces its copy instead of merging.
+
+    Deleting a category also unlinks its videos without touching them, so
+    clients drop deleted category ids from the videos they hold.
+    """
+    reset = since is None or since < timezone.now() - TOMBSTONE_RETENTION
+    videos = Video.objects.all()
+    categories = Category.objects.all()
+    deleted = {CatalogTombstone.VIDEO: set(), CatalogTombstone.CATEGORY: set()}
+
+    if not reset:
+        since = since - SYNC_OVERLAP
+        videos = videos.filter(date_of_modification__gte=since)
+        categories = categories.filter(date_of_modification__gte=since)
+        tombstones = CatalogTombstone.objects.filter(
+            date_of_deletion__gte=since
+        ).values_list("kind", "object_id")
+        for kind, object_id in tombstones:
+            deleted[kind].add(object_id)
+
+    video_data = serialize_video_rows(
+        videos.order_by("id").values(*video_columns(fields)), request, fields
+    )
+    category_data = list(
+        categories.order_by("id").values("id", "title", "description")
+    )
+    # An id can be deleted and then reused, SQLite does that
+    deleted[CatalogTombstone.VIDEO] -= {video["id"] for video in video_data}
+    deleted[CatalogTombstone.CATEGORY] -= {
+        category["id"] for category in category_data
+    }
+
+    return {
+        "reset": reset,
+        "videos": video_data,
+        "categories": category_data,
+        "deleted": {
+            "videos": sorted(deleted[CatalogTombstone.VIDEO]),
+            "categories": sorted(deleted[CatalogTombstone.CATEGORY]),
+        },
+    }
+
+
+def is_empty_delta(delta):
+    return not (
+        delta["reset"]
+        or delta["videos"]
+        or delta["categories"]
+        or delta["deleted"]["videos"]
+        or delta["deleted"]["categories"]
+    )
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones no client can still ask for; returns the count."""
+    cutoff = (now or timezone.now()) - TOMBSTONE_RETENTION
+    deleted, _ = CatalogTombstone.objects.filter(date_of_deletion__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,14 @@
+import logging
+
+from celery import shared_task
+
+from .popularity import flush_view_counts
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def flush_view_counts_task():
+    """Write the view counters gathered in Redis to the database."""
+    flushed = flush_view_counts()
+    logger.info(f"Flushed view counts of {flushed} videos")
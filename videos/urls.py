@@ -1,12 +1,34 @@
 from django.urls import path
 
-from .views import (CategoryAPIView, LinkCategoryVideoAPIView,
-                    SearchVideoAPIView, VideoDetail, VideoList)
+from .views import (CatalogChangesAPIView, CategoryAPIView,
+                    LinkCategoryVideoAPIView, SearchVideoAPIView,
+                    SuggestVideoAPIView, TrendingVideosAPIView,
+                    VideoBatchDetail, VideoDetail, VideoList)
 
 urlpatterns = [
     path("api/video_list/", VideoList.as_view(), name="video-list"),
+    path(
+        "api/video_list/changes/",
+        CatalogChangesAPIView.as_view(),
+        name="video-list-changes",
+    ),
+    path(
+        "api/videos/trending/",
+        TrendingVideosAPIView.as_view(),
+        name="videos-trending",
+    ),
     path("api/video_detail/", VideoDetail.as_view(), name="video-detail"),
+    path(
+        "api/video_detail/batch/",
+        VideoBatchDetail.as_view(),
+        name="video-detail-batch",
+    ),
     path("api/search_videos/", SearchVideoAPIView.as_view(), name="search_videos"),
+    path(
+        "api/search_videos/suggest/",
+        SuggestVideoAPIView.as_view(),
+        name="suggest_videos",
+    ),
     path("api/category_list/", CategoryAPIView.as_view(), name="category-list"),
     path("api/category_detail/", CategoryAPIView.as_view(), name="category-detail"),
     path(
@@ -1,12 +1,33 @@
 import json
 import logging
 
+from django.utils import timezone
 from rest_framework import permissions, status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.conditional import not_modified_response, set_validators
+from core.entitlements import get_request_entitlement, is_entitled
+from core.streaming import streaming_json_response, wants_stream
+
+from .cache import (get_cached_response, get_catalog_state,
+                    get_catalog_validators, get_video_validators,
+                    set_cached_response)
+from .facets import category_facets
 from .models import Category, Video
-from .serializers import CategorySerializer, VideoSerializer
+from .pagination import (CURSOR_ORDERING, InvalidCursor, is_cursor_request,
+                         paginate_queryset_by_cursor)
+from .popularity import (MAX_TRENDING_LIMIT, TRENDING_LIMIT,
+                         record_video_view, trending_videos, viewer_key)
+from .search import search_videos
+from .serializers import (CATEGORY_FIELDS, VIDEO_FIELDS, CategorySerializer,
+                          InvalidFieldset, VideoSerializer, parse_fieldset,
+                          serialize_video_rows, serialize_videos,
+                          video_columns)
+from .suggest import catalog_suggestions
+from .sync import (InvalidSyncToken, build_catalog_delta, catalog_stamp,
+                   decode_sync_token, encode_sync_token, is_empty_delta)
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +47,65 @@ def paginate_queryset(queryset, request):
     return paginated_queryset
 
 
+def build_page_data(queryset, request, absolute_urls=False, ranked=False):
+    """
+    One page of `queryset`, by page number or by cursor. Cursors walk the
+    creation order, so they are refused for `ranked` (search) results.
+    """
+    fields = parse_fieldset(request.query_params, VIDEO_FIELDS)
+    url_request = request if absolute_urls else None
+    if is_cursor_request(request):
+        if ranked:
+            raise InvalidCursor(
+                "Cursor pagination is not available for search results"
+            )
+        rows = queryset.values(*video_columns(fields, *CURSOR_ORDERING))
+        page, next_cursor = paginate_queryset_by_cursor(rows, request)
+        data = {
+            "count": len(page),
+            "next": next_cursor,
+            "results": serialize_video_rows(page, url_request, fields),
+        }
+        # Counting the whole filtered set is what makes deep offset pages
+        # slow, so cursor clients have to ask for it explicitly.
+        if request.query_params.get("include_total") == "true":
+            data["total_count"] = queryset.count()
+        return data
+
+    rows = queryset.values(*video_columns(fields))
+    page = list(paginate_queryset(rows, request))
+    return {
+        "total_count": queryset.count(),
+        "count": len(page),
+        "results": serialize_video_rows(page, url_request, fields),
+    }
+
+
+def catalog_response(data, validators, status_code=status.HTTP_200_OK):
+    response = Response(data, status=status_code)
+    if validators is not None:
+        set_validators(response, validators.etag, validators.last_modified)
+    return response
+
+
+def cached_catalog_response(request, validators):
+    """
+    Answer a catalog read without touching the database when possible:
+    304 if the client's copy is current, else the cached payload.
+    """
+    if validators is None:
+        return None
+    response = not_modified_response(
+        request, validators.etag, validators.last_modified
+    )
+    if response is not None:
+        return response
+    cached_data = get_cached_response(validators.cache_key)
+    if cached_data is not None:
+        return catalog_response(cached_data, validators)
+    return None
+
+
 class IsStaffOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         logger.info(f"Permission Check - Request method: {request.method}")
@@ -40,8 +120,20 @@ class IsStaffOrReadOnly(permissions.BasePermission):
 class VideoList(APIView):
     permission_classes = [IsStaffOrReadOnly]
 
+    def perform_authentication(self, request):
+        # Authenticate lazily so cache hits never load the user row.
+        pass
+
     def get(self, request):
         logger.info("VideoList.get called")
+        if wants_stream(request):
+            return self.stream(request)
+
+        validators = get_catalog_validators("video_list", request)
+        cached_response = cached_catalog_response(request, validators)
+        if cached_response is not None:
+            return cached_response
+
         try:
             search_query = request.query_params.get("search", None)
             category_id = request.query_params.get("category", None)
@@ -49,31 +141,69 @@ class VideoList(APIView):
             queryset = Video.objects.all()
 
             if search_query:
-                queryset = queryset.filter(title__icontains=search_query)
+                queryset = search_videos(queryset, search_query)
+
+            # Facet counts ignore the category filter itself, so clients can
+            # show how many results every category would give.
+            facet_queryset = queryset if search_query else None
 
             if category_id:
                 queryset = queryset.filter(categories__id=category_id)
 
-            paginated_queryset = paginate_queryset(queryset, request)
-            serializer = VideoSerializer(paginated_queryset, many=True, context={'request': request})
-
-            return Response(
-                {
-                    "total_count": queryset.count(),
-                    "count": len(paginated_queryset),
-                    "results": serializer.data,
-                }
+            data = build_page_data(
+                queryset, request, absolute_urls=True, ranked=bool(search_query)
             )
-
+            facets = request.query_params.get("facets", "").split(",")
+            if "categories" in facets:
+                data["facets"] = {"categories": category_facets(facet_queryset)}
+            if validators:
+                set_cached_response(validators.cache_key, data)
+            return catalog_response(data, validators)
+
+        except (InvalidCursor, InvalidFieldset) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error in VideoList GET: {str(e)}")
             return Response(
                 data={"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def stream(self, request):
+        """Staff export of every matching video as one streamed JSON array."""
+        if not request.user.is_staff:
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        try:
+            fields = parse_fieldset(request.query_params, VIDEO_FIELDS)
+        except InvalidFieldset as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Video.objects.all()
+        search_query = request.query_params.get("search")
+        category_id = request.query_params.get("category")
+        if search_query:
+            queryset = search_videos(queryset, search_query)
+        if category_id:
+            queryset = queryset.filter(categories__id=category_id)
+        rows = queryset.order_by("id").values(*video_columns(fields))
+        return streaming_json_response(
+            rows, lambda chunk: serialize_video_rows(chunk, request, fields)
+        )
+
 
 class SearchVideoAPIView(APIView):
+    def perform_authentication(self, request):
+        # Authenticate lazily so cache hits never load the user row.
+        pass
+
     def get(self, request, *args, **kwargs):
+        validators = get_catalog_validators("search_videos", request)
+        cached_response = cached_catalog_response(request, validators)
+        if cached_response is not None:
+            return cached_response
+
         try:
             search_query = request.query_params.get("search", None)
             category_id = request.query_params.get("category", None)
@@ -86,47 +216,230 @@ class SearchVideoAPIView(APIView):
 
             queryset = None
             if search_query:
-                queryset = Video.objects.filter(title__icontains=search_query)
+                queryset = search_videos(Video.objects.all(), search_query)
             elif category_id:
                 queryset = Video.objects.filter(categories__id=category_id)
 
-            paginated_queryset = paginate_queryset(queryset, request)
+            data = build_page_data(queryset, request, ranked=bool(search_query))
+            if validators:
+                set_cached_response(validators.cache_key, data)
+            return catalog_response(data, validators)
+        except (InvalidCursor, InvalidFieldset) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                data={"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class CatalogChangesAPIView(APIView):
+    """
+    Delta sync: ?since=<token> returns what changed after the token was
+    issued, along with the token for the next sync. An unchanged catalog is
+    answered with 204 from the Redis catalog version alone.
+    """
+
+    permission_classes = [IsStaffOrReadOnly]
+
+    def perform_authentication(self, request):
+        # Authenticate lazily so unchanged syncs never load the user row.
+        pass
+
+    def get(self, request):
+        since, since_stamp = None, None
+        token = request.query_params.get("since")
+        if token:
+            try:
+                since, since_stamp = decode_sync_token(token)
+            except InvalidSyncToken as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Taken before reading rows, so changes committed meanwhile are
+        # returned again on the next sync rather than missed.
+        stamp = catalog_stamp(get_catalog_state())
+        if since is not None and stamp is not None and stamp == since_stamp:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        synced_at = timezone.now()
+
+        try:
+            fields = parse_fieldset(request.query_params, VIDEO_FIELDS)
+            data = build_catalog_delta(since, request, fields)
+        except InvalidFieldset as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error in CatalogChangesAPIView GET: {str(e)}")
+            return Response(
+                data={"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        if since is not None and is_empty_delta(data) and stamp is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        data["next"] = encode_sync_token(synced_at, stamp)
+        return Response(data)
+
+
+MAX_SUGGESTIONS = 20
+
+
+class SuggestVideoAPIView(APIView):
+    def perform_authentication(self, request):
+        # Suggestions are public; skip loading the user row.
+        pass
 
-            serializer = VideoSerializer(paginated_queryset, many=True)
+    def get(self, request, *args, **kwargs):
+        search_query = request.query_params.get("search", "")
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            return Response(
+                {"error": "limit must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        try:
+            results = catalog_suggestions.suggest(search_query, limit)
+            return Response({"results": results}, status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"Error in SuggestVideoAPIView GET: {str(e)}")
+            return Response(
+                data={"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+MAX_BATCH_IDS = 100
+
+
+class VideoBatchDetail(APIView):
+    """
+    Details for several videos in one request: ?ids=3,1,2 returns them in
+    that order, with one query for the rows and one for their categories.
+    Ids that do not exist or that the caller may not watch are listed apart.
+    """
+
+    permission_classes = [IsStaffOrReadOnly]
+
+    def perform_authentication(self, request):
+        # Access comes from the cached entitlement record, not the user row.
+        pass
+
+    def get(self, request):
+        try:
+            ids = [
+                int(pk) for pk in request.query_params.get("ids", "").split(",") if pk
+            ]
+        except ValueError:
+            return Response(
+                {"error": "ids must be a comma-separated list of integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids = list(dict.fromkeys(ids))
+        if not ids or len(ids) > MAX_BATCH_IDS:
+            return Response(
+                {"error": f"Between 1 and {MAX_BATCH_IDS} ids are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            fields = parse_fieldset(request.query_params, VIDEO_FIELDS)
+            entitled = is_entitled(get_request_entitlement(request))
+            rows = Video.objects.filter(id__in=ids).values(
+                *video_columns(fields, "free")
+            )
+            rows_by_id = {row["id"]: row for row in rows}
+
+            allowed, unauthorized, missing = [], [], []
+            for pk in ids:
+                row = rows_by_id.get(pk)
+                if row is None:
+                    missing.append(pk)
+                elif entitled or row["free"]:
+                    allowed.append(row)
+                else:
+                    unauthorized.append(pk)
 
             return Response(
                 {
-                    "total_count": queryset.count(),
-                    "count": len(paginated_queryset),
-                    "results": serializer.data,
-                },
-                status=status.HTTP_200_OK,
+                    "results": serialize_video_rows(allowed, fields=fields),
+                    "unauthorized": unauthorized,
+                    "not_found": missing,
+                }
             )
+        except InvalidFieldset as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except AuthenticationFailed:
+            raise
         except Exception as e:
+            logger.error(f"Error in VideoBatchDetail GET: {str(e)}")
             return Response(
                 data={"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
+class TrendingVideosAPIView(APIView):
+    def perform_authentication(self, request):
+        # Public ranking; never load the user row.
+        pass
+
+    def get(self, request):
+        try:
+            fields = parse_fieldset(request.query_params, VIDEO_FIELDS)
+        except InvalidFieldset as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get("limit", TRENDING_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": "limit must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        limit = min(max(limit, 1), MAX_TRENDING_LIMIT)
+        try:
+            results = trending_videos(limit, request, fields)
+        except Exception as e:
+            # An empty ranking beats failing the page that embeds it
+            logger.error(f"Error in TrendingVideosAPIView GET: {str(e)}")
+            results = []
+        return Response({"results": results})
+
+
 class VideoDetail(APIView):
     permission_classes = [IsStaffOrReadOnly]
-    
+
+    def perform_authentication(self, request):
+        # Reads check access from the cached entitlement record instead of
+        # loading the user row; writes still authenticate via request.user.
+        pass
 
     def get(self, request, pk):
         try:
-            video = Video.objects.get(id=pk)
-            if (
-                (request.user.is_authenticated and request.user.active) 
-                or request.user.is_staff 
-                or video.free
-            ):
-                serializer = VideoSerializer(video)
-                return Response(serializer.data)
+            fields = parse_fieldset(request.query_params, VIDEO_FIELDS)
+            video = Video.objects.only(
+                *video_columns(fields, "free", "date_of_modification")
+            ).get(id=pk)
+            entitlement = None if video.free else get_request_entitlement(request)
+            if video.free or is_entitled(entitlement):
+                validators = get_video_validators(video, fields)
+                if validators:
+                    not_modified = not_modified_response(request, *validators)
+                    if not_modified is not None:
+                        return not_modified
+                # Only full fetches are views; polling revalidations are not
+                record_video_view(video.id, viewer_key(request, entitlement))
+                serializer = VideoSerializer(video, fields=fields)
+                response = Response(serializer.data)
+                if validators:
+                    set_validators(response, *validators)
+                return response
             return Response("Unauthorized", status=status.HTTP_401_UNAUTHORIZED)
         except Video.DoesNotExist:
             return Response(
                 {"error": "Video not found"}, status=status.HTTP_404_NOT_FOUND
             )
+        except InvalidFieldset as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except AuthenticationFailed:
+            raise
         except Exception as e:
             return Response(
                 data={"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -255,10 +568,22 @@ class CategoryAPIView(APIView):
 
     def get(self, request):
         logger.info("CategoryAPIView.get called")
+        validators = get_catalog_validators("category_list", request)
+        cached_response = cached_catalog_response(request, validators)
+        if cached_response is not None:
+            return cached_response
+
         try:
-            categories = Category.objects.all()
-            serializer = CategorySerializer(categories, many=True, context={'request': request})
-            return Response(serializer.data)
+            fields = parse_fieldset(request.query_params, CATEGORY_FIELDS)
+            categories = Category.objects.only(*fields)
+            serializer = CategorySerializer(
+                categories, many=True, fields=fields, context={'request': request}
+            )
+            if validators:
+                set_cached_response(validators.cache_key, serializer.data)
+            return catalog_response(serializer.data, validators)
+        except InvalidFieldset as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error in CategoryAPIView GET: {str(e)}")
             return Response(
@@ -300,16 +625,22 @@ class CategoryAPIView(APIView):
 
         if serializer.is_valid():
             if is_many:
-                videos = serializer.save()
-                category.category_videos.add(
-                    *videos
-                )  # Add multiple videos to the category
+                # Bulk insert, linked to the category in the same transaction
+                videos = serializer.save(categories=[category])
             else:
-                video = serializer.save()
+                videos = [serializer.save()]
                 category.category_videos.add(
-                    video
+                    *videos
                 )  # Add a single video to the category
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+            # Serialize the created videos in one pass instead of one
+            # categories query per video
+            data = serialize_videos(
+                Video.objects.filter(id__in=[video.id for video in videos]).order_by("id")
+            )
+            return Response(
+                data if is_many else data[0], status=status.HTTP_201_CREATED
+            )
 
         print(serializer.errors)
 